@@ -0,0 +1,88 @@
+"""Compare the JSON decoders of the API layer on departures payloads.
+
+Run from the repository root with Home Assistant installed::
+
+    python benchmarks/decode.py [--results 300] [--rounds 20] [--payload FILE]
+
+``--payload`` reads a recorded departures response instead of a synthetic
+board. Every decoder is measured once returning the whole document and once
+projecting it to the departure records the coordinator keeps. It reports the
+decode time, the peak memory while decoding and the memory the result keeps
+alive in the response cache.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+from pathlib import Path
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.payloads import departures_board  # noqa: E402
+from custom_components.vbb.snapshot import project_departures  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _measure(func, rounds: int) -> tuple[float, int, int]:
+    """Return milliseconds per call, peak and retained bytes of ``func``."""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = (time.perf_counter() - started) / rounds * 1000
+
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, retained
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--payload", type=Path)
+    args = parser.parse_args()
+
+    if args.payload is not None:
+        body = args.payload.read_bytes()
+    else:
+        body = json.dumps(departures_board(args.results)).encode()
+
+    decoders = {"json": json.loads}
+    if orjson is not None:
+        decoders["orjson"] = orjson.loads
+    else:
+        print("orjson is not installed, only measuring json")
+
+    print(f"payload: {len(body) / 1024:.0f} KiB")
+    print(f"{'decoder':<20}{'ms':>8}{'peak KiB':>10}{'kept KiB':>10}")
+    for name, loads in decoders.items():
+        cases = {
+            name: lambda loads=loads: loads(body),
+            f"{name} + projection": (
+                lambda loads=loads: project_departures(loads(body))
+            ),
+        }
+        for label, func in cases.items():
+            elapsed, peak, retained = _measure(func, args.rounds)
+            print(
+                f"{label:<20}{elapsed:>8.2f}{peak / 1024:>10.0f}"
+                f"{retained / 1024:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Turn a capture log into fixtures for the stand-in server.
+
+Run from the repository root with Home Assistant installed::
+
+    python benchmarks/export_capture.py vbb_capture.jsonl.gz [--backups 3]
+
+Writes the last captured departures board of every station to
+``fixtures/departures/<station>.json``, where ``server.py`` serves it
+instead of a synthetic board.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import re
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.server import FIXTURES  # noqa: E402
+from custom_components.vbb.capture import CaptureReplayer  # noqa: E402
+
+DEPARTURES = re.compile(r"^/stops/(?P<station>[^/]+)/departures$")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("log", type=Path)
+    parser.add_argument("--backups", type=int, default=3)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    args = parser.parse_args()
+
+    replayer = CaptureReplayer.load(args.log, args.backups, 0)
+    boards: dict[str, str] = {}
+    for response in replayer.responses:
+        if match := DEPARTURES.match(response.path):
+            boards[match["station"]] = response.body
+
+    target = args.fixtures / "departures"
+    target.mkdir(parents=True, exist_ok=True)
+    for station, body in boards.items():
+        (target / f"{station}.json").write_text(
+            json.dumps(json.loads(body), ensure_ascii=False, indent=2) + "\n",
+            encoding="utf-8",
+        )
+    print(f"exported {len(boards)} boards to {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Drive many stations against the local transport.rest stand-in.
+
+Run from the repository root with Home Assistant installed::
+
+    python benchmarks/load.py [--stations 50] [--cycles 10] [--latency 0.05]
+
+Starts ``server.py`` on localhost and a Home Assistant instance in a
+temporary config directory, sets the stations up through the YAML sensor
+platform and then runs update cycles. Every cycle refreshes all
+coordinators at once, calls ``async_update`` of a share of the sensors and
+searches stations like the config flow does. No request leaves the machine.
+
+With ``--capture record`` the API responses are written to a capture log,
+``--capture replay`` serves the stations from such a log, for example one
+recorded by a production instance, instead of the stand-in.
+
+Time is compressed: the freshness window and the response cache are
+disabled so that every cycle fetches, as if a poll interval had passed.
+It reports the requests per poll interval, the CPU time per cycle, the
+state writes and the memory of the process.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import timedelta
+import logging
+from pathlib import Path
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.server import (  # noqa: E402
+    FIXTURES,
+    StandIn,
+    StandInOptions,
+    async_start_server,
+)
+from custom_components.vbb import (  # noqa: E402
+    api,
+    coordinator as vbb_coordinator,
+    stops,
+)
+from custom_components.vbb.const import (  # noqa: E402
+    CAPTURE_RECORD,
+    CAPTURE_REPLAY,
+    CONF_CAPTURE,
+    CONF_REQUESTS_PER_MINUTE,
+    CONF_SPEED,
+    DEFAULT_DIRECTION_SENSORS,
+    DEFAULT_MAX_SENSORS,
+    DEFAULT_REALTIME_WINDOW,
+    DOMAIN,
+)
+from aiohttp import ClientError  # noqa: E402
+from homeassistant import loader  # noqa: E402
+from homeassistant.bootstrap import async_load_base_functionality  # noqa: E402
+from homeassistant.config_entries import ConfigEntries  # noqa: E402
+from homeassistant.const import CONF_MODE, CONF_PATH, EVENT_STATE_CHANGED  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+from homeassistant.helpers.aiohttp_client import async_get_clientsession  # noqa: E402
+from homeassistant.setup import async_setup_component  # noqa: E402
+
+FIRST_STATION = 900000001
+
+
+async def _async_start_hass(config_dir: str) -> HomeAssistant:
+    """Return a running Home Assistant instance without any integrations."""
+    hass = HomeAssistant(config_dir)
+    hass.config_entries = ConfigEntries(hass, {})
+    loader.async_setup(hass)
+    await async_load_base_functionality(hass)
+    await hass.async_start()
+    return hass
+
+
+async def _async_search(hass: HomeAssistant, rng: random.Random) -> bool:
+    """Search stations by name and by position like the config flow."""
+    session = async_get_clientsession(hass)
+    try:
+        await stops.async_search_stations(
+            session, rng.choice(["Haupt", "Alex", "Zoo", "Ost", "Süd"])
+        )
+        await stops.async_nearby_stations(
+            session, 52.5 + rng.random() / 10, 13.3 + rng.random() / 10
+        )
+    except (asyncio.TimeoutError, ClientError):
+        return False
+    return True
+
+
+async def async_run(args: argparse.Namespace) -> None:
+    stand_in = StandIn(
+        StandInOptions(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.errors,
+            rate_limit_rate=args.rate_limits,
+            results=args.payload_results,
+            churn=args.churn,
+            fixtures=args.fixtures,
+        )
+    )
+    runner, base_url = await async_start_server(stand_in)
+    api.configure_base_urls([base_url])
+    vbb_coordinator.FRESH_WINDOW = timedelta(0)
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await _async_start_hass(config_dir)
+        writes = 0
+
+        def count_write(event) -> None:
+            nonlocal writes
+            writes += 1
+
+        hass.bus.async_listen(EVENT_STATE_CHANGED, count_write)
+
+        stations = [str(FIRST_STATION + index) for index in range(args.stations)]
+        started = time.perf_counter()
+        conf = {CONF_REQUESTS_PER_MINUTE: args.requests_per_minute}
+        if args.capture:
+            conf[CONF_CAPTURE] = {
+                CONF_MODE: args.capture,
+                CONF_PATH: str(args.capture_path.resolve()),
+                CONF_SPEED: args.replay_speed,
+            }
+        await async_setup_component(hass, DOMAIN, {DOMAIN: conf})
+        await async_setup_component(
+            hass,
+            "sensor",
+            {
+                "sensor": [
+                    {
+                        "platform": DOMAIN,
+                        "station_id": station,
+                        "name": f"Station {station}",
+                        "results": args.results,
+                        "compact_attributes": args.compact,
+                        "max_sensors": args.max_sensors,
+                        "direction_sensors": args.direction_sensors,
+                        "realtime_window": args.realtime_window,
+                        "tracked_lines": args.tracked_lines,
+                    }
+                    for station in stations
+                ]
+            },
+        )
+        await hass.async_block_till_done()
+        setup_s = time.perf_counter() - started
+
+        coordinators = [
+            hass.data[DOMAIN][f"platform_{station}"] for station in stations
+        ]
+        sensors = [
+            entity
+            for entity in hass.data["sensor"].entities
+            if entity.platform.platform_name == DOMAIN
+        ]
+        print(f"stations:               {len(coordinators)}")
+        print(f"sensors:                {len(sensors)}")
+        print(f"setup:                  {setup_s:.2f} s")
+
+        stand_in.stats.requests.clear()
+        stand_in.stats.bytes_sent = 0
+        writes = 0
+        rng = random.Random(0)
+        if args.trace_memory:
+            tracemalloc.start()
+
+        cpu = wall = 0.0
+        failed_searches = 0
+        for _ in range(args.cycles):
+            # Let every cycle fetch instead of answering from the cache.
+            api._CACHE.clear()
+            cpu_started = time.process_time()
+            wall_started = time.perf_counter()
+            results = await asyncio.gather(
+                *(_async_search(hass, rng) for _ in range(args.searches)),
+                *(coordinator.async_refresh() for coordinator in coordinators),
+                *(
+                    sensor.async_update()
+                    for sensor in rng.sample(
+                        sensors, int(len(sensors) * args.manual_updates)
+                    )
+                ),
+            )
+            failed_searches += results[: args.searches].count(False)
+            await hass.async_block_till_done()
+            cpu += time.process_time() - cpu_started
+            wall += time.perf_counter() - wall_started
+
+        suppressed = sum(
+            coordinator.metrics.counters["suppressed_writes"]
+            for coordinator in coordinators
+        )
+        requests = stand_in.stats.requests
+        print(f"cycles:                 {args.cycles}")
+        print(
+            "requests/interval:      "
+            + ", ".join(
+                f"{name} {count / args.cycles:.1f}"
+                for name, count in sorted(requests.items())
+            )
+        )
+        print(f"responses:              {dict(stand_in.stats.statuses)}")
+        print(
+            "bytes/interval:         "
+            f"{stand_in.stats.bytes_sent / args.cycles / 1024:.0f} KiB"
+        )
+        print(f"failed searches:        {failed_searches}")
+        print(
+            "failed refreshes:       "
+            f"{sum(not c.last_update_success for c in coordinators)} at the end"
+        )
+        print(f"CPU per cycle:          {cpu / args.cycles * 1000:.1f} ms")
+        print(f"wall time per cycle:    {wall / args.cycles * 1000:.1f} ms")
+        print(f"state writes/cycle:     {writes / args.cycles:.0f}")
+        print(f"suppressed writes:      {suppressed}")
+        remaining = sum(
+            entity.platform.platform_name == DOMAIN
+            for entity in hass.data["sensor"].entities
+        )
+        retired = sum(
+            coordinator.metrics.counters["retired_sensors"]
+            for coordinator in coordinators
+        )
+        print(f"sensors at the end:     {remaining} ({retired} retired)")
+        scheduler = api.get_request_stats()["scheduler"]
+        print(
+            f"scheduler:              {scheduler['waited']} waited, "
+            f"{scheduler['wait_max']:.2f} s max wait, {scheduler['throttled']} throttled"
+        )
+        if args.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"traced memory:          {current / 1024:.0f} KiB")
+            print(f"traced peak:            {peak / 1024:.0f} KiB")
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f"max RSS:                {rss / 1024:.0f} MiB")
+
+        await hass.async_stop()
+    await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=50)
+    parser.add_argument("--results", type=int, default=30)
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument(
+        "--manual-updates",
+        type=float,
+        default=0.1,
+        help="share of sensors whose async_update is called per cycle",
+    )
+    parser.add_argument("--searches", type=int, default=1)
+    parser.add_argument("--requests-per-minute", type=int, default=6000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--errors", type=float, default=0.0)
+    parser.add_argument("--rate-limits", type=float, default=0.0)
+    parser.add_argument(
+        "--payload-results",
+        type=int,
+        help="departures per board regardless of the requested results",
+    )
+    parser.add_argument("--churn", type=float, default=0.2)
+    parser.add_argument("--max-sensors", type=int, default=DEFAULT_MAX_SENSORS)
+    parser.add_argument(
+        "--direction-sensors", type=int, default=DEFAULT_DIRECTION_SENSORS
+    )
+    parser.add_argument(
+        "--realtime-window",
+        type=int,
+        default=DEFAULT_REALTIME_WINDOW,
+        help="minutes polled onto the hourly planned board, 0 = whole board",
+    )
+    parser.add_argument(
+        "--tracked-lines",
+        nargs="*",
+        default=[],
+        help="lines whose next departure is followed at every station",
+    )
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    parser.add_argument("--capture", choices=[CAPTURE_RECORD, CAPTURE_REPLAY])
+    parser.add_argument(
+        "--capture-path", type=Path, default=Path("vbb_capture.jsonl.gz")
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=0.0,
+        help="1 replays the recorded timing, 0 answers at once",
+    )
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+    asyncio.run(async_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Synthetic transport.rest departures payloads for the benchmarks."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import random
+from typing import Any
+
+LINES = [
+    ("S7", "suburban", "S Potsdam Hauptbahnhof", "S Ahrensfelde"),
+    ("S5", "suburban", "S Westkreuz", "S Strausberg Nord"),
+    ("S3", "suburban", "S Spandau", "S Erkner"),
+    ("U5", "subway", "S+U Hauptbahnhof", "U Hönow"),
+    ("M5", "tram", "S+U Hauptbahnhof", "Zingster Str."),
+    ("M8", "tram", "S+U Hauptbahnhof", "Ahrensfelde/Stadtgrenze"),
+    ("M10", "tram", "S+U Hauptbahnhof", "S+U Warschauer Str."),
+    ("120", "bus", "S+U Hauptbahnhof", "U Wittenau"),
+    ("123", "bus", "Robert-Koch-Platz", "U Turmstr."),
+    ("142", "bus", "S Ostbahnhof", "Leopoldplatz"),
+    ("245", "bus", "Robert-Koch-Platz", "Zoologischer Garten"),
+    ("RE1", "regional", "Magdeburg Hbf", "Frankfurt (Oder), Bahnhof"),
+    ("RB10", "regional", "Nauen, Bahnhof", "S Südkreuz"),
+    ("ICE 1005", "express", "Hamburg-Altona", "München Hbf"),
+]
+
+
+def departure(
+    rng: random.Random, when: datetime, station_id: str = "900003201"
+) -> dict[str, Any]:
+    """Return one departure shaped like a transport.rest v6 response row."""
+    name, product, origin, destination = rng.choice(LINES)
+    if rng.random() < 0.5:
+        origin, destination = destination, origin
+    delay = rng.choice([None, 0, 0, 60, 120, 300])
+    planned = when.replace(microsecond=0)
+    actual = planned + timedelta(seconds=delay or 0)
+    trip = rng.randrange(10**6)
+    return {
+        "tripId": f"1|{trip}|0|86|{planned:%d%m%Y}",
+        "stop": {
+            "type": "stop",
+            "id": station_id,
+            "name": "S+U Berlin Hauptbahnhof",
+            "location": {
+                "type": "location",
+                "id": station_id,
+                "latitude": 52.525607,
+                "longitude": 13.369072,
+            },
+            "products": {
+                "suburban": True,
+                "subway": True,
+                "tram": True,
+                "bus": True,
+                "ferry": False,
+                "express": True,
+                "regional": True,
+            },
+            "stationDHID": "de:11000:900003201",
+        },
+        "when": actual.isoformat(),
+        "plannedWhen": planned.isoformat(),
+        "delay": delay,
+        "platform": str(rng.randint(1, 16)),
+        "plannedPlatform": str(rng.randint(1, 16)),
+        "prognosisType": "prognosed" if delay is not None else None,
+        "direction": destination,
+        "provenance": None,
+        "line": {
+            "type": "line",
+            "id": name.lower().replace(" ", "-"),
+            "fahrtNr": str(trip % 100000),
+            "name": name,
+            "public": True,
+            "adminCode": "BVB",
+            "productName": product.title(),
+            "mode": "train" if product in ("suburban", "regional", "express") else "bus",
+            "product": product,
+            "operator": {
+                "type": "operator",
+                "id": "berliner-verkehrsbetriebe",
+                "name": "Berliner Verkehrsbetriebe",
+            },
+        },
+        "remarks": [
+            {
+                "type": "hint",
+                "code": "bf",
+                "text": "barrier-free",
+            }
+        ],
+        "origin": {"type": "stop", "id": "900000000", "name": origin},
+        "destination": {"type": "stop", "id": "900000001", "name": destination},
+        "currentTripPosition": {
+            "type": "location",
+            "latitude": 52.5 + rng.random() / 10,
+            "longitude": 13.3 + rng.random() / 10,
+        },
+    }
+
+
+def departures_board(
+    count: int = 100,
+    *,
+    seed: int | str = 0,
+    start: datetime | None = None,
+    station_id: str = "900003201",
+) -> list[dict[str, Any]]:
+    """Return ``count`` departures spread over the next two hours."""
+    rng = random.Random(seed)
+    start = start or datetime.now(timezone.utc)
+    return [
+        departure(rng, start + timedelta(seconds=rng.randint(60, 7200)), station_id)
+        for _ in range(count)
+    ]
+
+
+STOP_WORDS = [
+    "Alexanderplatz", "Hauptbahnhof", "Zoologischer Garten", "Ostkreuz",
+    "Friedrichstr.", "Rathaus", "Schloss", "Kirche", "Markt", "Bhf",
+    "Dorfstr.", "Waldweg", "Am See", "Schule", "Gartenstr.", "Platz",
+]
+TOWNS = ["Berlin", "Potsdam", "Cottbus", "Eberswalde", "Nauen", "Erkner"]
+
+
+def stops_txt(count: int = 13000, *, seed: int = 0) -> str:
+    """Return a GTFS ``stops.txt`` with ``count`` stations and their platforms."""
+    rng = random.Random(seed)
+    lines = [
+        "stop_id,stop_code,stop_name,stop_desc,stop_lat,stop_lon,"
+        "location_type,parent_station,wheelchair_boarding,platform_code,zone_id"
+    ]
+    for index in range(count):
+        station = f"de:12000:{900000000 + index * 7:09d}"
+        town = rng.choice(TOWNS)
+        prefix = rng.choice(["", "", "S ", "U ", "S+U "])
+        name = f"{prefix}{town}, {' '.join(rng.sample(STOP_WORDS, 2))} {index}"
+        if town == "Berlin":
+            name = f"{prefix}{' '.join(rng.sample(STOP_WORDS, 2))} {index} (Berlin)"
+        lat = 52.0 + rng.random()
+        lon = 12.8 + rng.random() * 1.6
+        lines.append(f'{station},,"{name}",,{lat:.6f},{lon:.6f},1,,,,')
+        for platform in (1, 2):
+            lines.append(
+                f'{station}::{platform},,"{name}",,{lat:.6f},{lon:.6f},0,{station},,'
+                f"{platform},"
+            )
+    return "\n".join(lines) + "\n"
+
+
+# GTFS route types of the VBB feed and the product each stands for.
+ROUTE_TYPES = [
+    (109, "S"), (400, "U"), (900, "M"), (700, ""), (700, "X"), (100, "RE"),
+    (1000, "F"), (102, "ICE "),
+]
+
+
+def write_gtfs_feed(
+    directory: Path,
+    stations: int = 13000,
+    trips: int = 20000,
+    stops_per_trip: int = 25,
+    *,
+    seed: int = 0,
+) -> None:
+    """Write a GTFS feed with a timetable to ``directory``.
+
+    Trips run every day, on weekdays or on weekends, between 04:00 and
+    01:30 of the next day, so some of them cross midnight.
+    """
+    rng = random.Random(seed)
+    (directory / "stops.txt").write_text(
+        stops_txt(stations, seed=seed), encoding="utf-8"
+    )
+    (directory / "agency.txt").write_text(
+        "agency_id,agency_name,agency_url,agency_timezone\n"
+        "1,Berliner Verkehrsbetriebe,https://www.bvg.de,Europe/Berlin\n",
+        encoding="utf-8",
+    )
+    routes = ["route_id,agency_id,route_short_name,route_long_name,route_type"]
+    for index in range(300):
+        route_type, prefix = ROUTE_TYPES[index % len(ROUTE_TYPES)]
+        routes.append(f"{index},1,{prefix}{index},,{route_type}")
+    (directory / "routes.txt").write_text("\n".join(routes) + "\n", encoding="utf-8")
+    (directory / "calendar.txt").write_text(
+        "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,"
+        "start_date,end_date\n"
+        "daily,1,1,1,1,1,1,1,20240101,20351231\n"
+        "weekdays,1,1,1,1,1,0,0,20240101,20351231\n"
+        "weekends,0,0,0,0,0,1,1,20240101,20351231\n",
+        encoding="utf-8",
+    )
+    (directory / "calendar_dates.txt").write_text(
+        "service_id,date,exception_type\n"
+        "weekdays,20261225,2\nweekends,20261225,1\n",
+        encoding="utf-8",
+    )
+    with (directory / "trips.txt").open("w", encoding="utf-8") as trips_file, (
+        directory / "stop_times.txt"
+    ).open("w", encoding="utf-8") as times_file:
+        trips_file.write("route_id,service_id,trip_id,trip_headsign\n")
+        times_file.write(
+            "trip_id,arrival_time,departure_time,stop_id,stop_sequence,pickup_type\n"
+        )
+        for trip in range(trips):
+            service = rng.choice(["daily", "daily", "weekdays", "weekends"])
+            stops = rng.sample(range(stations), stops_per_trip)
+            trips_file.write(f"{rng.randrange(300)},{service},{trip},Richtung {trip}\n")
+            seconds = rng.randint(4 * 3600, 25 * 3600 + 1800)
+            for sequence, station in enumerate(stops):
+                stamp = (
+                    f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+                )
+                stop_id = f"de:12000:{900000000 + station * 7:09d}::{sequence % 2 + 1}"
+                times_file.write(f"{trip},{stamp},{stamp},{stop_id},{sequence},0\n")
+                seconds += rng.randint(60, 180)
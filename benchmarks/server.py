@@ -0,0 +1,252 @@
+"""Local stand-in for the transport.rest endpoints used by the integration.
+
+Serves ``/stops/{id}/departures``, ``/trips/{id}``, ``/locations`` and
+``/locations/nearby`` without any network access. Run it standalone to point a development
+instance at it::
+
+    python benchmarks/server.py [--port 8080] [--latency 0.05] [--errors 0.01]
+
+or start it from a benchmark with ``async_start_server``. Departure boards
+are synthetic unless ``fixtures/departures/<station>.json`` holds a
+recorded response, which is shifted so its first departure is upcoming.
+Location searches are answered from ``fixtures/locations.json`` and
+``fixtures/nearby.json``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import json
+from pathlib import Path
+import random
+import sys
+from typing import Any
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.payloads import departures_board  # noqa: E402
+
+FIXTURES = Path(__file__).with_name("fixtures")
+
+
+@dataclass
+class StandInOptions:
+    """Behaviour of the stand-in server."""
+
+    # Seconds added to every response, plus up to ``jitter`` seconds.
+    latency: float = 0.0
+    jitter: float = 0.0
+    # Share of requests answered with a 503 and with a 429.
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 5
+    # Departures per board; ``None`` honours the ``results`` query.
+    results: int | None = None
+    # Share of departures requests that return a board with new delays.
+    churn: float = 0.2
+    fixtures: Path = FIXTURES
+    seed: int = 0
+
+
+@dataclass
+class StandInStats:
+    """What the stand-in served."""
+
+    requests: Counter[str] = field(default_factory=Counter)
+    statuses: Counter[int] = field(default_factory=Counter)
+    bytes_sent: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters as plain dictionaries."""
+        return {
+            "requests": dict(self.requests),
+            "statuses": dict(self.statuses),
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+class StandIn:
+    """aiohttp application answering like transport.rest."""
+
+    def __init__(self, options: StandInOptions | None = None) -> None:
+        self.options = options or StandInOptions()
+        self.stats = StandInStats()
+        self._rng = random.Random(self.options.seed)
+        self._started = datetime.now(timezone.utc).replace(microsecond=0)
+        self._generations: Counter[str] = Counter()
+        self._fixtures: dict[Path, Any] = {}
+
+    def create_app(self) -> web.Application:
+        """Return the application serving the endpoints."""
+        app = web.Application()
+        app.router.add_get("/stops/{station}/departures", self._departures)
+        app.router.add_get("/trips/{trip}", self._trip)
+        app.router.add_get("/locations", self._locations)
+        app.router.add_get("/locations/nearby", self._nearby)
+        return app
+
+    def _fixture(self, *parts: str) -> Any:
+        path = self.options.fixtures.joinpath(*parts)
+        if path not in self._fixtures:
+            self._fixtures[path] = (
+                json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+            )
+        return self._fixtures[path]
+
+    async def _respond(self, name: str, payload: Any) -> web.Response:
+        """Apply the configured latency and failures to a response."""
+        options = self.options
+        self.stats.requests[name] += 1
+        delay = options.latency + self._rng.random() * options.jitter
+        if delay:
+            await asyncio.sleep(delay)
+
+        draw = self._rng.random()
+        if draw < options.rate_limit_rate:
+            response = web.json_response(
+                {"message": "too many requests"},
+                status=429,
+                headers={"Retry-After": str(options.retry_after)},
+            )
+        elif draw < options.rate_limit_rate + options.error_rate:
+            response = web.json_response({"message": "unavailable"}, status=503)
+        else:
+            response = web.json_response(payload)
+        self.stats.statuses[response.status] += 1
+        self.stats.bytes_sent += len(response.body or b"")
+        return response
+
+    async def _departures(self, request: web.Request) -> web.Response:
+        station = request.match_info["station"]
+        count = self.options.results or int(request.query.get("results", 10))
+        products = {
+            key for key, value in request.query.items() if value == "false"
+        }
+
+        recorded = self._fixture("departures", f"{station}.json")
+        if recorded is not None:
+            rows = _retime(recorded, self._started + timedelta(minutes=1))[:count]
+        else:
+            if self._rng.random() < self.options.churn:
+                self._generations[station] += 1
+            rows = departures_board(
+                count,
+                seed=f"{station}/{self._generations[station]}",
+                start=self._started,
+                station_id=station,
+            )
+        rows = [
+            row
+            for row in rows
+            if (row.get("line") or {}).get("product") not in products
+        ]
+        if duration := int(request.query.get("duration", 0)):
+            until = datetime.now(timezone.utc) + timedelta(minutes=duration)
+            rows = [
+                row
+                for row in rows
+                if not row.get("plannedWhen")
+                or datetime.fromisoformat(row["plannedWhen"]) <= until
+            ]
+        return await self._respond(
+            "departures", {"departures": rows, "realtimeDataUpdatedAt": None}
+        )
+
+    async def _trip(self, request: web.Request) -> web.Response:
+        """Answer with a vehicle moving east by about 10 m per second."""
+        trip = request.match_info["trip"]
+        seconds = (datetime.now(timezone.utc) - self._started).total_seconds()
+        start = random.Random(trip).random() / 10
+        return await self._respond(
+            "trips",
+            {
+                "trip": {
+                    "id": trip,
+                    "currentLocation": {
+                        "type": "location",
+                        "latitude": round(52.5 + start, 6),
+                        "longitude": round(13.3 + start + seconds * 0.00015, 6),
+                    },
+                },
+                "realtimeDataUpdatedAt": None,
+            },
+        )
+
+    async def _locations(self, request: web.Request) -> web.Response:
+        query = request.query.get("query", "").casefold()
+        stops = self._fixture("locations.json") or []
+        return await self._respond(
+            "locations", [stop for stop in stops if query in stop["name"].casefold()]
+        )
+
+    async def _nearby(self, request: web.Request) -> web.Response:
+        return await self._respond("nearby", self._fixture("nearby.json") or [])
+
+
+def _retime(rows: Any, start: datetime) -> list[dict[str, Any]]:
+    """Shift a recorded board so its first departure is at ``start``."""
+    if isinstance(rows, dict):
+        rows = rows.get("departures", [])
+    times = [
+        datetime.fromisoformat(row["plannedWhen"])
+        for row in rows
+        if row.get("plannedWhen")
+    ]
+    if not times:
+        return list(rows)
+    offset = start - min(times)
+    shifted = []
+    for row in rows:
+        row = dict(row)
+        for key in ("when", "plannedWhen"):
+            if row.get(key):
+                row[key] = (datetime.fromisoformat(row[key]) + offset).isoformat()
+        shifted.append(row)
+    return shifted
+
+
+async def async_start_server(
+    stand_in: StandIn, host: str = "127.0.0.1", port: int = 0
+) -> tuple[web.AppRunner, str]:
+    """Start ``stand_in`` and return its runner and base URL."""
+    runner = web.AppRunner(stand_in.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound = runner.addresses[0]
+    return runner, f"http://{bound[0]}:{bound[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--errors", type=float, default=0.0)
+    parser.add_argument("--rate-limits", type=float, default=0.0)
+    parser.add_argument("--results", type=int)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    args = parser.parse_args()
+
+    stand_in = StandIn(
+        StandInOptions(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.errors,
+            rate_limit_rate=args.rate_limits,
+            results=args.results,
+            fixtures=args.fixtures,
+        )
+    )
+    web.run_app(stand_in.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
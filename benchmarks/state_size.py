@@ -0,0 +1,117 @@
+"""Measure the bytes written per sensor state update.
+
+Run from the repository root with Home Assistant installed::
+
+    python benchmarks/state_size.py [--results 100]
+
+For every sensor of a synthetic station board it reports the size of the
+JSON encoded state and attributes, both as written to the state machine and
+as stored by the recorder, with and without compact attributes. Before
+attributes were excluded from the recorder, everything written was also
+recorded.
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import timedelta
+import json
+from pathlib import Path
+import sys
+from types import SimpleNamespace
+
+from homeassistant.util import dt as dt_util
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.payloads import departures_board  # noqa: E402
+from custom_components.vbb.const import PRODUCT_OPTIONS, UNRECORDED_ATTRIBUTES  # noqa: E402
+from custom_components.vbb.sensor import (  # noqa: E402
+    DirectionGroup,
+    VbbDepartureSensor,
+    VbbDirectionSensor,
+    VbbStationSensor,
+)
+from custom_components.vbb.snapshot import DepartureSnapshot  # noqa: E402
+
+
+def _coordinator(snapshot: DepartureSnapshot, compact: bool) -> SimpleNamespace:
+    """Return the parts of the station coordinator the sensors read."""
+    return SimpleNamespace(
+        station_id="900003201",
+        station_name="S+U Berlin Hauptbahnhof",
+        products=set(PRODUCT_OPTIONS),
+        compact_attributes=compact,
+        tracked_lines=set(),
+        data=snapshot,
+        last_update_success=True,
+        poll_interval=timedelta(minutes=5),
+        update_count=0,
+        is_stale=lambda now: False,
+        is_expired=lambda now: False,
+    )
+
+
+def _sensors(coordinator: SimpleNamespace) -> list:
+    sensors: list = [VbbStationSensor(coordinator)]
+    destinations: set[tuple[str, str]] = set()
+    directions: set[tuple[str, str]] = set()
+    for dep in coordinator.data.departures:
+        destinations.add((dep.line, dep.destination_name))
+        directions.add((dep.line, dep.direction))
+    sensors += [VbbDepartureSensor(coordinator, *pair) for pair in sorted(destinations)]
+    for pair in sorted(directions):
+        group = DirectionGroup(coordinator, *pair)
+        sensors += [VbbDirectionSensor(group, index) for index in range(3)]
+    return sensors
+
+
+def _size(state: object, attributes: dict) -> int:
+    return len(json.dumps({"state": state, "attributes": attributes}, default=str))
+
+
+def measure(results: int, compact: bool) -> dict[str, float]:
+    """Return the average and total bytes per state write."""
+    snapshot = DepartureSnapshot.from_departures(
+        departures_board(results), dt_util.utcnow(), "https://v6.vbb.transport.rest"
+    )
+    sensors = _sensors(_coordinator(snapshot, compact))
+    written = recorded = 0
+    for sensor in sensors:
+        sensor._handle_departures()
+        attributes = sensor.extra_state_attributes
+        state = sensor.native_value
+        written += _size(state, attributes)
+        recorded += _size(
+            state,
+            {k: v for k, v in attributes.items() if k not in UNRECORDED_ATTRIBUTES},
+        )
+    return {
+        "sensors": len(sensors),
+        "written_avg": written / len(sensors),
+        "written_total": written,
+        "recorded_avg": recorded / len(sensors),
+        "recorded_total": recorded,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=100)
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':<10}{'sensors':>9}{'written/state':>15}{'written/cycle':>15}"
+        f"{'recorded/state':>16}{'recorded/cycle':>16}"
+    )
+    for compact in (False, True):
+        row = measure(args.results, compact)
+        print(
+            f"{'compact' if compact else 'full':<10}{row['sensors']:>9}"
+            f"{row['written_avg']:>15.0f}{row['written_total']:>15}"
+            f"{row['recorded_avg']:>16.0f}{row['recorded_total']:>16}"
+        )
+
+
+if __name__ == "__main__":
+    main()
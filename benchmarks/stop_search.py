@@ -0,0 +1,110 @@
+"""Compare station searches through the API with the local stop index.
+
+Run from the repository root with Home Assistant installed::
+
+    python benchmarks/stop_search.py [--stations 13000] [--latency 0.2]
+
+Writes a synthetic GTFS ``stops.txt``, builds the stop index from it and
+times name and nearby searches against it. The same searches go through
+the location cache to the local stand-in server, whose latency models the
+public API, first uncached and then as cache hits.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aiohttp import ClientSession
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.payloads import STOP_WORDS, stops_txt  # noqa: E402
+from benchmarks.server import StandIn, StandInOptions, async_start_server  # noqa: E402
+from custom_components.vbb import api, stops  # noqa: E402
+
+
+def _queries(rng: random.Random, count: int) -> list[str]:
+    """Return prefixes of stop words, some of them misspelled."""
+    words = [word.rstrip(".") for name in STOP_WORDS for word in name.split()]
+    words = [word for word in words if len(word) > 3]
+    queries = []
+    for _ in range(count):
+        word = rng.choice(words)
+        query = word[: rng.randint(3, len(word))]
+        if rng.random() < 0.2 and len(word) > 5:
+            # Swap two letters.
+            i = rng.randrange(1, len(word) - 2)
+            query = word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+        queries.append(query)
+    return queries
+
+
+def _per_call_ms(func, args_list) -> float:
+    started = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - started) / len(args_list) * 1000
+
+
+async def _async_api_ms(session: ClientSession, queries: list[str]) -> float:
+    started = time.perf_counter()
+    for query in queries:
+        await stops.async_search_stations(session, query)
+    return (time.perf_counter() - started) / len(queries) * 1000
+
+
+async def async_run(args: argparse.Namespace) -> None:
+    rng = random.Random(0)
+    queries = _queries(rng, args.queries)
+    positions = [
+        (52.0 + rng.random(), 12.8 + rng.random() * 1.6) for _ in range(args.queries)
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "stops.txt"
+        path.write_text(stops_txt(args.stations), encoding="utf-8")
+        started = time.perf_counter()
+        index = stops.StopIndex.load(path)
+        build_s = time.perf_counter() - started
+        tracemalloc.start()
+        kept = stops.StopIndex.load(path)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+
+    found = sum(bool(index.search(query)) for query in queries)
+    print(f"stations:               {len(index)}")
+    print(f"index build:            {build_s:.2f} s")
+    print(f"index memory:           {memory / 1024 / 1024:.1f} MiB")
+    print(f"name search:            {_per_call_ms(index.search, [(q,) for q in queries]):.3f} ms")
+    print(f"queries with results:   {found}/{len(queries)}")
+    print(f"nearby search:          {_per_call_ms(index.nearby, positions):.3f} ms")
+
+    stand_in = StandIn(StandInOptions(latency=args.latency, jitter=0))
+    runner, base_url = await async_start_server(stand_in)
+    api.configure_base_urls([base_url])
+    api.configure_request_budget(6000)
+    async with ClientSession() as session:
+        unique = list(dict.fromkeys(queries))
+        print(f"API search, uncached:   {await _async_api_ms(session, unique):.1f} ms")
+        print(f"API search, cached:     {await _async_api_ms(session, unique):.3f} ms")
+    await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=13000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    asyncio.run(async_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Time the build and the queries of the offline GTFS timetable.
+
+Run from the repository root::
+
+    python benchmarks/timetable.py [--stations 13000] [--trips 50000]
+
+Writes a synthetic GTFS feed, preprocesses it into the memory-mapped
+timetable and reports the build time, the peak memory of the build, the
+size of the timetable file and the time of one departures query.
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.payloads import write_gtfs_feed  # noqa: E402
+from custom_components.vbb.const import PRODUCT_OPTIONS  # noqa: E402
+from custom_components.vbb.timetable import (  # noqa: E402
+    Timetable,
+    build_timetable,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stations", type=int, default=13000)
+    parser.add_argument("--trips", type=int, default=50000)
+    parser.add_argument("--stops-per-trip", type=int, default=25)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        feed = Path(directory)
+        write_gtfs_feed(feed, args.stations, args.trips, args.stops_per_trip)
+        stop_times = (feed / "stop_times.txt").stat().st_size
+        target = feed / "vbb.timetable"
+
+        started = time.perf_counter()
+        build_timetable(feed, target)
+        build_s = time.perf_counter() - started
+        tracemalloc.start()
+        build_timetable(feed, target)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        started = time.perf_counter()
+        timetable = Timetable.open(target)
+        open_ms = (time.perf_counter() - started) * 1000
+
+        rng = random.Random(0)
+        stations = list(timetable._stations)
+        start = datetime(2026, 10, 19, 3, tzinfo=timezone.utc)
+        queries = [
+            (
+                rng.choice(stations),
+                start + timedelta(minutes=rng.randrange(7 * 24 * 60)),
+            )
+            for _ in range(args.queries)
+        ]
+        products = set(PRODUCT_OPTIONS)
+        started = time.perf_counter()
+        rows = sum(
+            len(timetable.departures(station, now, 120, 10, products))
+            for station, now in queries
+        )
+        query_us = (time.perf_counter() - started) / len(queries) * 1e6
+
+        print(f"stop_times.txt:         {stop_times / 1024 / 1024:.1f} MiB")
+        print(f"stop times:             {args.trips * args.stops_per_trip}")
+        print(f"build:                  {build_s:.1f} s")
+        print(f"build peak memory:      {peak / 1024 / 1024:.1f} MiB")
+        print(f"timetable file:         {target.stat().st_size / 1024 / 1024:.1f} MiB")
+        print(f"open:                   {open_ms:.1f} ms")
+        print(f"query (10 departures):  {query_us:.0f} us")
+        print(f"departures per query:   {rows / len(queries):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Measure the cost of one station update cycle.
+
+Run from the repository root with Home Assistant installed::
+
+    python benchmarks/update_cycle.py [--results 100] [--rounds 20]
+
+It decodes a synthetic board into a departures snapshot and lets every
+sensor of the station re-evaluate it. It reports the time of both steps,
+the memory the snapshot keeps alive until the next fetch and the peak
+memory of the sensor updates.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+from pathlib import Path
+import sys
+import time
+import tracemalloc
+
+from homeassistant.util import dt as dt_util
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.payloads import departures_board  # noqa: E402
+from benchmarks.state_size import _coordinator, _sensors  # noqa: E402
+from custom_components.vbb.snapshot import DepartureSnapshot  # noqa: E402
+
+
+def _retained(func) -> tuple[int, int]:
+    """Return the number and size of blocks ``func`` leaves allocated."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = func()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    del result
+    return (
+        sum(stat.count_diff for stat in stats),
+        sum(stat.size_diff for stat in stats),
+    )
+
+
+def _peak(func) -> int:
+    """Return the peak of memory allocated while ``func`` runs."""
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = json.dumps(departures_board(args.results))
+    fetched_at = dt_util.utcnow()
+
+    def build() -> DepartureSnapshot:
+        # Decode inside the measurement: whatever of the response the
+        # snapshot keeps referencing stays cached until the next fetch.
+        return DepartureSnapshot.from_departures(
+            json.loads(payload), fetched_at, "bench"
+        )
+
+    snapshot = build()
+    coordinator = _coordinator(snapshot, False)
+    sensors = _sensors(coordinator)
+
+    def update() -> None:
+        # Like DataUpdateCoordinator.async_update_listeners.
+        coordinator.update_count += 1
+        for sensor in sensors:
+            sensor._handle_departures()
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        build()
+    build_ms = (time.perf_counter() - started) / args.rounds * 1000
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        update()
+    update_ms = (time.perf_counter() - started) / args.rounds * 1000
+
+    kept_blocks, kept_bytes = _retained(build)
+    update_peak = _peak(update)
+
+    print(f"departures:             {args.results}")
+    print(f"sensors:                {len(sensors)}")
+    print(f"decode + snapshot:      {build_ms:.2f} ms")
+    print(f"sensor update cycle:    {update_ms:.2f} ms")
+    print(f"snapshot memory:        {kept_bytes / args.results:.0f} B/departure")
+    print(f"snapshot blocks:        {kept_blocks}")
+    print(f"update cycle peak:      {update_peak / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
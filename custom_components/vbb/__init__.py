@@ -2,17 +2,316 @@
 
 from __future__ import annotations
 
+import logging
+from pathlib import Path
+from typing import Any
+import zipfile
+
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    CONF_MODE,
+    CONF_NAME,
+    CONF_PATH,
+    EVENT_HOMEASSISTANT_FINAL_WRITE,
+)
+from homeassistant.core import (
+    Event,
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.storage import STORAGE_DIR
+from homeassistant.helpers.typing import ConfigType
+from homeassistant.util import dt as dt_util
+
+from .api import configure_capture, configure_concurrency, configure_request_budget
+from .capture import CaptureRecorder, CaptureReplayer
+from .const import (
+    ATTR_LIMIT,
+    CAPTURE_RECORD,
+    CAPTURE_REPLAY,
+    CONF_BACKUPS,
+    CONF_CAPTURE,
+    CONF_COMPACT_ATTRIBUTES,
+    CONF_DIRECTION_SENSORS,
+    CONF_DURATION,
+    CONF_GTFS_PATH,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_MAX_SENSORS,
+    CONF_MAX_SIZE,
+    CONF_MAX_TRACKED_TRIPS,
+    CONF_PRIORITY,
+    CONF_PRODUCTS,
+    CONF_QUIET_HOURS,
+    CONF_REALTIME_WINDOW,
+    CONF_REQUESTS_PER_MINUTE,
+    CONF_RESULTS,
+    CONF_RETIRE_AFTER,
+    CONF_SPEED,
+    CONF_STATION_ID,
+    CONF_TRACKED_LINES,
+    CONF_UPDATE_INTERVAL,
+    DATA_POLLER,
+    DATA_TRIP_TRACKER,
+    DEFAULT_CAPTURE_BACKUPS,
+    DEFAULT_CAPTURE_MAX_SIZE,
+    DEFAULT_CAPTURE_PATH,
+    DEFAULT_CAPTURE_SPEED,
+    DEFAULT_COMPACT_ATTRIBUTES,
+    DEFAULT_DIRECTION_SENSORS,
+    DEFAULT_DURATION,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_MAX_SENSORS,
+    DEFAULT_MAX_TRACKED_TRIPS,
+    DEFAULT_PRIORITY,
+    DEFAULT_PRODUCTS,
+    DEFAULT_REALTIME_WINDOW,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_RESULTS,
+    DEFAULT_RETIRE_AFTER,
+    DEFAULT_UPDATE_INTERVAL,
+    DOMAIN,
+    SERVICE_GET_DEPARTURES,
+    TIMETABLE_FILE,
+)
+from .coordinator import VbbStationCoordinator
+from .poller import StationPoller, async_create_poller
+from .snapshot import Departure
+from .stops import StopIndex, configure_stop_index
+from .timetable import configure_timetable, load_timetable
+from .trips import async_create_trip_tracker
 
-from .const import DOMAIN
+_LOGGER = logging.getLogger(__name__)
 
 PLATFORMS = ["sensor", "switch"]
 
+CAPTURE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_MODE): vol.In([CAPTURE_RECORD, CAPTURE_REPLAY]),
+        vol.Optional(CONF_PATH, default=DEFAULT_CAPTURE_PATH): cv.string,
+        vol.Optional(CONF_MAX_SIZE, default=DEFAULT_CAPTURE_MAX_SIZE): vol.All(
+            int, vol.Range(min=1)
+        ),
+        vol.Optional(CONF_BACKUPS, default=DEFAULT_CAPTURE_BACKUPS): vol.All(
+            int, vol.Range(min=0)
+        ),
+        vol.Optional(CONF_SPEED, default=DEFAULT_CAPTURE_SPEED): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+    }
+)
+
+CONFIG_SCHEMA = vol.Schema(
+    {
+        vol.Optional(DOMAIN): vol.Schema(
+            {
+                vol.Optional(
+                    CONF_REQUESTS_PER_MINUTE, default=DEFAULT_REQUESTS_PER_MINUTE
+                ): vol.All(int, vol.Range(min=1)),
+                vol.Optional(
+                    CONF_MAX_CONCURRENT_REQUESTS,
+                    default=DEFAULT_MAX_CONCURRENT_REQUESTS,
+                ): vol.All(int, vol.Range(min=1)),
+                vol.Optional(CONF_CAPTURE): CAPTURE_SCHEMA,
+                vol.Optional(CONF_GTFS_PATH): cv.string,
+                vol.Optional(
+                    CONF_MAX_TRACKED_TRIPS, default=DEFAULT_MAX_TRACKED_TRIPS
+                ): vol.All(int, vol.Range(min=0)),
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
+GET_DEPARTURES_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_STATION_ID): cv.string,
+        vol.Optional(ATTR_LIMIT): vol.All(int, vol.Range(min=1)),
+    }
+)
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Apply the integration wide settings from configuration.yaml."""
+    conf = config.get(DOMAIN, {})
+    configure_request_budget(
+        conf.get(CONF_REQUESTS_PER_MINUTE, DEFAULT_REQUESTS_PER_MINUTE)
+    )
+    max_concurrent = conf.get(
+        CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+    )
+    configure_concurrency(max_concurrent)
+    poller = hass.data[DATA_POLLER] = async_create_poller(hass, max_concurrent)
+    hass.data[DATA_TRIP_TRACKER] = async_create_trip_tracker(
+        hass,
+        poller.session,
+        conf.get(CONF_MAX_TRACKED_TRIPS, DEFAULT_MAX_TRACKED_TRIPS),
+    )
+    if CONF_CAPTURE in conf:
+        await _async_setup_capture(hass, conf[CONF_CAPTURE])
+    if CONF_GTFS_PATH in conf:
+        await _async_setup_stop_index(hass, conf[CONF_GTFS_PATH])
+        # Building the timetable of a new feed takes a while.
+        hass.async_create_background_task(
+            _async_setup_timetable(hass, conf[CONF_GTFS_PATH]), "vbb timetable"
+        )
+
+    async def async_get_departures(call: ServiceCall) -> ServiceResponse:
+        """Return the full departures board of a station."""
+        station_id = call.data[CONF_STATION_ID]
+        coordinator = next(
+            (
+                coordinator
+                for coordinator in hass.data.get(DOMAIN, {}).values()
+                if coordinator.station_id == station_id
+            ),
+            None,
+        )
+        if coordinator is None:
+            raise HomeAssistantError(f"VBB station {station_id} is not set up")
+
+        snapshot = coordinator.data
+        if snapshot is None:
+            return {"station_id": station_id, "fetched_at": None, "departures": []}
+        rows = snapshot.for_products(coordinator.products, dt_util.utcnow())
+        return {
+            "station_id": station_id,
+            "fetched_at": snapshot.fetched_at.isoformat() if snapshot.fetched_at else None,
+            "departures": [
+                _board_entry(dep) for dep in rows[: call.data.get(ATTR_LIMIT)]
+            ],
+        }
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_DEPARTURES,
+        async_get_departures,
+        schema=GET_DEPARTURES_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    return True
+
+async def _async_setup_capture(hass: HomeAssistant, conf: ConfigType) -> None:
+    """Record API responses to the capture log or replay them from it."""
+    path = Path(hass.config.path(conf[CONF_PATH]))
+    if conf[CONF_MODE] == CAPTURE_RECORD:
+        recorder = CaptureRecorder(
+            hass, path, conf[CONF_MAX_SIZE] * 1024 * 1024, conf[CONF_BACKUPS]
+        )
+        configure_capture(recorder=recorder)
+
+        async def async_flush(event: Event) -> None:
+            await recorder.async_flush()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_FINAL_WRITE, async_flush)
+        _LOGGER.warning("Recording VBB API responses to %s", path)
+        return
+
+    replayer = await hass.async_add_executor_job(
+        CaptureReplayer.load, path, conf[CONF_BACKUPS], conf[CONF_SPEED]
+    )
+    configure_capture(replayer=replayer)
+    _LOGGER.warning(
+        "Replaying %s captured VBB API responses from %s instead of the API",
+        len(replayer),
+        path,
+    )
+
+async def _async_setup_stop_index(hass: HomeAssistant, gtfs_path: str) -> None:
+    """Answer station searches from the stops of a GTFS feed."""
+    path = Path(hass.config.path(gtfs_path))
+    try:
+        index = await hass.async_add_executor_job(StopIndex.load, path)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as err:
+        _LOGGER.error("Could not read the GTFS stops from %s: %s", path, err)
+        return
+    configure_stop_index(index)
+    _LOGGER.info("Loaded %s stations from %s for the station search", len(index), path)
+
+async def _async_setup_timetable(hass: HomeAssistant, gtfs_path: str) -> None:
+    """Fall back to the timetable of a GTFS feed when the API is unreachable."""
+    path = Path(hass.config.path(gtfs_path))
+    target = Path(hass.config.path(STORAGE_DIR, TIMETABLE_FILE))
+    try:
+        timetable = await hass.async_add_executor_job(load_timetable, path, target)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as err:
+        _LOGGER.error("Could not read the GTFS timetable from %s: %s", path, err)
+        return
+    if timetable is None:
+        _LOGGER.debug("No stop times in %s, scheduled departures are unavailable", path)
+        return
+    configure_timetable(timetable)
+    _LOGGER.info(
+        "Loaded the timetable of %s stations from %s as fallback", len(timetable), path
+    )
+
+def _board_entry(dep: Departure) -> dict[str, Any]:
+    """Describe one departure in the get_departures response."""
+    return {
+        "when": dep.time,
+        "delay": dep.delay,
+        "line": dep.line,
+        "product": dep.product,
+        "destination": dep.destination,
+        "direction": dep.direction,
+        "platform": dep.platform,
+        "trip_id": dep.trip_id,
+        "prognosis_type": dep.prognosis_type,
+    }
+
+def _entry_settings(entry: ConfigEntry) -> dict[str, Any]:
+    """Return the station settings; those changed in the options win."""
+    return {
+        **entry.data,
+        **{key: value for key, value in entry.options.items() if key != CONF_PRODUCTS},
+    }
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up VBB from a config entry."""
+    poller: StationPoller = hass.data[DATA_POLLER]
+    settings = _entry_settings(entry)
+    coordinator = VbbStationCoordinator(
+        hass,
+        settings[CONF_STATION_ID],
+        settings[CONF_NAME],
+        settings.get(CONF_DURATION, DEFAULT_DURATION),
+        settings.get(CONF_RESULTS, DEFAULT_RESULTS),
+        entry.options.get(
+            CONF_PRODUCTS, entry.data.get(CONF_PRODUCTS, DEFAULT_PRODUCTS)
+        ),
+        settings.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL),
+        session=poller.session,
+        quiet_hours=settings.get(CONF_QUIET_HOURS),
+        compact_attributes=settings.get(
+            CONF_COMPACT_ATTRIBUTES, DEFAULT_COMPACT_ATTRIBUTES
+        ),
+        priority=settings.get(CONF_PRIORITY, DEFAULT_PRIORITY),
+        retire_after=settings.get(CONF_RETIRE_AFTER, DEFAULT_RETIRE_AFTER),
+        max_sensors=settings.get(CONF_MAX_SENSORS, DEFAULT_MAX_SENSORS),
+        direction_sensors=settings.get(
+            CONF_DIRECTION_SENSORS, DEFAULT_DIRECTION_SENSORS
+        ),
+        realtime_window=settings.get(CONF_REALTIME_WINDOW, DEFAULT_REALTIME_WINDOW),
+        tracked_lines=settings.get(CONF_TRACKED_LINES, []),
+    )
+    await coordinator.async_setup()
+    entry.async_on_unload(poller.async_add(coordinator))
+
+    async def async_entry_updated(hass: HomeAssistant, entry: ConfigEntry) -> None:
+        # The product switches apply their changes themselves; other
+        # settings take a reload.
+        if _entry_settings(entry) != settings:
+            await hass.config_entries.async_reload(entry.entry_id)
+
+    entry.async_on_unload(entry.add_update_listener(async_entry_updated))
+
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = entry
+    hass.data[DOMAIN][entry.entry_id] = coordinator
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     return True
 
@@ -3,35 +3,297 @@
 from __future__ import annotations
 
 import asyncio
+from collections.abc import Callable, Iterable
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from http import HTTPStatus
+import logging
+import time
 from typing import Any, Mapping
 
 from aiohttp import ClientError, ClientResponseError, ClientSession
 import async_timeout
 
-from .const import API_BASES, HEADERS, REQUEST_TIMEOUT
+from homeassistant.util import dt as dt_util
+
+from .bases import BaseUrlPool
+from .capture import CaptureRecorder, CaptureReplayer
+from .const import (
+    API_BASES,
+    CACHE_TTL,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_RETRY_AFTER,
+    HEADERS,
+    PRIORITY_REFRESH,
+    REQUEST_TIMEOUT,
+)
+from .metrics import Metrics
+from .ratelimit import RequestScheduler, parse_retry_after
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover - orjson ships with Home Assistant
+    from json import loads as json_loads
+
+_LOGGER = logging.getLogger(__name__)
+
+Projection = Callable[[Any], Any]
+RequestKey = tuple[str, tuple[tuple[str, str], ...], Projection | None]
+
+
+@dataclass(frozen=True, slots=True)
+class ApiResponse:
+    """Decoded response together with where and when it was fetched."""
+
+    data: Any
+    base_url: str
+    fetched_at: datetime
+
+
+@dataclass
+class RequestStats:
+    """Counters describing how requests were served."""
+
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+
+
+_STATS = RequestStats()
+_METRICS = Metrics()
+_SCHEDULER = RequestScheduler(DEFAULT_REQUESTS_PER_MINUTE)
+_BASES = BaseUrlPool(API_BASES)
+_CONCURRENCY = asyncio.Semaphore(DEFAULT_MAX_CONCURRENT_REQUESTS)
+_IN_FLIGHT: dict[RequestKey, asyncio.Task[ApiResponse]] = {}
+_CACHE: dict[RequestKey, tuple[float, ApiResponse]] = {}
+_RECORDER: CaptureRecorder | None = None
+_REPLAYER: CaptureReplayer | None = None
+
+
+def _request_key(
+    path: str, params: Mapping[str, Any] | None, project: Projection | None
+) -> RequestKey:
+    """Return a hashable key identifying a request."""
+    return (
+        path,
+        tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())),
+        project,
+    )
+
+
+def configure_base_urls(base_urls: Iterable[str]) -> None:
+    """Send requests to ``base_urls`` instead of the public API."""
+    global _BASES
+    _BASES = BaseUrlPool(base_urls)
+
+
+def configure_capture(
+    recorder: CaptureRecorder | None = None,
+    replayer: CaptureReplayer | None = None,
+) -> None:
+    """Record responses to a capture log, or serve requests from one."""
+    global _RECORDER, _REPLAYER
+    _RECORDER = recorder
+    _REPLAYER = replayer
+
+
+def configure_concurrency(max_concurrent_requests: int) -> None:
+    """Set how many requests may be in flight at once."""
+    global _CONCURRENCY
+    _CONCURRENCY = asyncio.Semaphore(max_concurrent_requests)
+
+
+def configure_request_budget(requests_per_minute: int) -> None:
+    """Set the global number of requests sent per minute."""
+    _SCHEDULER.configure(requests_per_minute)
+
+
+def get_request_stats() -> dict[str, Any]:
+    """Return the cache, rate limit and base URL health of the API layer."""
+    return {
+        **asdict(_STATS),
+        "scheduler": _SCHEDULER.as_dict(),
+        "bases": _BASES.as_dict(),
+        "metrics": _METRICS.as_dict(),
+    }
 
 
 async def async_request_json(
     session: ClientSession,
     path: str,
     params: Mapping[str, Any] | None = None,
+    *,
+    cache_ttl: float = CACHE_TTL,
+    priority: int = PRIORITY_REFRESH,
 ) -> Any:
     """Query the transport.rest API trying all configured base URLs."""
+    response = await async_request(
+        session, path, params, cache_ttl=cache_ttl, priority=priority
+    )
+    return response.data
+
+
+async def async_request(
+    session: ClientSession,
+    path: str,
+    params: Mapping[str, Any] | None = None,
+    *,
+    cache_ttl: float = CACHE_TTL,
+    priority: int = PRIORITY_REFRESH,
+    project: Projection | None = None,
+) -> ApiResponse:
+    """Query the transport.rest API and report the serving base URL.
+
+    Concurrent calls for the same path and parameters share a single HTTP
+    request, and successful responses are reused for ``cache_ttl`` seconds.
+    The returned data is shared between callers and must not be modified.
+    Requests are paced by the global request budget, where ``priority``
+    decides which waiting request is sent first.
+
+    ``project`` turns the decoded body into the data that is returned and
+    cached, so the full document can be freed as soon as it is decoded.
+    """
+
+    key = _request_key(path, params, project)
+
+    cached = _CACHE.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        _STATS.hits += 1
+        return cached[1]
+
+    task = _IN_FLIGHT.get(key)
+    if task is None:
+        _STATS.misses += 1
+        task = asyncio.get_running_loop().create_task(
+            _async_fetch_json(session, path, params, priority, project)
+        )
+        task.add_done_callback(lambda done: _request_done(key, cache_ttl, done))
+        _IN_FLIGHT[key] = task
+    else:
+        _STATS.coalesced += 1
+
+    # Shield the shared request so a cancelled caller does not abort it for
+    # everyone else waiting on the same response.
+    return await asyncio.shield(task)
+
+
+def _request_done(
+    key: RequestKey, cache_ttl: float, task: asyncio.Task[ApiResponse]
+) -> None:
+    """Store the result of a finished request and release its slot."""
+    _IN_FLIGHT.pop(key, None)
+    if task.cancelled() or task.exception() is not None:
+        return
+
+    now = time.monotonic()
+    for expired in [k for k, (expires, _) in _CACHE.items() if expires <= now]:
+        del _CACHE[expired]
+    if cache_ttl > 0:
+        _CACHE[key] = (now + cache_ttl, task.result())
+
+
+async def _async_fetch_json(
+    session: ClientSession,
+    path: str,
+    params: Mapping[str, Any] | None,
+    priority: int,
+    project: Projection | None = None,
+) -> ApiResponse:
+    """Perform the HTTP request against the healthiest base URLs first."""
+
+    if _REPLAYER is not None:
+        return await _async_replay(_REPLAYER, path, params, project)
 
     last_error: Exception | None = None
 
-    for base_url in API_BASES:
+    for base_url in _BASES.ordered():
         url = f"{base_url}{path}"
-        try:
-            async with async_timeout.timeout(REQUEST_TIMEOUT):
-                response = await session.get(url, params=params, headers=HEADERS)
-                response.raise_for_status()
-                return await response.json()
-        except (asyncio.TimeoutError, ClientResponseError, ClientError, ValueError) as err:
-            last_error = err
-            continue
+        await _SCHEDULER.async_acquire(priority)
+        _METRICS.increment(f"requests:{base_url}")
+        # Waiting for a free connection does not count against the timeout.
+        async with _CONCURRENCY:
+            started = time.monotonic()
+            try:
+                async with async_timeout.timeout(REQUEST_TIMEOUT):
+                    response = await session.get(url, params=params, headers=HEADERS)
+                    response.raise_for_status()
+                    body = await response.read()
+                latency = time.monotonic() - started
+                _METRICS.observe(f"request_latency:{base_url}", latency)
+                with _METRICS.measure("decode"):
+                    data = json_loads(body)
+            except ClientResponseError as err:
+                _METRICS.increment(f"http_{err.status}:{base_url}")
+                if err.status != HTTPStatus.TOO_MANY_REQUESTS:
+                    # Client errors are answers of a healthy base, only server
+                    # errors count against it.
+                    if err.status >= HTTPStatus.INTERNAL_SERVER_ERROR:
+                        _BASES.record_failure(base_url)
+                    else:
+                        _BASES.record_success(base_url, time.monotonic() - started)
+                    last_error = err
+                    continue
+                # All bases share the same quota, so stop instead of trying the next.
+                retry_after = parse_retry_after((err.headers or {}).get("Retry-After"))
+                if retry_after is None:
+                    retry_after = DEFAULT_RETRY_AFTER
+                _SCHEDULER.pause(retry_after)
+                _LOGGER.warning(
+                    "Request quota of %s exceeded, pausing requests for %.0f seconds",
+                    base_url,
+                    retry_after,
+                )
+                raise
+            except (asyncio.TimeoutError, ClientError, ValueError) as err:
+                _METRICS.increment(f"{type(err).__name__}:{base_url}")
+                _BASES.record_failure(base_url)
+                last_error = err
+                continue
+
+        _BASES.record_success(base_url, latency)
+        if _RECORDER is not None:
+            _RECORDER.record(path, params, base_url, latency, body)
+        return ApiResponse(_project(data, project), base_url, dt_util.utcnow())
 
     if last_error is not None:
         raise last_error
 
     raise RuntimeError("No API base URLs configured")
+
+
+async def _async_replay(
+    replayer: CaptureReplayer,
+    path: str,
+    params: Mapping[str, Any] | None,
+    project: Projection | None,
+) -> ApiResponse:
+    """Answer a request from the capture log instead of the API."""
+    captured = await replayer.async_serve(path, params)
+    if captured is None:
+        raise ClientError(f"No captured response for {path}")
+    with _METRICS.measure("decode"):
+        data = json_loads(captured.body)
+    return ApiResponse(_project(data, project), captured.base_url, dt_util.utcnow())
+
+
+def _project(data: Any, project: Projection | None) -> Any:
+    """Apply the projection of a request to its decoded body."""
+    if project is None:
+        return data
+    with _METRICS.measure("project"):
+        return project(data)
+
+
+def extract_departures(data: Any) -> list[dict[str, Any]]:
+    """Normalize API responses to a departures list."""
+
+    if isinstance(data, list):
+        return data
+
+    if isinstance(data, dict):
+        departures = data.get("departures")
+        if isinstance(departures, list):
+            return departures
+
+    return []
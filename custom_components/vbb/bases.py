@@ -0,0 +1,126 @@
+"""Health tracking and ranking of the transport.rest base URLs."""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+import time
+from typing import Any
+
+# Weight of the newest sample in the latency moving average.
+LATENCY_ALPHA = 0.3
+# Number of recent requests the error rate is computed from.
+OUTCOME_WINDOW = 20
+# Consecutive failures after which a base is taken out of rotation.
+FAILURE_THRESHOLD = 3
+OPEN_COOLDOWN = 30.0
+MAX_OPEN_COOLDOWN = 300.0
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+@dataclass
+class BaseHealth:
+    """Rolling health information of one base URL."""
+
+    url: str
+    order: int
+    latency: float | None = None
+    outcomes: deque[bool] = field(default_factory=lambda: deque(maxlen=OUTCOME_WINDOW))
+    consecutive_failures: int = 0
+    state: str = STATE_CLOSED
+    retry_at: float = 0.0
+    cooldown: float = OPEN_COOLDOWN
+
+    @property
+    def error_rate(self) -> float:
+        """Return the share of failed requests in the recent window."""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    @property
+    def score(self) -> float:
+        """Return the ranking score, lower is better."""
+        # Unmeasured bases rank as if they answered instantly so every base
+        # is tried at least once.
+        return (self.latency or 0.0) * (1 + 4 * self.error_rate)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the health information for diagnostics."""
+        return {
+            "state": self.state,
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class BaseUrlPool:
+    """Order base URLs by health and keep failing ones out of rotation.
+
+    A base that fails ``FAILURE_THRESHOLD`` times in a row is opened and
+    skipped for a cooldown. Afterwards a single request probes it
+    (half-open): success closes the circuit, failure opens it again with
+    a doubled cooldown.
+    """
+
+    def __init__(self, urls: Iterable[str]) -> None:
+        self._bases = {
+            url: BaseHealth(url, order) for order, url in enumerate(urls)
+        }
+
+    def ordered(self) -> list[str]:
+        """Return the base URLs to try for the next request, best first."""
+        now = time.monotonic()
+        candidates: list[BaseHealth] = []
+        probes: list[BaseHealth] = []
+        for base in self._bases.values():
+            if base.state == STATE_CLOSED:
+                candidates.append(base)
+            elif now >= base.retry_at:
+                # Hand out a single probe. Should its result never be
+                # recorded, for example on cancellation, probe again later.
+                base.state = STATE_HALF_OPEN
+                base.retry_at = now + OPEN_COOLDOWN
+                probes.append(base)
+
+        ordered = sorted(candidates, key=lambda base: (base.score, base.order))
+        # Probe a recovering base first so it can rejoin the rotation.
+        ordered = probes + ordered
+        if not ordered:
+            # Every base is failing; keep trying them rather than giving up.
+            ordered = sorted(self._bases.values(), key=lambda base: base.order)
+        return [base.url for base in ordered]
+
+    def record_success(self, url: str, latency: float) -> None:
+        """Record a request that the base answered."""
+        base = self._bases[url]
+        base.latency = (
+            latency
+            if base.latency is None
+            else LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * base.latency
+        )
+        base.outcomes.append(True)
+        base.consecutive_failures = 0
+        base.state = STATE_CLOSED
+        base.cooldown = OPEN_COOLDOWN
+
+    def record_failure(self, url: str) -> None:
+        """Record a request that failed because of the base."""
+        base = self._bases[url]
+        base.outcomes.append(False)
+        base.consecutive_failures += 1
+        if base.state == STATE_HALF_OPEN:
+            base.cooldown = min(base.cooldown * 2, MAX_OPEN_COOLDOWN)
+        elif base.consecutive_failures < FAILURE_THRESHOLD:
+            return
+        base.state = STATE_OPEN
+        base.retry_at = time.monotonic() + base.cooldown
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the health of all bases for diagnostics."""
+        return {url: base.as_dict() for url, base in self._bases.items()}
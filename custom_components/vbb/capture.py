@@ -0,0 +1,214 @@
+"""Record API responses to disk and replay them without network access."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import gzip
+import logging
+from pathlib import Path
+import time
+from typing import Any, Mapping
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.json import json_bytes
+from homeassistant.util import dt as dt_util
+from homeassistant.util.json import json_loads
+
+_LOGGER = logging.getLogger(__name__)
+
+CaptureKey = tuple[str, tuple[tuple[str, str], ...]]
+
+
+def _capture_key(path: str, params: Mapping[str, Any] | None) -> CaptureKey:
+    return path, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+
+def rotated_paths(path: Path, backups: int) -> list[Path]:
+    """Return the log and its rotated files, oldest first."""
+    return [
+        *(path.with_suffix(f".{index}{path.suffix}") for index in range(backups, 0, -1)),
+        path,
+    ]
+
+
+@dataclass(frozen=True, slots=True)
+class CapturedResponse:
+    """One recorded API response."""
+
+    path: str
+    params: dict[str, str]
+    base_url: str
+    latency: float
+    recorded_at: str
+    body: str
+    # When the request was sent; logs written before it was recorded derive
+    # it from ``recorded_at`` and the latency.
+    requested_at: str | None = None
+
+    @property
+    def requested(self) -> datetime | None:
+        """Return when the request was sent."""
+        if self.requested_at is not None:
+            return dt_util.parse_datetime(self.requested_at)
+        recorded = dt_util.parse_datetime(self.recorded_at)
+        return recorded - timedelta(seconds=self.latency) if recorded else None
+
+
+class CaptureRecorder:
+    """Append every response to a gzip compressed, rotating JSON lines log.
+
+    A single writer task writes the queued records in the executor, one
+    gzip member per batch, so rotations never overlap and the log stays
+    readable even if Home Assistant stops mid-write.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, path: Path, max_bytes: int, backups: int
+    ) -> None:
+        self.hass = hass
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queued: list[bytes] = []
+        self._writer: asyncio.Task[None] | None = None
+
+    @callback
+    def record(
+        self,
+        path: str,
+        params: Mapping[str, Any] | None,
+        base_url: str,
+        latency: float,
+        body: bytes,
+    ) -> None:
+        """Queue a response for the log."""
+        now = dt_util.utcnow()
+        self._queued.append(
+            json_bytes(
+                {
+                    "path": path,
+                    "params": {str(k): str(v) for k, v in (params or {}).items()},
+                    "base_url": base_url,
+                    "latency": round(latency, 4),
+                    "requested_at": (now - timedelta(seconds=latency)).isoformat(),
+                    "recorded_at": now.isoformat(),
+                    "body": body.decode("utf-8", "replace"),
+                }
+            )
+        )
+        if self._writer is None:
+            self._writer = self.hass.async_create_background_task(
+                self._async_write_queued(), "vbb capture log"
+            )
+
+    async def async_flush(self) -> None:
+        """Wait until every queued response is written."""
+        if self._writer is not None:
+            await asyncio.shield(self._writer)
+
+    async def _async_write_queued(self) -> None:
+        try:
+            while self._queued:
+                lines, self._queued = self._queued, []
+                try:
+                    await self.hass.async_add_executor_job(self._write, lines)
+                except OSError as err:
+                    _LOGGER.warning(
+                        "Could not write to capture log %s: %s", self.path, err
+                    )
+                except Exception:
+                    _LOGGER.exception("Could not write to capture log %s", self.path)
+        finally:
+            self._writer = None
+
+    def _write(self, lines: list[bytes]) -> None:
+        if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+            self._rotate()
+        with gzip.open(self.path, "ab") as file:
+            file.write(b"".join(line + b"\n" for line in lines))
+
+    def _rotate(self) -> None:
+        files = rotated_paths(self.path, self.backups)
+        files[0].unlink(missing_ok=True)
+        for older, newer in zip(files, files[1:]):
+            if newer.exists():
+                newer.rename(older)
+        self.path.unlink(missing_ok=True)
+
+
+class CaptureReplayer:
+    """Serve recorded responses in the order they were captured.
+
+    Requests are matched by path and parameters. Parameters that differ
+    from the recording, such as an adapted number of results, fall back to
+    the responses recorded for the same path. The last response of a key
+    is served again once all of them were used.
+
+    Responses keep the recorded spacing of their requests, counted from the
+    first request served, and then take their recorded latency. Requests
+    arriving later than recorded are answered after the latency alone.
+    """
+
+    def __init__(self, responses: list[CapturedResponse], speed: float) -> None:
+        self.speed = speed
+        self.responses = responses
+        # Start of the replay on the monotonic clock, and when the first
+        # served request was sent in the recording.
+        self._origin: tuple[float, datetime] | None = None
+        self._by_key: dict[CaptureKey, list[CapturedResponse]] = defaultdict(list)
+        self._by_path: dict[str, list[CapturedResponse]] = defaultdict(list)
+        self._served: dict[Any, int] = defaultdict(int)
+        for response in responses:
+            self._by_key[_capture_key(response.path, response.params)].append(response)
+            self._by_path[response.path].append(response)
+
+    @classmethod
+    def load(cls, path: Path, backups: int, speed: float) -> CaptureReplayer:
+        """Read a capture log and its rotated files."""
+        responses: list[CapturedResponse] = []
+        for file in rotated_paths(path, backups):
+            if not file.exists():
+                continue
+            with gzip.open(file, "rb") as lines:
+                responses.extend(
+                    CapturedResponse(**json_loads(line)) for line in lines if line.strip()
+                )
+        return cls(responses, speed)
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def lookup(
+        self, path: str, params: Mapping[str, Any] | None
+    ) -> CapturedResponse | None:
+        """Return the next recorded response for a request."""
+        key: Any = _capture_key(path, params)
+        responses = self._by_key.get(key)
+        if not responses:
+            key, responses = path, self._by_path.get(path)
+        if not responses:
+            return None
+        index = self._served[key]
+        self._served[key] = index + 1
+        return responses[min(index, len(responses) - 1)]
+
+    async def async_serve(
+        self, path: str, params: Mapping[str, Any] | None
+    ) -> CapturedResponse | None:
+        """Return the next recorded response at its recorded time."""
+        response = self.lookup(path, params)
+        if response is None or self.speed <= 0:
+            return response
+        delay = response.latency
+        if (requested := response.requested) is not None:
+            now = time.monotonic()
+            if self._origin is None:
+                self._origin = (now, requested)
+            started, first = self._origin
+            gap = (requested - first).total_seconds() - (now - started) * self.speed
+            delay += max(gap, 0)
+        await asyncio.sleep(delay / self.speed)
+        return response
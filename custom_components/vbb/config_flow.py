@@ -2,37 +2,134 @@
 
 from __future__ import annotations
 
+from collections.abc import Mapping
 from typing import Any, Dict, List
 
 import voluptuous as vol
+
 from homeassistant import config_entries
 from homeassistant.const import (
     CONF_LATITUDE,
     CONF_LONGITUDE,
     CONF_NAME,
 )
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.core import callback
 from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.selector import SelectSelector, SelectSelectorConfig
 
 from .const import (
+    CONF_COMPACT_ATTRIBUTES,
+    CONF_DIRECTION_SENSORS,
     CONF_DURATION,
+    CONF_MAX_SENSORS,
+    CONF_PRIORITY,
     CONF_PRODUCTS,
+    CONF_QUIET_HOURS,
+    CONF_REALTIME_WINDOW,
     CONF_RESULTS,
+    CONF_RETIRE_AFTER,
     CONF_STATION_ID,
+    CONF_TRACKED_LINES,
     CONF_UPDATE_INTERVAL,
-    DEFAULT_PRODUCTS,
+    DEFAULT_COMPACT_ATTRIBUTES,
+    DEFAULT_DIRECTION_SENSORS,
     DEFAULT_DURATION,
+    DEFAULT_MAX_SENSORS,
     DEFAULT_NAME,
+    DEFAULT_PRIORITY,
+    DEFAULT_PRODUCTS,
+    DEFAULT_REALTIME_WINDOW,
     DEFAULT_RESULTS,
+    DEFAULT_RETIRE_AFTER,
     DEFAULT_UPDATE_INTERVAL,
-    PRODUCT_OPTIONS,
     DOMAIN,
-    NEARBY_PATH,
-    SEARCH_PATH,
+    PRODUCT_OPTIONS,
+    STATION_PRIORITIES,
 )
+from .polling import parse_quiet_hours
+from .stops import async_nearby_stations, async_search_stations
+
+
+def _settings_schema(settings: Mapping[str, Any]) -> dict[vol.Marker, Any]:
+    """Return the fields of the station settings, filled in with ``settings``."""
+    return {
+        vol.Optional(
+            CONF_DURATION, default=settings.get(CONF_DURATION, DEFAULT_DURATION)
+        ): vol.All(int, vol.Range(min=1)),
+        vol.Optional(
+            CONF_RESULTS, default=settings.get(CONF_RESULTS, DEFAULT_RESULTS)
+        ): vol.All(int, vol.Range(min=1)),
+        vol.Optional(
+            CONF_UPDATE_INTERVAL,
+            default=settings.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL),
+        ): vol.All(int, vol.Range(min=1)),
+        vol.Optional(
+            CONF_QUIET_HOURS,
+            description={"suggested_value": settings.get(CONF_QUIET_HOURS)},
+        ): cv.string,
+        vol.Optional(
+            CONF_COMPACT_ATTRIBUTES,
+            default=settings.get(CONF_COMPACT_ATTRIBUTES, DEFAULT_COMPACT_ATTRIBUTES),
+        ): cv.boolean,
+        vol.Optional(
+            CONF_PRIORITY, default=settings.get(CONF_PRIORITY, DEFAULT_PRIORITY)
+        ): SelectSelector(
+            SelectSelectorConfig(
+                options=list(STATION_PRIORITIES),
+                translation_key=CONF_PRIORITY,
+            )
+        ),
+        vol.Optional(
+            CONF_RETIRE_AFTER,
+            default=settings.get(CONF_RETIRE_AFTER, DEFAULT_RETIRE_AFTER),
+        ): vol.All(int, vol.Range(min=0)),
+        vol.Optional(
+            CONF_MAX_SENSORS,
+            default=settings.get(CONF_MAX_SENSORS, DEFAULT_MAX_SENSORS),
+        ): vol.All(int, vol.Range(min=1)),
+        vol.Optional(
+            CONF_DIRECTION_SENSORS,
+            default=settings.get(CONF_DIRECTION_SENSORS, DEFAULT_DIRECTION_SENSORS),
+        ): vol.All(int, vol.Range(min=0)),
+        vol.Optional(
+            CONF_REALTIME_WINDOW,
+            default=settings.get(CONF_REALTIME_WINDOW, DEFAULT_REALTIME_WINDOW),
+        ): vol.All(int, vol.Range(min=0)),
+        vol.Optional(
+            CONF_TRACKED_LINES,
+            description={
+                "suggested_value": ", ".join(settings.get(CONF_TRACKED_LINES, []))
+            },
+        ): cv.string,
+    }
+
 
-from .api import async_request_json
+def _parse_settings(
+    user_input: Dict[str, Any], errors: Dict[str, str]
+) -> Dict[str, Any]:
+    """Return the station settings of a submitted form, adding any errors."""
+    try:
+        parse_quiet_hours(user_input.get(CONF_QUIET_HOURS))
+    except ValueError:
+        errors[CONF_QUIET_HOURS] = "invalid_quiet_hours"
+    return {
+        CONF_DURATION: user_input[CONF_DURATION],
+        CONF_RESULTS: user_input[CONF_RESULTS],
+        CONF_UPDATE_INTERVAL: user_input[CONF_UPDATE_INTERVAL],
+        CONF_QUIET_HOURS: user_input.get(CONF_QUIET_HOURS, ""),
+        CONF_COMPACT_ATTRIBUTES: user_input[CONF_COMPACT_ATTRIBUTES],
+        CONF_PRIORITY: user_input.get(CONF_PRIORITY, DEFAULT_PRIORITY),
+        CONF_RETIRE_AFTER: user_input[CONF_RETIRE_AFTER],
+        CONF_MAX_SENSORS: user_input[CONF_MAX_SENSORS],
+        CONF_DIRECTION_SENSORS: user_input[CONF_DIRECTION_SENSORS],
+        CONF_REALTIME_WINDOW: user_input[CONF_REALTIME_WINDOW],
+        CONF_TRACKED_LINES: [
+            line.strip()
+            for line in user_input.get(CONF_TRACKED_LINES, "").split(",")
+            if line.strip()
+        ],
+    }
 
 
 class VbbConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -111,35 +208,31 @@ class VbbConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         assert self._selected_station is not None
 
+        errors: Dict[str, str] = {}
+
         if user_input is not None:
-            data = {
-                CONF_STATION_ID: self._selected_station["id"],
-                CONF_NAME: user_input[CONF_NAME],
-                CONF_DURATION: user_input[CONF_DURATION],
-                CONF_RESULTS: user_input[CONF_RESULTS],
-                CONF_UPDATE_INTERVAL: user_input[CONF_UPDATE_INTERVAL],
-            }
-            options = {CONF_PRODUCTS: user_input.get(CONF_PRODUCTS, DEFAULT_PRODUCTS)}
-            await self.async_set_unique_id(self._selected_station["id"])
-            self._abort_if_unique_id_configured()
-            return self.async_create_entry(
-                title=data[CONF_NAME], data=data, options=options
-            )
+            settings = _parse_settings(user_input, errors)
+            if not errors:
+                data = {
+                    CONF_STATION_ID: self._selected_station["id"],
+                    CONF_NAME: user_input[CONF_NAME],
+                    **settings,
+                }
+                options = {
+                    CONF_PRODUCTS: user_input.get(CONF_PRODUCTS, DEFAULT_PRODUCTS)
+                }
+                await self.async_set_unique_id(self._selected_station["id"])
+                self._abort_if_unique_id_configured()
+                return self.async_create_entry(
+                    title=data[CONF_NAME], data=data, options=options
+                )
 
         data_schema = vol.Schema(
             {
                 vol.Optional(
                     CONF_NAME, default=self._selected_station["name"] or DEFAULT_NAME
                 ): cv.string,
-                vol.Optional(
-                    CONF_DURATION, default=DEFAULT_DURATION
-                ): vol.All(int, vol.Range(min=1)),
-                vol.Optional(
-                    CONF_RESULTS, default=DEFAULT_RESULTS
-                ): vol.All(int, vol.Range(min=1)),
-                vol.Optional(
-                    CONF_UPDATE_INTERVAL, default=DEFAULT_UPDATE_INTERVAL
-                ): vol.All(int, vol.Range(min=1)),
+                **_settings_schema({}),
                 vol.Optional(
                     CONF_PRODUCTS, default=DEFAULT_PRODUCTS
                 ): SelectSelector(
@@ -154,13 +247,22 @@ class VbbConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             }
         )
 
-        return self.async_show_form(step_id="config", data_schema=data_schema)
+        return self.async_show_form(
+            step_id="config", data_schema=data_schema, errors=errors
+        )
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> config_entries.OptionsFlow:
+        """Return the flow that changes the settings of a station."""
+        return VbbOptionsFlow(config_entry)
 
     async def _search_by_name(self, name: str) -> List[Dict[str, Any]]:
-        """Search stations by name using the VBB API."""
+        """Search stations by name."""
         session = async_get_clientsession(self.hass)
-        params = {"query": name}
-        data = await async_request_json(session, SEARCH_PATH, params)
+        data = await async_search_stations(session, name)
         return [s for s in data if s.get("id") and s.get("name")]
 
     async def _search_by_coordinates(
@@ -168,6 +270,32 @@ class VbbConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     ) -> List[Dict[str, Any]]:
         """Search stations near the given coordinates."""
         session = async_get_clientsession(self.hass)
-        params = {"latitude": latitude, "longitude": longitude}
-        data = await async_request_json(session, NEARBY_PATH, params)
+        data = await async_nearby_stations(session, latitude, longitude)
         return [s for s in data if s.get("id") and s.get("name")]
+
+
+class VbbOptionsFlow(config_entries.OptionsFlow):
+    """Change the settings of a station; the entry is reloaded afterwards."""
+
+    def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
+        self.config_entry = config_entry
+
+    async def async_step_init(self, user_input: Dict[str, Any] | None = None):
+        """Show the station settings, filled in with the current ones."""
+
+        errors: Dict[str, str] = {}
+
+        if user_input is not None:
+            settings = _parse_settings(user_input, errors)
+            if not errors:
+                # The products are kept; their switches change them.
+                return self.async_create_entry(
+                    title="", data={**self.config_entry.options, **settings}
+                )
+
+        current = {**self.config_entry.data, **self.config_entry.options}
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(_settings_schema(current)),
+            errors=errors,
+        )
@@ -8,7 +8,37 @@ API_BASES = (
 API_PATH = "/stops/{station}/departures"
 SEARCH_PATH = "/locations"
 NEARBY_PATH = "/locations/nearby"
+TRIP_PATH = "/trips/{trip}"
 REQUEST_TIMEOUT = 10
+# Seconds a successful response is reused for identical requests.
+CACHE_TTL = 5
+# Station search results shared by all config flows.
+LOCATION_CACHE_SIZE = 256
+LOCATION_CACHE_TTL = 24 * 3600
+# Timetable preprocessed from the GTFS feed, in the storage directory.
+TIMETABLE_FILE = "vbb.timetable"
+# transport.rest allows 100 requests per minute per client.
+DEFAULT_REQUESTS_PER_MINUTE = 90
+# Pause after an HTTP 429 that does not carry a Retry-After header.
+DEFAULT_RETRY_AFTER = 60
+# Lower values are sent first when the request budget is exhausted.
+PRIORITY_SEARCH = 0
+PRIORITY_HIGH = 1
+PRIORITY_REFRESH = 2
+PRIORITY_LOW = 3
+PRIORITY_BACKGROUND = 4
+# Request priority of a station's refreshes, chosen per station.
+STATION_PRIORITIES = {
+    "high": PRIORITY_HIGH,
+    "normal": PRIORITY_REFRESH,
+    "low": PRIORITY_LOW,
+}
+DEFAULT_PRIORITY = "normal"
+# Requests in flight at once, over one keep-alive connection pool.
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+KEEPALIVE_TIMEOUT = 60
+DATA_POLLER = f"{DOMAIN}_poller"
+DATA_TRIP_TRACKER = f"{DOMAIN}_trip_tracker"
 HEADERS = {
     "Accept": "application/json",
     "User-Agent": "HomeAssistant-VBB",
@@ -18,10 +48,36 @@ CONF_DURATION = "duration"
 CONF_RESULTS = "results"
 CONF_UPDATE_INTERVAL = "update_interval"
 CONF_PRODUCTS = "products"
+CONF_QUIET_HOURS = "quiet_hours"
+CONF_COMPACT_ATTRIBUTES = "compact_attributes"
+CONF_REQUESTS_PER_MINUTE = "requests_per_minute"
+CONF_MAX_CONCURRENT_REQUESTS = "max_concurrent_requests"
+CONF_PRIORITY = "priority"
+CONF_RETIRE_AFTER = "retire_after"
+CONF_MAX_SENSORS = "max_sensors"
+CONF_DIRECTION_SENSORS = "direction_sensors"
+CONF_REALTIME_WINDOW = "realtime_window"
+CONF_TRACKED_LINES = "tracked_lines"
+CONF_MAX_TRACKED_TRIPS = "max_tracked_trips"
+CONF_CAPTURE = "capture"
+CONF_GTFS_PATH = "gtfs_path"
+CONF_MAX_SIZE = "max_size"
+CONF_BACKUPS = "backups"
+CONF_SPEED = "speed"
 DEFAULT_NAME = "VBB Departures"
 DEFAULT_DURATION = 120
 DEFAULT_RESULTS = 100
 DEFAULT_UPDATE_INTERVAL = 5
+DEFAULT_COMPACT_ATTRIBUTES = False
+# Days after which a line not seen on the board loses its sensors, 0 = never.
+DEFAULT_RETIRE_AFTER = 7
+# Line sensors per station, the station and diagnostic sensors not counted.
+DEFAULT_MAX_SENSORS = 150
+# Sensors per line and direction, for the next, second next, ... departure.
+DEFAULT_DIRECTION_SENSORS = 3
+# Minutes of realtime data merged onto a rarely fetched planned board;
+# 0 fetches the whole board every time.
+DEFAULT_REALTIME_WINDOW = 0
 PRODUCT_OPTIONS = [
     "suburban",
     "subway",
@@ -32,3 +88,37 @@ PRODUCT_OPTIONS = [
     "express",
 ]
 DEFAULT_PRODUCTS = PRODUCT_OPTIONS
+# Vehicles followed at once across all stations, and how often each is
+# polled (seconds).
+DEFAULT_MAX_TRACKED_TRIPS = 5
+TRIP_POLL_INTERVAL = 30
+TRIP_QUERY_OPTIONS = {
+    "stopovers": "false",
+    "remarks": "false",
+    "polyline": "false",
+}
+# Payload sections of the departures endpoint the integration does not use.
+DEPARTURES_QUERY_OPTIONS = {
+    "remarks": "false",
+    "stopovers": "false",
+    "linesOfStops": "false",
+}
+# Bulky or constantly changing attributes kept out of the recorder. The full
+# board is available through the get_departures service instead.
+UNRECORDED_ATTRIBUTES = frozenset(
+    {
+        "departures",
+        "current_trip_position",
+        "minutes",
+        "fetched_at",
+    }
+)
+# Capture log of API responses, relative to the configuration directory.
+CAPTURE_RECORD = "record"
+CAPTURE_REPLAY = "replay"
+DEFAULT_CAPTURE_PATH = "vbb_capture.jsonl.gz"
+DEFAULT_CAPTURE_MAX_SIZE = 10  # MiB per file
+DEFAULT_CAPTURE_BACKUPS = 3
+DEFAULT_CAPTURE_SPEED = 1.0
+SERVICE_GET_DEPARTURES = "get_departures"
+ATTR_LIMIT = "limit"
@@ -0,0 +1,483 @@
+"""Shared departures coordinator for a VBB station."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Sequence
+from datetime import datetime, timedelta
+import logging
+import math
+from typing import Any
+
+from aiohttp import ClientSession
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from .api import async_request
+from .const import (
+    API_PATH,
+    DEFAULT_DIRECTION_SENSORS,
+    DEFAULT_MAX_SENSORS,
+    DEFAULT_PRIORITY,
+    DEFAULT_REALTIME_WINDOW,
+    DEFAULT_RETIRE_AFTER,
+    DEPARTURES_QUERY_OPTIONS,
+    DOMAIN,
+    PRODUCT_OPTIONS,
+    STATION_PRIORITIES,
+)
+from .discovery import LineDiscovery
+from .metrics import Metrics
+from .polling import compute_poll_interval, parse_quiet_hours, quiet_hours_end
+from .snapshot import Departure, DepartureSnapshot, project_departures
+from .timetable import TIMETABLE_SOURCE, scheduled_departures
+
+_LOGGER = logging.getLogger(__name__)
+
+# Listeners re-evaluate the last board this often between fetches so that
+# countdowns advance and departed trains drop out without API requests.
+TICK_INTERVAL = timedelta(seconds=30)
+
+# Bounds and slack of the automatically sized ``results`` parameter.
+MIN_RESULTS = 10
+RESULTS_HEADROOM = 1.25
+RESULTS_MARGIN = 5
+# Every n-th fetch asks for the configured number of results so that the
+# discovery sees lines no entity subscribes to yet.
+FULL_FETCH_EVERY = 6
+
+# With a realtime window, the planned board is refetched this often and
+# reaches this much further than ``duration``, so it covers the whole
+# duration until the next refetch.
+PLANNED_REFRESH_INTERVAL = timedelta(hours=1)
+
+# Refresh requests within this age of the board are answered from it.
+FRESH_WINDOW = timedelta(seconds=30)
+# The board is reported stale once it missed this many poll intervals.
+STALE_AFTER_INTERVALS = 2
+
+STORAGE_VERSION = 1
+# Coalesce the writes of the stored board, it changes on every fetch.
+STORAGE_SAVE_DELAY = 60
+
+DemandSelector = Callable[[DepartureSnapshot, datetime], Sequence[Departure]]
+
+
+class VbbStationCoordinator(DataUpdateCoordinator[DepartureSnapshot]):
+    """Fetch the departures board of one station once per update cycle.
+
+    Every sensor of the station and the line discovery subscribe to this
+    coordinator instead of querying the API on their own. The configured
+    update interval is the baseline; after each fetch the interval is
+    adapted to the board (see ``polling.compute_poll_interval``).
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        station_id: str,
+        station_name: str,
+        duration: int,
+        results: int,
+        products: list[str],
+        update_interval: int,
+        session: ClientSession | None = None,
+        quiet_hours: str | None = None,
+        compact_attributes: bool = False,
+        priority: str = DEFAULT_PRIORITY,
+        retire_after: int = DEFAULT_RETIRE_AFTER,
+        max_sensors: int = DEFAULT_MAX_SENSORS,
+        direction_sensors: int = DEFAULT_DIRECTION_SENSORS,
+        realtime_window: int = DEFAULT_REALTIME_WINDOW,
+        tracked_lines: Iterable[str] = (),
+    ) -> None:
+        # The shared StationPoller decides when to fetch, not a timer per
+        # coordinator.
+        super().__init__(hass, _LOGGER, name=f"{DOMAIN}_{station_id}")
+        self.station_id = station_id
+        self.station_name = station_name
+        self.duration = duration
+        self.results = results
+        self.products = set(products)
+        self.base_update_interval = timedelta(minutes=update_interval)
+        self.poll_interval = self.base_update_interval
+        self.priority = STATION_PRIORITIES[priority]
+        self.quiet_hours = parse_quiet_hours(quiet_hours)
+        self.compact_attributes = compact_attributes
+        self.direction_sensors = direction_sensors
+        # Minutes polled for realtime data onto the planned board; a window
+        # as long as the board is a plain fetch.
+        self.realtime_window = realtime_window if realtime_window < duration else 0
+        self._planned: DepartureSnapshot | None = None
+        # Lines whose next departure has its vehicle followed live.
+        self.tracked_lines = frozenset(tracked_lines)
+        self._session = session or async_get_clientsession(hass)
+        self._signature: tuple[tuple[Any, ...], ...] = ()
+        self._unsub_tick: CALLBACK_TYPE | None = None
+        self._demands: dict[object, tuple[DemandSelector, int]] = {}
+        self._next_results: int | None = None
+        self._fetches_since_full = 0
+        # Incremented before the listeners run, so entities can share work
+        # done once per update.
+        self.update_count = 0
+        # Timings and counters of this station, shown in the diagnostics.
+        self.metrics = Metrics()
+        # Discovered (line, destination) and (line, direction) pairs.
+        self.discovery = LineDiscovery(
+            timedelta(days=retire_after) if retire_after else None,
+            max_sensors,
+            direction_sensors,
+        )
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{station_id}"
+        )
+
+    async def async_setup(self) -> None:
+        """Restore the stored board, or fetch it if there is none.
+
+        With a stored board the first fetch runs in the background, so the
+        sensors come up without waiting for the API.
+        """
+        if await self.async_restore():
+            self.hass.async_create_background_task(
+                self.async_refresh(), f"{self.name} revalidation"
+            )
+        else:
+            # A failed first fetch is not fatal: the station sensor is still
+            # created and discovery picks up the lines once the API answers.
+            await self.async_refresh()
+
+    async def async_restore(self) -> bool:
+        """Load the last board and discovered lines from disk."""
+        stored = await self._store.async_load()
+        if not stored:
+            return False
+        self.discovery.restore(stored, dt_util.utcnow())
+        if (records := stored.get("records")) is not None:
+            departures = [Departure.from_dict(record) for record in records]
+        elif (raw := stored.get("departures")) is not None:
+            # Written before departures were normalized on arrival.
+            departures = [Departure.from_api(dep) for dep in raw]
+        else:
+            return False
+        fetched_at = stored.get("fetched_at")
+        self.data = DepartureSnapshot.from_records(
+            departures,
+            dt_util.parse_datetime(fetched_at) if fetched_at else None,
+            stored.get("source_base"),
+        )
+        return True
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Persist the board and discovered lines after a short delay."""
+        self._store.async_delay_save(self._data_to_store, STORAGE_SAVE_DELAY)
+
+    def _data_to_store(self) -> dict[str, Any]:
+        fetched_at = self.data.fetched_at if self.data else None
+        return {
+            "records": (
+                [dep.as_dict() for dep in self.data.departures] if self.data else None
+            ),
+            "fetched_at": fetched_at.isoformat() if fetched_at else None,
+            "source_base": self.data.source_base if self.data else None,
+            **self.discovery.as_stored(),
+        }
+
+    @callback
+    def async_set_products(self, products: Iterable[str]) -> None:
+        """Change the enabled products without reloading the station.
+
+        The current board is re-filtered at once. The API only returns the
+        products asked for, so departures of a newly enabled product arrive
+        with the next scheduled fetch.
+        """
+        products = set(products)
+        if products == self.products:
+            return
+        # Lines of a product kept while it was disabled are not retired
+        # before they had a chance to reappear.
+        self.discovery.resume(products - self.products, dt_util.utcnow())
+        self.async_schedule_save()
+        self.products = products
+        # The demand of the sensors was measured on the old products, and
+        # the planned board lacks newly enabled ones.
+        self._next_results = None
+        self._planned = None
+        self.async_update_listeners()
+
+    @callback
+    def async_add_demand(self, select: DemandSelector, rows: int) -> CALLBACK_TYPE:
+        """Register that a consumer shows ``rows`` rows picked by ``select``.
+
+        The demands of all consumers decide how many results are requested.
+        """
+        token = object()
+        self._demands[token] = (select, rows)
+
+        @callback
+        def remove_demand() -> None:
+            self._demands.pop(token, None)
+
+        return remove_demand
+
+    def _query_params(self, planned: bool) -> dict[str, Any]:
+        """Return the departures query for the enabled products.
+
+        ``planned`` asks for the planned board of the realtime window mode,
+        which reaches one refetch interval beyond ``duration``.
+        """
+        duration = self.duration
+        results = self.results
+        if planned:
+            extra = int(PLANNED_REFRESH_INTERVAL.total_seconds() // 60)
+            duration += extra
+            results = math.ceil(results * duration / self.duration)
+        elif self.realtime_window:
+            duration = self.realtime_window
+        elif self._next_results is not None and self._fetches_since_full < FULL_FETCH_EVERY:
+            results = self._next_results
+            self._fetches_since_full += 1
+        else:
+            self._fetches_since_full = 0
+        return {
+            "duration": duration,
+            "results": results,
+            **{
+                product: "true" if product in self.products else "false"
+                for product in PRODUCT_OPTIONS
+            },
+            **DEPARTURES_QUERY_OPTIONS,
+        }
+
+    def _required_results(self, snapshot: DepartureSnapshot) -> int | None:
+        """Return how many results cover the demand of all consumers.
+
+        A consumer asking for more rows than its selection has on the board
+        is satisfied with the rows there are; the periodic full fetch finds
+        rows beyond a truncated board.
+        """
+        if not self._demands:
+            return None
+        now = dt_util.utcnow()
+        required = 0
+        for select, rows in self._demands.values():
+            selected = select(snapshot, now)
+            required = max(
+                required, snapshot.depth(selected, min(rows, len(selected)), now)
+            )
+        return min(
+            self.results,
+            max(MIN_RESULTS, int(required * RESULTS_HEADROOM) + RESULTS_MARGIN),
+        )
+
+    @callback
+    def async_add_listener(
+        self, update_callback: CALLBACK_TYPE, context: Any = None
+    ) -> Callable[[], None]:
+        """Listen for updates and run the local tick while anyone listens."""
+        remove_listener = super().async_add_listener(update_callback, context)
+        if self._unsub_tick is None:
+            self._unsub_tick = async_track_time_interval(
+                self.hass, self._async_tick, TICK_INTERVAL
+            )
+
+        @callback
+        def remove_tick_listener() -> None:
+            remove_listener()
+            if not self._listeners and self._unsub_tick is not None:
+                self._unsub_tick()
+                self._unsub_tick = None
+
+        return remove_tick_listener
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update all entities and time how long they take together."""
+        self.update_count += 1
+        with self.metrics.measure("entity_update"):
+            super().async_update_listeners()
+
+    @callback
+    def _async_tick(self, now: datetime) -> None:
+        """Let listeners re-evaluate the last board without fetching."""
+        if self.data is not None:
+            self.async_update_listeners()
+
+    def data_age(self, now: datetime) -> timedelta | None:
+        """Return the age of the board, if its fetch time is known."""
+        if self.data is None or self.data.fetched_at is None:
+            return None
+        return now - self.data.fetched_at
+
+    def is_stale(self, now: datetime) -> bool:
+        """Return whether the board missed its regular refreshes."""
+        age = self.data_age(now)
+        return age is not None and age > self.poll_interval * STALE_AFTER_INTERVALS
+
+    def is_expired(self, now: datetime) -> bool:
+        """Return whether the board is too old to be served at all.
+
+        The board only covers ``duration`` minutes, so older data cannot
+        contain a single upcoming departure it was not already showing.
+        """
+        age = self.data_age(now)
+        return age is not None and age > timedelta(minutes=self.duration)
+
+    @callback
+    def async_request_background_refresh(self) -> None:
+        """Request a refresh without making the caller wait for the API."""
+        self.hass.async_create_background_task(
+            self.async_request_refresh(), f"{self.name} refresh"
+        )
+
+    async def _async_update_data(self) -> DepartureSnapshot:
+        """Fetch the departures board from the API."""
+        age = self.data_age(dt_util.utcnow())
+        if age is not None and age < FRESH_WINDOW:
+            self.metrics.increment("fresh_skips")
+            return self.data
+
+        planned = self._planned_due(dt_util.utcnow())
+        params = self._query_params(planned)
+        self.metrics.increment("fetches")
+        if planned:
+            self.metrics.increment("planned_fetches")
+        try:
+            with self.metrics.measure("fetch"):
+                response = await async_request(
+                    self._session,
+                    API_PATH.format(station=self.station_id),
+                    params,
+                    priority=self.priority,
+                    project=project_departures,
+                )
+        except Exception as err:
+            self.metrics.increment("fetch_failures")
+            if (snapshot := self._scheduled_snapshot()) is not None:
+                _LOGGER.debug(
+                    "Showing scheduled departures for %s: %s", self.station_id, err
+                )
+                return snapshot
+            raise UpdateFailed(
+                f"Error fetching departures for {self.station_id}: {err}"
+            ) from err
+        with self.metrics.measure("snapshot"):
+            snapshot = DepartureSnapshot.from_records(
+                response.data,
+                response.fetched_at,
+                response.base_url,
+            )
+            if planned:
+                self._planned = snapshot
+            elif self.realtime_window:
+                snapshot = self._overlay(snapshot, params["results"])
+        self._adapt_poll_interval(snapshot)
+        # Without compact attributes the sensors list the whole board, so
+        # only compact sensors let the board shrink to what they show.
+        if self.compact_attributes and not self.realtime_window:
+            self._next_results = self._required_results(snapshot)
+        self.async_schedule_save()
+        return snapshot
+
+    def _planned_due(self, now: datetime) -> bool:
+        """Return whether the next fetch is one of the planned board."""
+        if not self.realtime_window:
+            return False
+        fetched_at = self._planned.fetched_at if self._planned else None
+        return fetched_at is None or now - fetched_at >= PLANNED_REFRESH_INTERVAL
+
+    def _overlay(self, realtime: DepartureSnapshot, requested: int) -> DepartureSnapshot:
+        """Merge a realtime window onto the planned board by trip.
+
+        Departures of the window replace the planned ones of the same trip,
+        with their delays, cancellations and platforms. Planned departures
+        inside the window that the window no longer lists are dropped, as
+        a full fetch would not list them either.
+        """
+        assert self._planned is not None
+        fetched_at = realtime.fetched_at or dt_util.utcnow()
+        if len(realtime.departures) >= requested:
+            # The window was cut off by ``results``.
+            covered_until = max(
+                (dep.when for dep in realtime.departures if dep.when is not None),
+                default=fetched_at,
+            )
+        else:
+            covered_until = fetched_at + timedelta(minutes=self.realtime_window)
+        updated = {dep.trip_id for dep in realtime.departures if dep.trip_id}
+        kept = [
+            dep
+            for dep in self._planned.departures
+            if dep.trip_id not in updated
+            and (dep.when is None or not fetched_at <= dep.when <= covered_until)
+        ]
+        return DepartureSnapshot.from_records(
+            (*kept, *realtime.departures), realtime.fetched_at, realtime.source_base
+        )
+
+    def _scheduled_snapshot(self) -> DepartureSnapshot | None:
+        """Return a board from the GTFS timetable while the API is unreachable.
+
+        A realtime board is kept until it goes stale, since it is still
+        closer to reality than the timetable.
+        """
+        now = dt_util.utcnow()
+        if (
+            self.data is not None
+            and self.data.source_base != TIMETABLE_SOURCE
+            and not self.is_stale(now)
+        ):
+            return None
+        departures = scheduled_departures(
+            self.station_id, now, self.duration, self.results, self.products
+        )
+        if departures is None:
+            return None
+        self.metrics.increment("scheduled_fallbacks")
+        return DepartureSnapshot.from_records(departures, now, TIMETABLE_SOURCE)
+
+    def _shown(self, snapshot: DepartureSnapshot, now: datetime) -> list[Departure]:
+        """Return the upcoming departures the sensors show, soonest first.
+
+        Without subscribed sensors, every upcoming departure counts.
+        """
+        if not self._demands:
+            return snapshot.for_products(self.products, now)
+        shown: dict[int, Departure] = {}
+        for select, rows in self._demands.values():
+            for dep in select(snapshot, now)[:rows]:
+                shown[id(dep)] = dep
+        return sorted(shown.values(), key=lambda dep: dep.when)
+
+    def _adapt_poll_interval(self, snapshot: DepartureSnapshot) -> None:
+        """Choose the delay until the next fetch from the new board."""
+        now = dt_util.utcnow()
+        upcoming = snapshot.for_products(self.products, now)
+        signature = tuple(
+            (dep.trip_id, dep.time, dep.delay) for dep in upcoming
+        )
+        # Only the departures on display decide about faster polls; a busy
+        # board always has a departure due or a delay moving somewhere.
+        shown = self._shown(snapshot, now)
+        previous_delays = {trip: delay for trip, _, delay in self._signature if trip}
+        delays_changed = any(
+            dep.trip_id in previous_delays and previous_delays[dep.trip_id] != dep.delay
+            for dep in shown
+        )
+
+        self.poll_interval = compute_poll_interval(
+            base=self.base_update_interval,
+            previous=self.poll_interval,
+            now=now,
+            next_departure=shown[0].when if shown else None,
+            changed=signature != self._signature,
+            delays_changed=delays_changed,
+            quiet_until=quiet_hours_end(self.quiet_hours, dt_util.now()),
+            expires_after=timedelta(minutes=self.duration),
+        )
+        self._signature = signature
@@ -0,0 +1,73 @@
+"""Diagnostics support for VBB."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .api import get_request_stats
+from .const import DATA_POLLER, DATA_TRIP_TRACKER, DOMAIN
+from .coordinator import VbbStationCoordinator
+from .stops import get_search_stats
+from .timetable import get_timetable_stats
+
+
+def _station_summary(coordinator: VbbStationCoordinator) -> dict[str, Any]:
+    """Return the headline numbers used to spot expensive stations."""
+    metrics = coordinator.metrics
+    summary: dict[str, Any] = dict(metrics.counters)
+    for name, histogram in metrics.histograms.items():
+        summary[f"{name}_mean_ms"] = (
+            round(histogram.mean, 3) if histogram.mean is not None else None
+        )
+        summary[f"{name}_p95_ms"] = histogram.quantile(0.95)
+    return summary
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator: VbbStationCoordinator = hass.data[DOMAIN][entry.entry_id]
+    snapshot = coordinator.data
+    now = dt_util.utcnow()
+    age = coordinator.data_age(now)
+
+    return {
+        "entry": {"data": dict(entry.data), "options": dict(entry.options)},
+        "station": {
+            "station_id": coordinator.station_id,
+            "products": sorted(coordinator.products),
+            "poll_interval": coordinator.poll_interval.total_seconds(),
+            "priority": coordinator.priority,
+            "realtime_window": coordinator.realtime_window,
+            "tracked_lines": sorted(coordinator.tracked_lines),
+            "last_update_success": coordinator.last_update_success,
+            "departures": len(snapshot.departures) if snapshot else None,
+            "fetched_at": (
+                snapshot.fetched_at.isoformat()
+                if snapshot and snapshot.fetched_at
+                else None
+            ),
+            "source_base": snapshot.source_base if snapshot else None,
+            "data_age": age.total_seconds() if age is not None else None,
+            "stale": coordinator.is_stale(now),
+            "known_destinations": len(coordinator.discovery.destinations),
+            "known_directions": len(coordinator.discovery.directions),
+            "line_sensors": coordinator.discovery.sensor_count,
+        },
+        "metrics": coordinator.metrics.as_dict(),
+        # All stations side by side, including those set up in YAML.
+        "stations": {
+            other.station_id: _station_summary(other)
+            for other in hass.data[DOMAIN].values()
+        },
+        "api": get_request_stats(),
+        "poller": hass.data[DATA_POLLER].as_dict(),
+        "trips": hass.data[DATA_TRIP_TRACKER].as_dict(),
+        "search": get_search_stats(),
+        "timetable": get_timetable_stats(),
+    }
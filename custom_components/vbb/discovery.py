@@ -0,0 +1,261 @@
+"""Track the lines served at a station and retire those that stopped."""
+
+from __future__ import annotations
+
+from collections.abc import Container, Iterable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+import re
+from typing import TYPE_CHECKING, Any
+import unicodedata
+
+from homeassistant.util import dt as dt_util
+
+if TYPE_CHECKING:
+    from .snapshot import Departure
+
+Pair = tuple[str, str]
+
+# A trailing place qualifier such as "(Berlin)"; "(Terminal 5)" is kept.
+_QUALIFIER = re.compile(r"\s*\(\s*[^\W\d_]+\s*\)\s*$")
+_ABBREVIATIONS = (
+    (re.compile(r"\bbhf\b\.?"), "bahnhof"),
+    # "Hauptstr." and a lone "Str", but not names such as "Kastr".
+    (re.compile(r"str\.|\bstr\b"), "strasse"),
+)
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize_name(name: str) -> str:
+    """Return the form under which near-identical stop names are merged.
+
+    Case, accents, punctuation, the abbreviations "Bhf" and "Str." and a
+    trailing place qualifier are ignored, so "S+U Hauptbahnhof" and
+    "S+U Hauptbahnhof (Berlin)" share a key.
+    """
+    key = "".join(
+        char
+        for char in unicodedata.normalize("NFKD", name)
+        if not unicodedata.combining(char)
+    ).casefold()
+    key = _QUALIFIER.sub("", key)
+    for pattern, replacement in _ABBREVIATIONS:
+        key = pattern.sub(replacement, key)
+    return _SEPARATORS.sub(" ", key).strip() or name.casefold()
+
+
+# The names on the boards of a station repeat with every fetch.
+destination_key = lru_cache(maxsize=4096)(normalize_name)
+
+
+@dataclass(slots=True)
+class SeenPair:
+    """The product of a discovered pair and when it was last on the board."""
+
+    product: str | None
+    last_seen: datetime
+
+
+@dataclass(slots=True)
+class DiscoveryChanges:
+    """Pairs added and retired by one board."""
+
+    destinations: list[Pair] = field(default_factory=list)
+    directions: list[Pair] = field(default_factory=list)
+    retired_destinations: list[Pair] = field(default_factory=list)
+    retired_directions: list[Pair] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.destinations
+            or self.directions
+            or self.retired_destinations
+            or self.retired_directions
+        )
+
+
+class _Pairs:
+    """Pairs of one kind, findable by their merged name."""
+
+    def __init__(self, weight: int) -> None:
+        # Number of sensors created for each pair.
+        self.weight = weight
+        self.seen: dict[Pair, SeenPair] = {}
+        self._by_key: dict[Pair, Pair] = {}
+
+    def find(self, line: str, name: str) -> Pair | None:
+        return self._by_key.get((line, destination_key(name)))
+
+    def add(self, pair: Pair, product: str | None, now: datetime) -> None:
+        self.seen[pair] = SeenPair(product, now)
+        self._by_key.setdefault((pair[0], destination_key(pair[1])), pair)
+
+    def remove(self, pair: Pair) -> None:
+        del self.seen[pair]
+        key = (pair[0], destination_key(pair[1]))
+        if self._by_key.get(key) == pair:
+            del self._by_key[key]
+
+
+class LineDiscovery:
+    """Discovered (line, destination) and (line, direction) pairs of a station.
+
+    A departure whose destination differs from a known one only in spelling
+    counts for the known pair. Pairs missing from the board for
+    ``retire_after`` are retired. Beyond ``max_sensors`` line sensors, a new
+    pair replaces the pair seen longest ago, but never one on the board.
+    """
+
+    def __init__(
+        self, retire_after: timedelta | None, max_sensors: int, direction_sensors: int
+    ) -> None:
+        self.retire_after = retire_after
+        self.max_sensors = max_sensors
+        self._destinations = _Pairs(1)
+        self._directions = _Pairs(direction_sensors)
+
+    @property
+    def destinations(self) -> dict[Pair, SeenPair]:
+        """Return the known (line, destination) pairs."""
+        return self._destinations.seen
+
+    @property
+    def directions(self) -> dict[Pair, SeenPair]:
+        """Return the known (line, direction) pairs."""
+        return self._directions.seen
+
+    @property
+    def sensor_count(self) -> int:
+        """Return the number of line sensors of the known pairs."""
+        return sum(
+            len(pairs.seen) * pairs.weight
+            for pairs in (self._destinations, self._directions)
+        )
+
+    def _kinds(
+        self, changes: DiscoveryChanges
+    ) -> tuple[tuple[_Pairs, list[Pair], list[Pair]], ...]:
+        """Return the pairs of each kind with their added and retired lists."""
+        return (
+            (self._destinations, changes.destinations, changes.retired_destinations),
+            (self._directions, changes.directions, changes.retired_directions),
+        )
+
+    def observe(
+        self,
+        departures: Iterable[Departure],
+        products: Container[str | None],
+        now: datetime,
+    ) -> DiscoveryChanges:
+        """Mark the pairs of a new board as seen and return what changed."""
+        changes = DiscoveryChanges()
+        # New pairs by merged name, so spelling variants on one board are
+        # added once.
+        found: tuple[dict[Pair, tuple[Pair, str | None]], ...] = ({}, {})
+        for dep in departures:
+            if dep.product not in products or not dep.line:
+                continue
+            for pairs, name, new in zip(
+                (self._destinations, self._directions),
+                (dep.destination_name, dep.direction),
+                found,
+            ):
+                if not name:
+                    continue
+                if (pair := pairs.find(dep.line, name)) is not None:
+                    pairs.seen[pair].last_seen = now
+                else:
+                    new.setdefault(
+                        (dep.line, destination_key(name)),
+                        ((dep.line, name), dep.product),
+                    )
+
+        self.prune(now, products, changes)
+        for (pairs, added, _), new in zip(self._kinds(changes), found):
+            for pair, product in new.values():
+                if not self._make_room(pairs.weight, now, changes):
+                    break
+                pairs.add(pair, product, now)
+                added.append(pair)
+        return changes
+
+    def prune(
+        self,
+        now: datetime,
+        products: Container[str | None],
+        changes: DiscoveryChanges,
+    ) -> None:
+        """Retire the pairs not seen for ``retire_after``.
+
+        Pairs of disabled products are missing from the board because they
+        are not asked for, so they are kept.
+        """
+        if self.retire_after is None:
+            return
+        cutoff = now - self.retire_after
+        for pairs, _, retired in self._kinds(changes):
+            for pair in [
+                p
+                for p, seen in pairs.seen.items()
+                if seen.last_seen < cutoff
+                and (seen.product is None or seen.product in products)
+            ]:
+                pairs.remove(pair)
+                retired.append(pair)
+
+    def resume(self, products: Container[str | None], now: datetime) -> None:
+        """Count the pairs of re-enabled ``products`` as seen ``now``.
+
+        Their lines get a full ``retire_after`` to show up on the board again.
+        """
+        for pairs in (self._destinations, self._directions):
+            for seen in pairs.seen.values():
+                if seen.product is not None and seen.product in products:
+                    seen.last_seen = now
+
+    def _make_room(self, weight: int, now: datetime, changes: DiscoveryChanges) -> bool:
+        """Retire the pairs seen longest ago until ``weight`` sensors fit."""
+        kinds = self._kinds(changes)
+        while self.sensor_count + weight > self.max_sensors:
+            oldest = min(
+                (
+                    (seen.last_seen, index, pair)
+                    for index, (pairs, _, _) in enumerate(kinds)
+                    for pair, seen in pairs.seen.items()
+                    if seen.last_seen < now
+                ),
+                default=None,
+            )
+            if oldest is None:
+                return False
+            _, index, pair = oldest
+            pairs, _, retired = kinds[index]
+            pairs.remove(pair)
+            retired.append(pair)
+        return True
+
+    def restore(self, stored: dict[str, Any], now: datetime) -> None:
+        """Load the pairs written by ``as_stored``."""
+        for pairs, rows in (
+            (self._destinations, stored.get("destinations", [])),
+            (self._directions, stored.get("directions", [])),
+        ):
+            for line, name, product, *last_seen in rows:
+                # Pairs stored before their last sighting was tracked count
+                # as seen now.
+                seen = dt_util.parse_datetime(last_seen[0]) if last_seen else None
+                pairs.add((line, name), product, seen or now)
+
+    def as_stored(self) -> dict[str, Any]:
+        """Return the pairs in a JSON serializable form."""
+        return {
+            "destinations": [
+                [line, name, seen.product, seen.last_seen.isoformat()]
+                for (line, name), seen in self.destinations.items()
+            ],
+            "directions": [
+                [line, name, seen.product, seen.last_seen.isoformat()]
+                for (line, name), seen in self.directions.items()
+            ],
+        }
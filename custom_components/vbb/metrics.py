@@ -0,0 +1,109 @@
+"""Lightweight counters and timing histograms for diagnostics."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+import time
+from typing import Any
+
+# Upper bounds of the histogram buckets in milliseconds.
+BUCKETS_MS = (
+    0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000
+)
+
+
+class Histogram:
+    """Distribution of durations in fixed, logarithmic buckets."""
+
+    __slots__ = ("counts", "count", "total", "maximum", "last")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Add one duration."""
+        ms = seconds * 1000
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.last = ms
+        if ms > self.maximum:
+            self.maximum = ms
+
+    @property
+    def mean(self) -> float | None:
+        """Return the mean duration in milliseconds."""
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> float | None:
+        """Return the bucket bound below which ``q`` of the durations fall."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(float(bound), round(self.maximum, 3))
+        return self.maximum
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the summary and the bucket counts."""
+        return {
+            "count": self.count,
+            "last_ms": round(self.last, 3),
+            "mean_ms": round(self.mean, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.maximum, 3),
+            "buckets": {
+                f"le_{bound}": count
+                for bound, count in zip((*BUCKETS_MS, "inf"), self.counts)
+                if count
+            },
+        }
+
+
+class Metrics:
+    """Named counters and histograms of one station or of the API layer."""
+
+    def __init__(self) -> None:
+        self.counters: Counter[str] = Counter()
+        self.histograms: dict[str, Histogram] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Add ``value`` to a counter."""
+        self.counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Add a duration to a histogram."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        """Time the enclosed block into a histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return all counters and histogram summaries."""
+        return {
+            "counters": dict(self.counters),
+            "timings": {
+                name: histogram.as_dict()
+                for name, histogram in sorted(self.histograms.items())
+            },
+        }
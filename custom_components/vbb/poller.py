@@ -0,0 +1,175 @@
+"""Shared polling of all VBB stations."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import random
+from typing import TYPE_CHECKING, Any
+
+from aiohttp import ClientSession, TCPConnector
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+
+from .const import HEADERS, KEEPALIVE_TIMEOUT
+from .metrics import Metrics
+
+if TYPE_CHECKING:
+    from .coordinator import VbbStationCoordinator
+
+# Fetches are moved by up to this share of the interval in either direction.
+POLL_JITTER = 0.1
+
+
+class StationPoller:
+    """Fetch every station when it is due, instead of one timer per station.
+
+    Each new station starts in the middle of the widest gap between the
+    fetches of the stations already polled and each next fetch is jittered,
+    so stations set up together spread evenly over the interval rather than
+    firing on the same second. Stations due at the same time
+    are started in the order of their priority. All of them share one
+    session whose connection pool keeps the API connections alive.
+    """
+
+    def __init__(self, hass: HomeAssistant, session: ClientSession) -> None:
+        self.hass = hass
+        self.session = session
+        self.metrics = Metrics()
+        self._queue: list[tuple[float, int, int, VbbStationCoordinator]] = []
+        self._due: dict[VbbStationCoordinator, float] = {}
+        self._stations: set[VbbStationCoordinator] = set()
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._in_flight = 0
+
+    @callback
+    def async_add(self, coordinator: VbbStationCoordinator) -> CALLBACK_TYPE:
+        """Start polling a station; the returned callback stops it."""
+        self._stations.add(coordinator)
+        self._schedule(coordinator, self._first_delay(coordinator))
+
+        @callback
+        def remove() -> None:
+            self._stations.discard(coordinator)
+            self._due.pop(coordinator, None)
+
+        return remove
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop polling all stations."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._stations.clear()
+        self._due.clear()
+        self._queue.clear()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the polling state for diagnostics."""
+        loop_time = self.hass.loop.time()
+        return {
+            "stations": len(self._stations),
+            "in_flight": self._in_flight,
+            "next_due": {
+                coordinator.station_id: round(due - loop_time, 1)
+                for coordinator, due in sorted(self._due.items(), key=lambda i: i[1])
+            },
+            **self.metrics.as_dict(),
+        }
+
+    def _first_delay(self, coordinator: VbbStationCoordinator) -> float:
+        """Return the delay that puts a new station into the widest gap.
+
+        The due times of the other stations are folded into one interval.
+        A station set up alone waits a full interval, as it was fetched on
+        setup.
+        """
+        interval = coordinator.poll_interval.total_seconds()
+        if interval <= 0:
+            return interval
+        now = self.hass.loop.time()
+        offsets = sorted(
+            (due - now) % interval
+            for other, due in self._due.items()
+            if other is not coordinator
+        )
+        if not offsets:
+            return interval
+        # The gap after the last offset wraps around to the first.
+        gaps = zip(offsets, [*offsets[1:], offsets[0] + interval])
+        start, end = max(gaps, key=lambda gap: gap[1] - gap[0])
+        return ((start + end) / 2) % interval
+
+    def _schedule(self, coordinator: VbbStationCoordinator, delay: float) -> None:
+        due = self.hass.loop.time() + delay
+        self._due[coordinator] = due
+        heapq.heappush(
+            self._queue, (due, coordinator.priority, next(self._counter), coordinator)
+        )
+        self._arm()
+
+    def _arm(self) -> None:
+        """Set the timer to the earliest due station."""
+        # Entries of removed or rescheduled stations are dropped lazily.
+        while self._queue and self._due.get(self._queue[0][3]) != self._queue[0][0]:
+            heapq.heappop(self._queue)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._queue:
+            self._timer = self.hass.loop.call_at(self._queue[0][0], self._dispatch)
+
+    @callback
+    def _dispatch(self) -> None:
+        """Start the fetches of all stations that are due."""
+        self._timer = None
+        now = self.hass.loop.time()
+        while self._queue and self._queue[0][0] <= now:
+            due, _, _, coordinator = heapq.heappop(self._queue)
+            if self._due.get(coordinator) != due:
+                continue
+            del self._due[coordinator]
+            self.metrics.observe("poll_lateness", now - due)
+            self.hass.async_create_background_task(
+                self._async_poll(coordinator), f"{coordinator.name} poll"
+            )
+        self._arm()
+
+    async def _async_poll(self, coordinator: VbbStationCoordinator) -> None:
+        self._in_flight += 1
+        self.metrics.increment("polls")
+        try:
+            await coordinator.async_refresh()
+        finally:
+            self._in_flight -= 1
+        if coordinator in self._stations:
+            interval = coordinator.poll_interval.total_seconds()
+            self._schedule(
+                coordinator,
+                interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER),
+            )
+
+
+@callback
+def async_create_poller(hass: HomeAssistant, max_connections: int) -> StationPoller:
+    """Create the poller and its session, closing both when Home Assistant stops."""
+    session = ClientSession(
+        connector=TCPConnector(
+            limit=max_connections,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        ),
+        headers=HEADERS,
+    )
+    poller = StationPoller(hass, session)
+
+    async def async_close(event: Event) -> None:
+        poller.async_stop()
+        await session.close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, async_close)
+    return poller
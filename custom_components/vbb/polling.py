@@ -0,0 +1,114 @@
+"""Adaptive poll interval of the station coordinator."""
+
+from __future__ import annotations
+
+from datetime import datetime, time, timedelta
+
+MIN_POLL_INTERVAL = timedelta(minutes=1)
+MAX_POLL_INTERVAL = timedelta(minutes=30)
+# Departures closer than this are polled at the configured interval.
+IMMINENT_DEPARTURE = timedelta(minutes=5)
+# Growth of the interval per poll that returned an unchanged board.
+BACKOFF_FACTOR = 1.5
+# The interval never grows beyond this multiple of the configured one.
+BACKOFF_LIMIT = 4
+
+QuietHours = list[tuple[time, time]]
+
+
+def parse_quiet_hours(value: str | None) -> QuietHours:
+    """Parse windows like ``01:00-04:30, 23:45-00:15``.
+
+    Raises ``ValueError`` for malformed windows.
+    """
+    windows: QuietHours = []
+    for window in (value or "").split(","):
+        if not window.strip():
+            continue
+        start, sep, end = window.partition("-")
+        if not sep:
+            raise ValueError(f"Invalid quiet hours window: {window.strip()}")
+        windows.append(
+            (time.fromisoformat(start.strip()), time.fromisoformat(end.strip()))
+        )
+    return windows
+
+
+def quiet_hours_end(windows: QuietHours, now: datetime) -> datetime | None:
+    """Return when the quiet window containing ``now`` ends, if any.
+
+    ``now`` must be in local time. Windows may span midnight.
+    """
+    current = now.time().replace(tzinfo=None)
+    for start, end in windows:
+        if start <= end:
+            if not start <= current < end:
+                continue
+            days = 0
+        elif current >= start:
+            days = 1
+        elif current < end:
+            days = 0
+        else:
+            continue
+        return datetime.combine(now.date() + timedelta(days=days), end, now.tzinfo)
+    return None
+
+
+def compute_poll_interval(
+    *,
+    base: timedelta,
+    previous: timedelta,
+    now: datetime,
+    next_departure: datetime | None,
+    changed: bool,
+    delays_changed: bool,
+    quiet_until: datetime | None = None,
+    expires_after: timedelta | None = None,
+) -> timedelta:
+    """Return the delay until the next poll of a station.
+
+    ``next_departure`` and ``delays_changed`` refer to the departures the
+    sensors show. Polls are sped up only while those delays are moving,
+    held at ``base`` while one of them is imminent, backed off while the
+    board is unchanged or the next departure is far away, and skipped
+    during quiet hours. The board is always polled again before it is
+    ``expires_after`` old.
+    """
+    if quiet_until is not None:
+        interval = max(quiet_until - now, MIN_POLL_INTERVAL)
+    else:
+        interval = _board_interval(
+            base, previous, now, next_departure, changed, delays_changed
+        )
+    if expires_after is not None:
+        # Poll a minute early, so the new board arrives before expiry.
+        interval = min(interval, max(base, expires_after - MIN_POLL_INTERVAL))
+    return interval
+
+
+def _board_interval(
+    base: timedelta,
+    previous: timedelta,
+    now: datetime,
+    next_departure: datetime | None,
+    changed: bool,
+    delays_changed: bool,
+) -> timedelta:
+    if delays_changed:
+        return max(MIN_POLL_INTERVAL, base / 2)
+
+    ceiling = max(base, min(base * BACKOFF_LIMIT, MAX_POLL_INTERVAL))
+    if next_departure is None:
+        # Nothing runs within the queried time span.
+        return ceiling
+
+    until = next_departure - now
+    if until <= IMMINENT_DEPARTURE:
+        return base
+
+    interval = base if changed else min(max(base, previous * BACKOFF_FACTOR), ceiling)
+    if until - interval > IMMINENT_DEPARTURE:
+        # Wake up shortly before the next departure becomes imminent.
+        interval = max(interval, min(until - IMMINENT_DEPARTURE, ceiling))
+    return interval
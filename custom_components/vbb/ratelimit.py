@@ -0,0 +1,158 @@
+"""Client-side request budget for the transport.rest API."""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+import heapq
+import itertools
+import time
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+
+@dataclass
+class SchedulerStats:
+    """Counters describing how long requests waited for the budget."""
+
+    granted: int = 0
+    waited: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    max_queue_depth: int = 0
+    throttled: int = 0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Return the delay in seconds of a ``Retry-After`` header."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        return None
+    return max((retry_at - dt_util.utcnow()).total_seconds(), 0.0)
+
+
+class RequestScheduler:
+    """Token bucket that hands out requests in priority order.
+
+    The bucket refills at ``requests_per_minute`` and holds at most
+    ``burst`` tokens. Callers that find it empty are queued and released
+    lowest priority value first, then first come first served.
+    """
+
+    def __init__(self, requests_per_minute: int, burst: int | None = None) -> None:
+        self._queue: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._blocked_until = 0.0
+        self.stats = SchedulerStats()
+        self.configure(requests_per_minute, burst)
+
+    def configure(self, requests_per_minute: int, burst: int | None = None) -> None:
+        """Change the request budget."""
+        self._rate = requests_per_minute / 60
+        self._capacity = float(burst or max(1, requests_per_minute // 6))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    @property
+    def queue_depth(self) -> int:
+        """Return the number of requests waiting for a token."""
+        return sum(1 for _, _, waiter in self._queue if not waiter.done())
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the scheduler state for diagnostics."""
+        stats = self.stats
+        return {
+            "requests_per_minute": round(self._rate * 60),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": stats.max_queue_depth,
+            "granted": stats.granted,
+            "waited": stats.waited,
+            "wait_avg": stats.wait_total / stats.waited if stats.waited else 0.0,
+            "wait_max": stats.wait_max,
+            "throttled": stats.throttled,
+            "blocked_for": max(self._blocked_until - time.monotonic(), 0.0),
+        }
+
+    async def async_acquire(self, priority: int) -> None:
+        """Wait until a request of the given priority may be sent."""
+        if not self._queue and self._try_take():
+            self.stats.granted += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        waiter: asyncio.Future[None] = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), waiter))
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, len(self._queue))
+        started = time.monotonic()
+        self._dispatch()
+        await waiter
+
+        waited = time.monotonic() - started
+        self.stats.granted += 1
+        self.stats.waited += 1
+        self.stats.wait_total += waited
+        self.stats.wait_max = max(self.stats.wait_max, waited)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens, for example after an HTTP 429."""
+        self.stats.throttled += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        # Start refilling only once the block is over.
+        self._tokens = 0.0
+        self._updated = self._blocked_until
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return False
+        self._refill(now)
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _dispatch(self) -> None:
+        """Release queued requests while tokens are available."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.done():
+                # The caller was cancelled while waiting.
+                heapq.heappop(self._queue)
+                continue
+            if not self._try_take():
+                break
+            heapq.heappop(self._queue)
+            waiter.set_result(None)
+
+        if not self._queue:
+            return
+
+        now = time.monotonic()
+        delay = max(
+            self._blocked_until - now,
+            (1 - self._tokens) / self._rate,
+            0.0,
+        )
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
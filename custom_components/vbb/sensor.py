@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timedelta
+from abc import abstractmethod
+from collections.abc import Sequence
+from datetime import datetime
+import re
 from typing import Any
 
 import voluptuous as vol
@@ -11,30 +14,90 @@ from homeassistant.components.sensor import (
     PLATFORM_SCHEMA,
     SensorDeviceClass,
     SensorEntity,
+    SensorStateClass,
 )
-from homeassistant.const import CONF_NAME
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.const import CONF_NAME, EVENT_HOMEASSISTANT_STOP, UnitOfTime
+from homeassistant.core import CALLBACK_TYPE, Event, callback
+from homeassistant.helpers import entity_registry as er
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.entity import DeviceInfo
-from homeassistant.helpers.event import async_track_time_interval
-from homeassistant.util import slugify, dt as dt_util
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util, slugify
 
-from .api import async_request_json
 from .const import (
-    API_PATH,
+    CONF_COMPACT_ATTRIBUTES,
+    CONF_DIRECTION_SENSORS,
     CONF_DURATION,
+    CONF_MAX_SENSORS,
+    CONF_PRIORITY,
     CONF_PRODUCTS,
+    CONF_QUIET_HOURS,
+    CONF_REALTIME_WINDOW,
     CONF_RESULTS,
+    CONF_RETIRE_AFTER,
     CONF_STATION_ID,
+    CONF_TRACKED_LINES,
     CONF_UPDATE_INTERVAL,
+    DATA_POLLER,
+    DATA_TRIP_TRACKER,
+    DEFAULT_COMPACT_ATTRIBUTES,
+    DEFAULT_DIRECTION_SENSORS,
     DEFAULT_DURATION,
-    DEFAULT_PRODUCTS,
+    DEFAULT_MAX_SENSORS,
     DEFAULT_NAME,
+    DEFAULT_PRIORITY,
+    DEFAULT_PRODUCTS,
+    DEFAULT_REALTIME_WINDOW,
     DEFAULT_RESULTS,
+    DEFAULT_RETIRE_AFTER,
     DEFAULT_UPDATE_INTERVAL,
     DOMAIN,
     PRODUCT_OPTIONS,
+    STATION_PRIORITIES,
+    UNRECORDED_ATTRIBUTES,
 )
+from .coordinator import VbbStationCoordinator
+from .discovery import DiscoveryChanges
+from .poller import StationPoller
+from .polling import parse_quiet_hours
+from .snapshot import Departure, DepartureSnapshot
+from .timetable import TIMETABLE_SOURCE
+from .trips import TripTracker
+
+# Upcoming departures a sensor is expected to show, the next one included.
+LISTED_DEPARTURES = 3
+
+# Station timings exposed as diagnostic sensors, disabled by default.
+TIMING_SENSORS = {
+    "fetch": "fetch time",
+    "snapshot": "snapshot build time",
+    "entity_update": "entity update time",
+    "discovery": "discovery time",
+}
+
+def _minutes_until(dep_time: datetime, now: datetime) -> int:
+    """Return the whole minutes left until a departure."""
+    return max(int((dep_time - now).total_seconds() // 60), 0)
+
+
+def _freeze(value: Any) -> Any:
+    """Return a hashable copy of nested attribute values."""
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _valid_quiet_hours(value: Any) -> str:
+    """Validate quiet hours like ``01:00-04:30``."""
+    value = cv.string(value)
+    try:
+        parse_quiet_hours(value)
+    except ValueError as err:
+        raise vol.Invalid(str(err)) from err
+    return value
+
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
@@ -52,232 +115,253 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
         vol.Optional(
             CONF_PRODUCTS, default=DEFAULT_PRODUCTS
         ): vol.All(cv.ensure_list, [vol.In(PRODUCT_OPTIONS)]),
+        vol.Optional(CONF_QUIET_HOURS): _valid_quiet_hours,
+        vol.Optional(CONF_PRIORITY, default=DEFAULT_PRIORITY): vol.In(
+            STATION_PRIORITIES
+        ),
+        vol.Optional(
+            CONF_COMPACT_ATTRIBUTES, default=DEFAULT_COMPACT_ATTRIBUTES
+        ): cv.boolean,
+        vol.Optional(CONF_RETIRE_AFTER, default=DEFAULT_RETIRE_AFTER): vol.All(
+            int, vol.Range(min=0)
+        ),
+        vol.Optional(CONF_MAX_SENSORS, default=DEFAULT_MAX_SENSORS): vol.All(
+            int, vol.Range(min=1)
+        ),
+        vol.Optional(
+            CONF_DIRECTION_SENSORS, default=DEFAULT_DIRECTION_SENSORS
+        ): vol.All(int, vol.Range(min=0)),
+        vol.Optional(
+            CONF_REALTIME_WINDOW, default=DEFAULT_REALTIME_WINDOW
+        ): vol.All(int, vol.Range(min=0)),
+        vol.Optional(CONF_TRACKED_LINES, default=[]): vol.All(
+            cv.ensure_list, [cv.string]
+        ),
     }
 )
 
 
-def _get_time(entry: dict[str, Any]) -> str | None:
-    """Return the best available departure time field."""
-    return (
-        entry.get("plannedWhen")
-        or entry.get("when")
-        or entry.get("plannedDeparture")
-        or entry.get("departure")
-    )
-
-
-def _get_delay(entry: dict[str, Any]) -> int | None:
-    """Return delay in minutes if available."""
-    delay = (
-        entry.get("delay")
-        or entry.get("departureDelay")
-        or entry.get("delayInSeconds")
-    )
-    if delay is None:
-        return None
-    if isinstance(delay, int) and abs(delay) > 10:
-        return delay // 60
-    return delay
-
-
-def _extract_departures(data: Any) -> list[dict[str, Any]]:
-    """Normalize API responses to a departures list."""
-
-    if isinstance(data, list):
-        return data
-
-    if isinstance(data, dict):
-        departures = data.get("departures")
-        if isinstance(departures, list):
-            return departures
-
-    return []
+# Suffix of the unique ID of a direction sensor, holding the slot number.
+_DIRECTION_SLOT = re.compile(r"_dir_(\d+)$")
 
 
-def _parse_departure_time(value: str | None) -> datetime | None:
-    """Parse a departure timestamp and normalize it to UTC."""
+def _destination_unique_id(station_id: str, line: str, destination: str) -> str:
+    return f"vbb_{station_id}_{slugify(line)}_{slugify(destination)}"
 
-    if not value:
-        return None
 
-    parsed = dt_util.parse_datetime(value)
-    if parsed is None:
-        return None
-
-    try:
-        return dt_util.as_utc(parsed)
-    except (TypeError, ValueError):
-        return None
+def _direction_unique_id(
+    station_id: str, line: str, direction: str, departure_index: int
+) -> str:
+    return (
+        f"vbb_{station_id}_{slugify(line)}_{slugify(direction)}"
+        f"_dir_{departure_index + 1}"
+    )
 
 
 async def _async_setup_station(
     hass,
-    station_id: str,
-    name: str,
-    duration: int,
-    results: int,
-    products: list[str],
-    update_interval: int,
+    coordinator: VbbStationCoordinator,
     async_add_entities,
-) -> None:
-    """Set up sensors for a station and add new ones dynamically."""
-    session = async_get_clientsession(hass)
-    known_pairs: set[tuple[str, str]] = set()
-    known_dirs: set[tuple[str, str]] = set()
+) -> CALLBACK_TYPE:
+    """Set up sensors for a station and add new ones dynamically.
+
+    Returns a callback that stops the discovery of new line sensors.
+    """
+    last_snapshot: DepartureSnapshot | None = None
+    last_products: set[str] = set()
+    # Pairs that have sensors. Pairs of disabled products get theirs once
+    # the product is enabled.
+    created_destinations: set[tuple[str, str]] = set()
+    created_directions: set[tuple[str, str]] = set()
 
     # Always expose a station-level sensor so the integration still provides
     # departure times even if no specific line/destination combinations are
     # discovered (for example due to temporary API errors).
     async_add_entities(
         [
-            VbbStationSensor(
-                hass,
-                station_id,
-                name,
-                duration,
-                results,
-                products,
-                update_interval,
-                session,
-            )
-        ],
-        True,
+            VbbStationSensor(coordinator),
+            VbbPollIntervalSensor(coordinator),
+            *(
+                VbbTimingSensor(coordinator, metric, label)
+                for metric, label in TIMING_SENSORS.items()
+            ),
+        ]
     )
 
-    async def discover(now=None):
-        params = {"duration": duration, "results": results}
-        try:
-            data = await async_request_json(
-                session, API_PATH.format(station=station_id), params
-            )
-        except Exception:
-            return
-
+    @callback
+    def add_sensors() -> None:
+        """Create the missing sensors of known pairs of enabled products."""
+        discovery = coordinator.discovery
         sensors: list[SensorEntity] = []
-        departures = _extract_departures(data)
-
-        for d in departures:
-            line_info = d.get("line") or {}
-            if line_info.get("product") not in products:
-                continue
-            line = line_info.get("name")
-            dest_info = d.get("destination") or {}
-            destination = dest_info.get("name") or d.get("direction")
-            direction = d.get("direction")
-            if line and destination and (line, destination) not in known_pairs:
-                known_pairs.add((line, destination))
+        for (line, destination), seen in discovery.destinations.items():
+            if (
+                seen.product in coordinator.products
+                and (line, destination) not in created_destinations
+            ):
+                created_destinations.add((line, destination))
                 sensors.append(
-                    VbbDepartureSensor(
-                        hass,
-                        station_id,
-                        name,
-                        line,
-                        destination,
-                        duration,
-                        results,
-                        update_interval,
-                    )
+                    VbbDepartureSensor(coordinator, line, destination, seen.product)
+                )
+        for (line, direction), seen in discovery.directions.items():
+            if (
+                seen.product in coordinator.products
+                and (line, direction) not in created_directions
+            ):
+                created_directions.add((line, direction))
+                group = DirectionGroup(coordinator, line, direction, seen.product)
+                sensors.extend(
+                    VbbDirectionSensor(group, departure_index)
+                    for departure_index in range(coordinator.direction_sensors)
                 )
-            if line and direction and (line, direction) not in known_dirs:
-                known_dirs.add((line, direction))
-                for departure_index in range(3):
-                    sensors.append(
-                        VbbDirectionSensor(
-                            hass,
-                            station_id,
-                            name,
-                            line,
-                            direction,
-                            duration,
-                            results,
-                            update_interval,
-                            departure_index,
-                        )
-                    )
-
         if sensors:
-            async_add_entities(sensors, True)
+            async_add_entities(sensors)
+
+    @callback
+    def retire_sensors(changes: DiscoveryChanges) -> None:
+        """Remove the sensors of retired pairs, including their registry entries."""
+        station_id = coordinator.station_id
+        created_destinations.difference_update(changes.retired_destinations)
+        created_directions.difference_update(changes.retired_directions)
+        unique_ids = [
+            _destination_unique_id(station_id, line, destination)
+            for line, destination in changes.retired_destinations
+        ]
+        for line, direction in changes.retired_directions:
+            unique_ids.extend(
+                _direction_unique_id(station_id, line, direction, departure_index)
+                for departure_index in range(coordinator.direction_sensors)
+            )
+        registry = er.async_get(hass)
+        for unique_id in unique_ids:
+            if entity_id := registry.async_get_entity_id("sensor", DOMAIN, unique_id):
+                # Removing the entry also removes the running entity.
+                registry.async_remove(entity_id)
+        coordinator.metrics.increment("retired_sensors", len(unique_ids))
+
+    # Slots beyond a lowered number of direction sensors are not created
+    # any more, so drop their registry entries.
+    registry = er.async_get(hass)
+    prefix = f"vbb_{coordinator.station_id}_"
+    for entry in list(registry.entities.values()):
+        if (
+            entry.platform == DOMAIN
+            and entry.unique_id.startswith(prefix)
+            and (match := _DIRECTION_SLOT.search(entry.unique_id))
+            and int(match[1]) > coordinator.direction_sensors
+        ):
+            registry.async_remove(entry.entity_id)
+
+    # Lines not seen for too long while Home Assistant was stopped are
+    # retired before their sensors come up again.
+    changes = DiscoveryChanges()
+    coordinator.discovery.prune(dt_util.utcnow(), coordinator.products, changes)
+    if changes:
+        coordinator.async_schedule_save()
+        retire_sensors(changes)
+
+    @callback
+    def discover() -> None:
+        nonlocal last_snapshot, last_products
+        if coordinator.products != last_products:
+            # Sensors discovered before a restart or while their product was
+            # disabled come up right away instead of waiting for a fetch.
+            last_products = set(coordinator.products)
+            add_sensors()
+
+        # Local ticks re-deliver the same snapshot; only new boards can
+        # contain new lines.
+        if coordinator.data is None or coordinator.data is last_snapshot:
+            return
+        last_snapshot = coordinator.data
+        # The scheduled fallback board lacks replacement services and
+        # diversions, so it neither adds lines nor keeps them from retiring.
+        if last_snapshot.source_base == TIMETABLE_SOURCE:
+            return
 
-    await discover()
-    async_track_time_interval(
-        hass, discover, timedelta(minutes=update_interval)
-    )
+        with coordinator.metrics.measure("discovery"):
+            changes = coordinator.discovery.observe(
+                coordinator.data.departures, coordinator.products, dt_util.utcnow()
+            )
+
+        if changes:
+            coordinator.async_schedule_save()
+            retire_sensors(changes)
+            add_sensors()
+
+    discover()
+    return coordinator.async_add_listener(discover)
 
 
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Set up the VBB sensor platform."""
-    station_id = config[CONF_STATION_ID]
-    name = config[CONF_NAME]
-    duration = config.get(CONF_DURATION, DEFAULT_DURATION)
-    results = config.get(CONF_RESULTS, DEFAULT_RESULTS)
-    products = config.get(CONF_PRODUCTS, DEFAULT_PRODUCTS)
-    update_interval = config.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
-    await _async_setup_station(
+    poller: StationPoller = hass.data[DATA_POLLER]
+    coordinator = VbbStationCoordinator(
         hass,
-        station_id,
-        name,
-        duration,
-        results,
-        products,
-        update_interval,
-        async_add_entities,
+        config[CONF_STATION_ID],
+        config[CONF_NAME],
+        config.get(CONF_DURATION, DEFAULT_DURATION),
+        config.get(CONF_RESULTS, DEFAULT_RESULTS),
+        config.get(CONF_PRODUCTS, DEFAULT_PRODUCTS),
+        config.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL),
+        session=poller.session,
+        quiet_hours=config.get(CONF_QUIET_HOURS),
+        compact_attributes=config.get(
+            CONF_COMPACT_ATTRIBUTES, DEFAULT_COMPACT_ATTRIBUTES
+        ),
+        priority=config.get(CONF_PRIORITY, DEFAULT_PRIORITY),
+        retire_after=config.get(CONF_RETIRE_AFTER, DEFAULT_RETIRE_AFTER),
+        max_sensors=config.get(CONF_MAX_SENSORS, DEFAULT_MAX_SENSORS),
+        direction_sensors=config.get(
+            CONF_DIRECTION_SENSORS, DEFAULT_DIRECTION_SENSORS
+        ),
+        realtime_window=config.get(CONF_REALTIME_WINDOW, DEFAULT_REALTIME_WINDOW),
+        tracked_lines=config.get(CONF_TRACKED_LINES, []),
     )
+    key = f"platform_{coordinator.station_id}"
+    hass.data.setdefault(DOMAIN, {})[key] = coordinator
+    await coordinator.async_setup()
+    stop_polling = poller.async_add(coordinator)
+    stop_discovery = await _async_setup_station(hass, coordinator, async_add_entities)
+
+    @callback
+    def async_unload(event: Event) -> None:
+        # YAML platforms are not reloaded, so they unload when Home
+        # Assistant stops.
+        stop_polling()
+        stop_discovery()
+        hass.data[DOMAIN].pop(key, None)
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_unload)
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up VBB sensor from a config entry."""
-    station_id = entry.data[CONF_STATION_ID]
-    name = entry.data[CONF_NAME]
-    duration = entry.data.get(CONF_DURATION, DEFAULT_DURATION)
-    results = entry.data.get(CONF_RESULTS, DEFAULT_RESULTS)
-    products = entry.options.get(
-        CONF_PRODUCTS, entry.data.get(CONF_PRODUCTS, DEFAULT_PRODUCTS)
-    )
-    update_interval = entry.data.get(CONF_UPDATE_INTERVAL, DEFAULT_UPDATE_INTERVAL)
-    await _async_setup_station(
-        hass,
-        station_id,
-        name,
-        duration,
-        results,
-        products,
-        update_interval,
-        async_add_entities,
+    coordinator: VbbStationCoordinator = hass.data[DOMAIN][entry.entry_id]
+    entry.async_on_unload(
+        await _async_setup_station(hass, coordinator, async_add_entities)
     )
 
 
-class VbbDepartureSensor(SensorEntity):
-    """Representation of a VBB departure sensor."""
+class VbbBaseSensor(CoordinatorEntity[VbbStationCoordinator], SensorEntity):
+    """Common behaviour of sensors fed by the station coordinator."""
 
     _attr_device_class = SensorDeviceClass.TIMESTAMP
-    _attr_icon = "mdi:train"
-
-    def __init__(
-        self,
-        hass,
-        station_id: str,
-        station_name: str,
-        line: str,
-        destination: str,
-        duration: int,
-        results: int,
-        update_interval: int,
-    ) -> None:
-        self.hass = hass
-        self._station_id = station_id
-        self._station_name = station_name
-        self._line = line
-        self._destination = destination
-        self._direction: str | None = None
-        self._duration = duration
-        self._results = results
-        self._attr_name = f"{line} {destination}"
-        self._attr_unique_id = (
-            f"vbb_{station_id}_{slugify(line)}_{slugify(destination)}"
-        )
+    _unrecorded_attributes = UNRECORDED_ATTRIBUTES
+    # Upcoming departures of ``_select`` the sensor relies on. With compact
+    # attributes, the demand of all sensors sizes the ``results`` parameter
+    # of the station query.
+    _rows_needed = 0
+    # Product of the line; the sensor is unavailable while it is disabled.
+    _product: str | None = None
+
+    def __init__(self, coordinator: VbbStationCoordinator) -> None:
+        super().__init__(coordinator)
+        self._station_id = coordinator.station_id
+        self._station_name = coordinator.station_name
         self._attr_extra_state_attributes: dict[str, Any] = {}
-        self._attr_scan_interval = timedelta(minutes=update_interval)
-        self._session = async_get_clientsession(hass)
+        self._fingerprint: int | None = None
+        self._followed_trip: str | None = None
+        self._release_trip: CALLBACK_TYPE | None = None
 
     @property
     def device_info(self) -> DeviceInfo:
@@ -287,253 +371,356 @@ class VbbDepartureSensor(SensorEntity):
             manufacturer="VBB",
         )
 
+    @property
+    def _product_disabled(self) -> bool:
+        product = self._product
+        return product is not None and product not in self.coordinator.products
+
+    @property
+    def available(self) -> bool:
+        # Keep serving the last board while the API is unreachable, until it
+        # is too old to hold any upcoming departure.
+        if self._product_disabled:
+            return False
+        return self.coordinator.data is not None and not self.coordinator.is_expired(
+            dt_util.utcnow()
+        )
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the departure attributes and when the board was fetched.
+
+        The age of the board is not an attribute: it changes every second
+        and would be out of date between writes. It follows from
+        ``fetched_at``, which changes with every new board.
+        """
+        snapshot = self.coordinator.data
+        if snapshot is None:
+            return self._attr_extra_state_attributes
+        return {
+            **self._attr_extra_state_attributes,
+            "fetched_at": snapshot.fetched_at.isoformat() if snapshot.fetched_at else None,
+            "stale": self.coordinator.is_stale(dt_util.utcnow()),
+            "source_base": snapshot.source_base,
+        }
+
     async def async_update(self) -> None:
-        """Fetch departures from the VBB API."""
-        params = {"duration": self._duration, "results": self._results}
-        try:
-            data = await async_request_json(
-                self._session, API_PATH.format(station=self._station_id), params
+        """Request a refresh of the board without waiting for it."""
+        self.coordinator.async_request_background_refresh()
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(lambda: self._follow_trip(None))
+        if self._rows_needed:
+            self.async_on_remove(
+                self.coordinator.async_add_demand(self._demand, self._rows_needed)
+            )
+        if self.coordinator.data is not None:
+            self._handle_departures()
+        # Home Assistant writes the initial state right after this.
+        self._fingerprint = self._state_fingerprint()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        # Also runs on the local ticks of the coordinator, which re-evaluate
+        # the last board against the current time without fetching.
+        if self.coordinator.data is not None:
+            self._handle_departures()
+        fingerprint = self._state_fingerprint()
+        if fingerprint == self._fingerprint:
+            self.coordinator.metrics.increment("suppressed_writes")
+            return
+        self._fingerprint = fingerprint
+        self.coordinator.metrics.increment("state_writes")
+        self.async_write_ha_state()
+
+    def _state_fingerprint(self) -> int:
+        """Return a hash of everything a state write would change."""
+        return hash(
+            (
+                self.available,
+                self._attr_native_value,
+                _freeze(self.extra_state_attributes),
             )
-        except Exception:
-            # Keep the last successful state when the API is temporarily unreachable.
+        )
+
+    def _select(
+        self, snapshot: DepartureSnapshot, now: datetime
+    ) -> Sequence[Departure]:
+        """Return the upcoming departures shown by this sensor."""
+        return ()
+
+    def _demand(
+        self, snapshot: DepartureSnapshot, now: datetime
+    ) -> Sequence[Departure]:
+        """Return the departures this sensor needs fetched.
+
+        A sensor of a disabled product shows nothing, so it needs nothing.
+        An expired board does not count as unavailable here: it affects all
+        sensors alike and is about to be replaced.
+        """
+        if self._product_disabled:
+            return ()
+        return self._select(snapshot, now)
+
+    @callback
+    def _follow_trip(self, trip_id: str | None) -> None:
+        """Follow the vehicle of ``trip_id``, releasing the previous one."""
+        if trip_id == self._followed_trip:
             return
+        if self._release_trip is not None:
+            self._release_trip()
+            self._release_trip = None
+        self._followed_trip = trip_id
+        if trip_id is not None:
+            tracker: TripTracker = self.hass.data[DATA_TRIP_TRACKER]
+            self._release_trip = tracker.async_follow(
+                trip_id, self._handle_coordinator_update
+            )
+
+    def _trip_position(
+        self, departure: Departure, follow: bool = True
+    ) -> dict[str, Any] | None:
+        """Return the vehicle position, followed live on tracked lines."""
+        trip_id = departure.trip_id
+        if not (
+            follow
+            and trip_id
+            and departure.line in self.coordinator.tracked_lines
+        ):
+            self._follow_trip(None)
+            return departure.current_trip_position
+        self._follow_trip(trip_id)
+        tracker: TripTracker = self.hass.data[DATA_TRIP_TRACKER]
+        position = tracker.position(trip_id)
+        if position is None:
+            return departure.current_trip_position
+        return {"type": "location", "latitude": position[0], "longitude": position[1]}
+
+    def _listed(self, departures: Sequence[Departure]) -> Sequence[Departure]:
+        """Return the departures to list in the ``departures`` attribute."""
+        if self.coordinator.compact_attributes:
+            return departures[:LISTED_DEPARTURES]
+        return departures
+
+    @abstractmethod
+    @callback
+    def _handle_departures(self) -> None:
+        """Update the entity state from the shared departures board."""
+
+
+class VbbDepartureSensor(VbbBaseSensor):
+    """Representation of a VBB departure sensor."""
+
+    _attr_icon = "mdi:train"
+    _rows_needed = LISTED_DEPARTURES
+
+    def __init__(
+        self,
+        coordinator: VbbStationCoordinator,
+        line: str,
+        destination: str,
+        product: str | None = None,
+    ) -> None:
+        super().__init__(coordinator)
+        self._line = line
+        self._destination = destination
+        self._product = product
+        self._direction: str | None = None
+        self._attr_name = f"{line} {destination}"
+        self._attr_unique_id = _destination_unique_id(
+            self._station_id, line, destination
+        )
+
+    def _select(
+        self, snapshot: DepartureSnapshot, now: datetime
+    ) -> Sequence[Departure]:
+        return snapshot.for_destination(self._line, self._destination, now)
 
-        self._attr_available = True
-
-        departures: list[tuple[datetime, dict[str, Any]]] = []
-        for d in _extract_departures(data):
-            if d.get("line", {}).get("name") != self._line:
-                continue
-            dest_info = d.get("destination") or {}
-            dest_name = dest_info.get("name") or d.get("direction")
-            if dest_name != self._destination:
-                continue
-            dep_time = _parse_departure_time(_get_time(d))
-            if dep_time is None:
-                continue
-            if dep_time <= dt_util.utcnow():
-                continue
-            departures.append((dep_time, d))
+    @callback
+    def _handle_departures(self) -> None:
+        """Select the departures of this line and destination."""
+        now = dt_util.utcnow()
+        departures = self._select(self.coordinator.data, now)
 
         if not departures:
+            self._follow_trip(None)
             self._attr_native_value = None
             self._attr_extra_state_attributes = {}
             return
 
-        departures.sort(key=lambda item: item[0])
-        first_time, first = departures[0]
-        self._station_name = first.get("stop", {}).get("name", self._station_name)
-        self._direction = first.get("direction")
-        dest_info = first.get("destination") or {}
-        destination_name = dest_info.get("name") or self._destination
-        self._attr_native_value = first_time
-
-        stop = first.get("stop") or {}
-        location = stop.get("location") or {}
-        line_info = first.get("line") or {}
-        origin_info = first.get("origin") or {}
-        current_pos = first.get("currentTripPosition") or None
-        delay = _get_delay(first)
+        first = departures[0]
+        self._station_name = first.stop_name or self._station_name
+        self._direction = first.direction
+        self._attr_native_value = first.when
 
         self._attr_extra_state_attributes = {
             "line": self._line,
-            "destination": destination_name,
+            "destination": first.destination or self._destination,
             "direction": self._direction,
             "station_id": self._station_id,
-            "station_name": stop.get("name"),
-            "station_dhid": stop.get("stationDHID"),
-            "latitude": location.get("latitude"),
-            "longitude": location.get("longitude"),
-            "line_id": line_info.get("id"),
-            "mode": line_info.get("mode"),
-            "product": line_info.get("product"),
-            "operator": line_info.get("operator", {}).get("name"),
-            "trip_id": first.get("tripId"),
-            "delay": delay,
-            "prognosis_type": first.get("prognosisType"),
-            "origin": origin_info.get("name"),
-            "current_trip_position": current_pos or None,
+            "station_name": first.stop_name,
+            "station_dhid": first.stop_dhid,
+            "latitude": first.latitude,
+            "longitude": first.longitude,
+            "line_id": first.line_id,
+            "mode": first.mode,
+            "product": first.product,
+            "operator": first.operator,
+            "trip_id": first.trip_id,
+            "minutes": _minutes_until(first.when, now),
+            "delay": first.delay,
+            "prognosis_type": first.prognosis_type,
+            "origin": first.origin,
+            "current_trip_position": self._trip_position(first),
             "departures": [
                 {
-                    "when": _get_time(d),
-                    "delay": _get_delay(d),
-                    "platform": d.get("platform"),
-                    "destination": (d.get("destination") or {}).get("name"),
-                    "trip_id": d.get("tripId"),
-                    "prognosis_type": d.get("prognosisType"),
+                    "when": d.time,
+                    "delay": d.delay,
+                    "platform": d.platform,
+                    "destination": d.destination,
+                    "trip_id": d.trip_id,
+                    "prognosis_type": d.prognosis_type,
                 }
-                for _, d in departures
+                for d in self._listed(departures)
             ],
         }
 
 
-class VbbStationSensor(SensorEntity):
+class VbbStationSensor(VbbBaseSensor):
     """Aggregate next departures for an entire station."""
 
-    _attr_device_class = SensorDeviceClass.TIMESTAMP
     _attr_icon = "mdi:train-clock"
+    _rows_needed = LISTED_DEPARTURES
 
-    def __init__(
-        self,
-        hass,
-        station_id: str,
-        station_name: str,
-        duration: int,
-        results: int,
-        products: list[str],
-        update_interval: int,
-        session,
-    ) -> None:
-        self.hass = hass
-        self._station_id = station_id
-        self._station_name = station_name
-        self._duration = duration
-        self._results = results
-        self._products = set(products)
-        self._session = session
-        self._attr_name = station_name
-        self._attr_unique_id = f"vbb_{station_id}_station"
-        self._attr_extra_state_attributes: dict[str, Any] = {}
-        self._attr_scan_interval = timedelta(minutes=update_interval)
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        return DeviceInfo(
-            identifiers={(DOMAIN, self._station_id)},
-            name=self._station_name,
-            manufacturer="VBB",
-        )
-
-    async def async_update(self) -> None:
-        """Fetch the next departure for the station."""
+    def __init__(self, coordinator: VbbStationCoordinator) -> None:
+        super().__init__(coordinator)
+        self._attr_name = coordinator.station_name
+        self._attr_unique_id = f"vbb_{self._station_id}_station"
 
-        params = {"duration": self._duration, "results": self._results}
+    def _select(
+        self, snapshot: DepartureSnapshot, now: datetime
+    ) -> Sequence[Departure]:
+        return snapshot.for_products(self.coordinator.products, now)
 
-        try:
-            data = await async_request_json(
-                self._session, API_PATH.format(station=self._station_id), params
-            )
-        except Exception:
-            # Keep the last successful state when the API is temporarily unreachable.
-            return
-
-        departures: list[tuple[datetime, dict[str, Any]]] = []
-        for dep in _extract_departures(data):
-            product = dep.get("line", {}).get("product")
-            if product and product not in self._products:
-                continue
-            dep_time = _parse_departure_time(_get_time(dep))
-            if dep_time is None or dep_time <= dt_util.utcnow():
-                continue
-            departures.append((dep_time, dep))
+    @callback
+    def _handle_departures(self) -> None:
+        """Select the next departures of all enabled products."""
+        now = dt_util.utcnow()
+        departures = self._select(self.coordinator.data, now)
 
         if not departures:
-            self._attr_available = True
             self._attr_native_value = None
             self._attr_extra_state_attributes = {}
             return
 
-        departures.sort(key=lambda item: item[0])
-        first_time, first = departures[0]
-        self._attr_available = True
-        self._attr_native_value = first_time
-
-        stop = first.get("stop") or {}
-        line_info = first.get("line") or {}
-        destination = (first.get("destination") or {}).get("name")
+        first = departures[0]
+        self._attr_native_value = first.when
 
         self._attr_extra_state_attributes = {
-            "line": line_info.get("name"),
-            "destination": destination,
+            "line": first.line,
+            "destination": first.destination,
             "station_id": self._station_id,
-            "station_name": stop.get("name", self._station_name),
-            "product": line_info.get("product"),
+            "station_name": first.stop_name or self._station_name,
+            "product": first.product,
+            "minutes": _minutes_until(first.when, now),
             "departures": [
                 {
-                    "when": _get_time(dep),
-                    "delay": _get_delay(dep),
-                    "line": (dep.get("line") or {}).get("name"),
-                    "destination": (dep.get("destination") or {}).get("name"),
+                    "when": dep.time,
+                    "delay": dep.delay,
+                    "line": dep.line,
+                    "destination": dep.destination,
                 }
-                for _, dep in departures
+                for dep in self._listed(departures)
             ],
         }
 
 
-class VbbDirectionSensor(SensorEntity):
-    """Representation of a VBB direction sensor aggregating all destinations."""
+class DirectionGroup:
+    """Upcoming departures of one line and direction, shared by its slots.
 
-    _attr_device_class = SensorDeviceClass.TIMESTAMP
-    _attr_icon = "mdi:train"
+    The rows and the ``departures`` attribute are built once per update of
+    the coordinator and every slot sensor of the group picks its row.
+    """
 
     def __init__(
         self,
-        hass,
-        station_id: str,
-        station_name: str,
+        coordinator: VbbStationCoordinator,
         line: str,
         direction: str,
-        duration: int,
-        results: int,
-        update_interval: int,
-        departure_index: int,
+        product: str | None = None,
     ) -> None:
-        self.hass = hass
-        self._station_id = station_id
-        self._station_name = station_name
-        self._line = line
-        self._direction = direction
-        self._duration = duration
-        self._results = results
-        self._departure_index = departure_index
-        self._attr_name = f"{line} {direction} {departure_index + 1}"
-        self._attr_unique_id = (
-            f"vbb_{station_id}_{slugify(line)}_{slugify(direction)}_dir_{departure_index + 1}"
+        self.coordinator = coordinator
+        self.line = line
+        self.direction = direction
+        self.product = product
+        self.rows: Sequence[Departure] = ()
+        self.listed: list[dict[str, Any]] = []
+        self._built_for: tuple[DepartureSnapshot | None, int] | None = None
+
+    def refresh(self) -> None:
+        """Rebuild the rows unless they belong to the current update."""
+        snapshot = self.coordinator.data
+        built_for = (snapshot, self.coordinator.update_count)
+        if snapshot is None or built_for == self._built_for:
+            return
+        self._built_for = built_for
+        self.rows = snapshot.for_direction(
+            self.line, self.direction, dt_util.utcnow()
         )
-        self._attr_extra_state_attributes: dict[str, Any] = {}
-        self._attr_scan_interval = timedelta(minutes=update_interval)
-        self._session = async_get_clientsession(hass)
+        listed = self.rows
+        if self.coordinator.compact_attributes:
+            listed = listed[:LISTED_DEPARTURES]
+        self.listed = [
+            {
+                "when": d.time,
+                "delay": d.delay,
+                "platform": d.platform,
+                "destination": d.destination,
+                "trip_id": d.trip_id,
+                "prognosis_type": d.prognosis_type,
+            }
+            for d in listed
+        ]
 
-    @property
-    def device_info(self) -> DeviceInfo:
-        return DeviceInfo(
-            identifiers={(DOMAIN, self._station_id)},
-            name=self._station_name,
-            manufacturer="VBB",
+
+class VbbDirectionSensor(VbbBaseSensor):
+    """Representation of a VBB direction sensor aggregating all destinations."""
+
+    _attr_icon = "mdi:train"
+
+    def __init__(self, group: DirectionGroup, departure_index: int) -> None:
+        super().__init__(group.coordinator)
+        self._group = group
+        self._line = group.line
+        self._direction = group.direction
+        self._product = group.product
+        self._departure_index = departure_index
+        self._rows_needed = departure_index + 1
+        self._attr_name = f"{self._line} {self._direction} {departure_index + 1}"
+        self._attr_unique_id = _direction_unique_id(
+            self._station_id, self._line, self._direction, departure_index
         )
 
-    async def async_update(self) -> None:
-        """Fetch departures from the VBB API."""
-        params = {"duration": self._duration, "results": self._results}
-        try:
-            data = await async_request_json(
-                self._session, API_PATH.format(station=self._station_id), params
-            )
-        except Exception:
-            # Keep the last successful state when the API is temporarily unreachable.
-            return
+    def _select(
+        self, snapshot: DepartureSnapshot, now: datetime
+    ) -> Sequence[Departure]:
+        return snapshot.for_direction(self._line, self._direction, now)
 
-        self._attr_available = True
-
-        departures: list[tuple[datetime, dict[str, Any]]] = []
-        for d in _extract_departures(data):
-            if d.get("line", {}).get("name") != self._line:
-                continue
-            if d.get("direction") != self._direction:
-                continue
-            dep_time = _parse_departure_time(_get_time(d))
-            if dep_time is None:
-                continue
-            if dep_time <= dt_util.utcnow():
-                continue
-            departures.append((dep_time, d))
+    @callback
+    def _handle_departures(self) -> None:
+        """Select the departure of this line and direction for the slot."""
+        group = self._group
+        group.refresh()
+        departures = group.rows
 
+        if len(departures) <= self._departure_index:
+            self._follow_trip(None)
         if not departures:
             self._attr_native_value = None
             self._attr_extra_state_attributes = {}
             return
 
-        departures.sort(key=lambda item: item[0])
         if len(departures) <= self._departure_index:
             self._attr_native_value = None
             self._attr_extra_state_attributes = {
@@ -541,61 +728,134 @@ class VbbDirectionSensor(SensorEntity):
                 "direction": self._direction,
                 "departure_slot": self._departure_index + 1,
                 "station_id": self._station_id,
-                "departures": [
-                    {
-                        "when": _get_time(d),
-                        "delay": _get_delay(d),
-                        "platform": d.get("platform"),
-                        "destination": (d.get("destination") or {}).get("name"),
-                        "trip_id": d.get("tripId"),
-                        "prognosis_type": d.get("prognosisType"),
-                    }
-                    for _, d in departures
-                ],
+                "departures": group.listed,
             }
             return
 
-        selected_time, selected = departures[self._departure_index]
-        self._station_name = selected.get("stop", {}).get("name", self._station_name)
-        dest_info = selected.get("destination") or {}
-        destination_name = dest_info.get("name")
-        self._attr_native_value = selected_time
-
-        stop = selected.get("stop") or {}
-        location = stop.get("location") or {}
-        line_info = selected.get("line") or {}
-        origin_info = selected.get("origin") or {}
-        current_pos = selected.get("currentTripPosition") or None
-        delay = _get_delay(selected)
+        selected = departures[self._departure_index]
+        self._station_name = selected.stop_name or self._station_name
+        self._attr_native_value = selected.when
 
         self._attr_extra_state_attributes = {
             "line": self._line,
             "direction": self._direction,
             "departure_slot": self._departure_index + 1,
-            "destination": destination_name,
+            "destination": selected.destination,
             "station_id": self._station_id,
-            "station_name": stop.get("name"),
-            "station_dhid": stop.get("stationDHID"),
-            "latitude": location.get("latitude"),
-            "longitude": location.get("longitude"),
-            "line_id": line_info.get("id"),
-            "mode": line_info.get("mode"),
-            "product": line_info.get("product"),
-            "operator": line_info.get("operator", {}).get("name"),
-            "trip_id": selected.get("tripId"),
-            "delay": delay,
-            "prognosis_type": selected.get("prognosisType"),
-            "origin": origin_info.get("name"),
-            "current_trip_position": current_pos or None,
-            "departures": [
-                {
-                    "when": _get_time(d),
-                    "delay": _get_delay(d),
-                    "platform": d.get("platform"),
-                    "destination": (d.get("destination") or {}).get("name"),
-                    "trip_id": d.get("tripId"),
-                    "prognosis_type": d.get("prognosisType"),
-                }
-                for _, d in departures
-            ],
+            "station_name": selected.stop_name,
+            "station_dhid": selected.stop_dhid,
+            "latitude": selected.latitude,
+            "longitude": selected.longitude,
+            "line_id": selected.line_id,
+            "mode": selected.mode,
+            "product": selected.product,
+            "operator": selected.operator,
+            "trip_id": selected.trip_id,
+            # The trip tracker updates the slot between coordinator updates,
+            # when the rows of the group are older.
+            "minutes": _minutes_until(selected.when, dt_util.utcnow()),
+            "delay": selected.delay,
+            "prognosis_type": selected.prognosis_type,
+            "origin": selected.origin,
+            # Only the vehicle of the next departure is followed.
+            "current_trip_position": self._trip_position(
+                selected, follow=self._departure_index == 0
+            ),
+            "departures": group.listed,
+        }
+
+
+class VbbDiagnosticSensor(CoordinatorEntity[VbbStationCoordinator], SensorEntity):
+    """Common behaviour of the diagnostic sensors of a station.
+
+    They report on the coordinator rather than on the board, so they carry
+    none of the board attributes of the departure sensors.
+    """
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: VbbStationCoordinator) -> None:
+        super().__init__(coordinator)
+        self._station_id = coordinator.station_id
+        self._station_name = coordinator.station_name
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        return DeviceInfo(
+            identifiers={(DOMAIN, self._station_id)},
+            name=self._station_name,
+            manufacturer="VBB",
+        )
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._handle_metrics()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._handle_metrics()
+        super()._handle_coordinator_update()
+
+    @abstractmethod
+    @callback
+    def _handle_metrics(self) -> None:
+        """Update the entity state from the coordinator."""
+
+
+class VbbPollIntervalSensor(VbbDiagnosticSensor):
+    """Diagnostic sensor exposing the adaptive poll interval of a station."""
+
+    _attr_native_unit_of_measurement = UnitOfTime.SECONDS
+    _attr_icon = "mdi:timer-sync-outline"
+
+    def __init__(self, coordinator: VbbStationCoordinator) -> None:
+        super().__init__(coordinator)
+        self._attr_name = f"{coordinator.station_name} poll interval"
+        self._attr_unique_id = f"vbb_{self._station_id}_poll_interval"
+
+    @property
+    def available(self) -> bool:
+        # The interval is chosen whether or not the last fetch succeeded.
+        return True
+
+    @callback
+    def _handle_metrics(self) -> None:
+        """Report the interval chosen after the last fetch."""
+        interval = self.coordinator.poll_interval
+        self._attr_native_value = interval.total_seconds() if interval else None
+
+
+class VbbTimingSensor(VbbDiagnosticSensor):
+    """Diagnostic sensor exposing one timing of the station."""
+
+    _attr_entity_registry_enabled_default = False
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 2
+    _attr_icon = "mdi:timer-outline"
+    _unrecorded_attributes = frozenset({"count", "mean_ms", "p95_ms", "max_ms"})
+
+    def __init__(
+        self, coordinator: VbbStationCoordinator, metric: str, label: str
+    ) -> None:
+        super().__init__(coordinator)
+        self._metric = metric
+        self._attr_name = f"{coordinator.station_name} {label}"
+        self._attr_unique_id = f"vbb_{self._station_id}_{metric}_time"
+
+    @property
+    def available(self) -> bool:
+        return self._metric in self.coordinator.metrics.histograms
+
+    @callback
+    def _handle_metrics(self) -> None:
+        """Report the last duration and a summary of all of them."""
+        histogram = self.coordinator.metrics.histograms.get(self._metric)
+        if histogram is None:
+            return
+        summary = histogram.as_dict()
+        self._attr_native_value = summary["last_ms"]
+        self._attr_extra_state_attributes = {
+            key: summary[key] for key in ("count", "mean_ms", "p95_ms", "max_ms")
         }
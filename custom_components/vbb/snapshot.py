@@ -0,0 +1,304 @@
+"""Normalized, pre-indexed view of a departures board."""
+
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+import sys
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+from .api import extract_departures
+from .discovery import destination_key
+
+
+def get_time(entry: dict[str, Any]) -> str | None:
+    """Return the best available departure time field."""
+    return (
+        entry.get("plannedWhen")
+        or entry.get("when")
+        or entry.get("plannedDeparture")
+        or entry.get("departure")
+    )
+
+
+def get_delay(entry: dict[str, Any]) -> int | None:
+    """Return delay in minutes if available."""
+    delay = (
+        entry.get("delay")
+        or entry.get("departureDelay")
+        or entry.get("delayInSeconds")
+    )
+    if delay is None:
+        return None
+    if isinstance(delay, int) and abs(delay) > 10:
+        return delay // 60
+    return delay
+
+
+def parse_departure_time(value: str | None) -> datetime | None:
+    """Parse a departure timestamp and normalize it to UTC."""
+
+    if not value:
+        return None
+
+    parsed = dt_util.parse_datetime(value)
+    if parsed is None:
+        return None
+
+    try:
+        return dt_util.as_utc(parsed)
+    except (TypeError, ValueError):
+        return None
+
+
+def _intern(value: Any) -> Any:
+    """Share one copy of names repeated across departures and fetches."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(frozen=True, slots=True)
+class Departure:
+    """One departure with every field the integration reads resolved once.
+
+    Names shared by many departures (lines, products, stops, destinations)
+    are interned so each board keeps a single copy of them.
+    """
+
+    when: datetime | None
+    time: str | None = None
+    delay: int | None = None
+    line: str | None = None
+    line_id: str | None = None
+    product: str | None = None
+    mode: str | None = None
+    operator: str | None = None
+    destination: str | None = None
+    direction: str | None = None
+    platform: str | None = None
+    trip_id: str | None = None
+    prognosis_type: str | None = None
+    origin: str | None = None
+    stop_name: str | None = None
+    stop_dhid: str | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+    position: tuple[float, float] | None = None
+
+    @classmethod
+    def from_api(cls, entry: dict[str, Any]) -> Departure:
+        """Normalize one departure of the transport.rest API."""
+        line_info = entry.get("line") or {}
+        stop = entry.get("stop") or {}
+        location = stop.get("location") or {}
+        position = entry.get("currentTripPosition") or {}
+        time = get_time(entry)
+        return cls(
+            when=parse_departure_time(time),
+            time=time,
+            delay=get_delay(entry),
+            line=_intern(line_info.get("name")),
+            line_id=_intern(line_info.get("id")),
+            product=_intern(line_info.get("product")),
+            mode=_intern(line_info.get("mode")),
+            operator=_intern((line_info.get("operator") or {}).get("name")),
+            destination=_intern((entry.get("destination") or {}).get("name")),
+            direction=_intern(entry.get("direction")),
+            platform=entry.get("platform"),
+            trip_id=entry.get("tripId"),
+            prognosis_type=_intern(entry.get("prognosisType")),
+            origin=_intern((entry.get("origin") or {}).get("name")),
+            stop_name=_intern(stop.get("name")),
+            stop_dhid=_intern(stop.get("stationDHID")),
+            latitude=location.get("latitude"),
+            longitude=location.get("longitude"),
+            position=(
+                (position["latitude"], position["longitude"])
+                if "latitude" in position and "longitude" in position
+                else None
+            ),
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Departure:
+        """Restore a departure saved with ``as_dict``."""
+        values = {name: _intern(data.get(name)) for name in _STORED_FIELDS}
+        if values["position"] is not None:
+            values["position"] = tuple(values["position"])
+        return cls(when=parse_departure_time(values["time"]), **values)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the departure as JSON serializable dictionary."""
+        return {name: getattr(self, name) for name in _STORED_FIELDS}
+
+    @property
+    def destination_name(self) -> str | None:
+        """Return the destination name, falling back to the direction."""
+        return self.destination or self.direction
+
+    @property
+    def current_trip_position(self) -> dict[str, Any] | None:
+        """Return the vehicle position in the shape of the API."""
+        if self.position is None:
+            return None
+        return {
+            "type": "location",
+            "latitude": self.position[0],
+            "longitude": self.position[1],
+        }
+
+
+_STORED_FIELDS = tuple(f.name for f in fields(Departure) if f.name != "when")
+
+
+def project_departures(data: Any) -> tuple[Departure, ...]:
+    """Keep only the departure records of a decoded departures response."""
+    return tuple(Departure.from_api(dep) for dep in extract_departures(data))
+
+
+@dataclass(frozen=True, slots=True)
+class _Index:
+    """Departures of one key, sorted by departure time."""
+
+    times: tuple[datetime, ...]
+    rows: tuple[Departure, ...]
+
+    def upcoming(self, now: datetime) -> tuple[Departure, ...]:
+        """Return the departures after ``now``."""
+        return self.rows[bisect_right(self.times, now) :]
+
+
+_EMPTY = _Index((), ())
+
+
+def _build_index(rows: Iterable[Departure]) -> _Index:
+    rows = tuple(rows)
+    return _Index(tuple(row.when for row in rows), rows)
+
+
+@dataclass(frozen=True, slots=True)
+class DepartureSnapshot:
+    """Departures of one API response, parsed and sorted exactly once.
+
+    ``departures`` keeps every departure in API order. Departures with a
+    parseable time are additionally sorted and indexed by (line,
+    destination), (line, direction) and product so that every entity looks
+    up its rows with a dictionary hit and a slice. Destinations and
+    directions are indexed by their ``destination_key``.
+    """
+
+    departures: tuple[Departure, ...] = ()
+    _all: _Index = _EMPTY
+    _by_destination: dict[tuple[str, str], _Index] = field(default_factory=dict)
+    _by_direction: dict[tuple[str, str], _Index] = field(default_factory=dict)
+    _by_product: dict[str | None, _Index] = field(default_factory=dict)
+    fetched_at: datetime | None = None
+    source_base: str | None = None
+
+    @classmethod
+    def from_departures(
+        cls,
+        departures: Iterable[dict[str, Any]],
+        fetched_at: datetime | None = None,
+        source_base: str | None = None,
+    ) -> DepartureSnapshot:
+        """Build a snapshot from the departures list of the API."""
+        return cls.from_records(
+            (Departure.from_api(dep) for dep in departures), fetched_at, source_base
+        )
+
+    @classmethod
+    def from_records(
+        cls,
+        departures: Iterable[Departure],
+        fetched_at: datetime | None = None,
+        source_base: str | None = None,
+    ) -> DepartureSnapshot:
+        """Build a snapshot from normalized departures."""
+        departures = tuple(departures)
+
+        # The sort is stable, so departures with equal times keep their API
+        # order just like the previous per-entity sort of a filtered copy did.
+        timed = sorted(
+            (dep for dep in departures if dep.when is not None),
+            key=lambda dep: dep.when,
+        )
+
+        by_destination: dict[tuple[str, str], list[Departure]] = {}
+        by_direction: dict[tuple[str, str], list[Departure]] = {}
+        by_product: dict[str | None, list[Departure]] = {}
+        for dep in timed:
+            by_destination.setdefault(
+                (dep.line, destination_key(dep.destination_name or "")), []
+            ).append(dep)
+            by_direction.setdefault(
+                (dep.line, destination_key(dep.direction or "")), []
+            ).append(dep)
+            by_product.setdefault(dep.product, []).append(dep)
+
+        return cls(
+            departures,
+            _build_index(timed),
+            {key: _build_index(rows) for key, rows in by_destination.items()},
+            {key: _build_index(rows) for key, rows in by_direction.items()},
+            {key: _build_index(rows) for key, rows in by_product.items()},
+            fetched_at,
+            source_base,
+        )
+
+    def for_destination(
+        self, line: str, destination: str, now: datetime
+    ) -> tuple[Departure, ...]:
+        """Return upcoming departures of a line towards a destination.
+
+        Spelling variants of the destination count as the same destination.
+        """
+        return self._by_destination.get(
+            (line, destination_key(destination)), _EMPTY
+        ).upcoming(now)
+
+    def for_direction(
+        self, line: str, direction: str, now: datetime
+    ) -> tuple[Departure, ...]:
+        """Return upcoming departures of a line in a direction."""
+        return self._by_direction.get(
+            (line, destination_key(direction)), _EMPTY
+        ).upcoming(now)
+
+    def for_product(self, product: str | None, now: datetime) -> tuple[Departure, ...]:
+        """Return upcoming departures of a single product."""
+        return self._by_product.get(product, _EMPTY).upcoming(now)
+
+    def depth(
+        self, rows: Sequence[Departure], count: int, now: datetime
+    ) -> int | None:
+        """Return how many upcoming rows of the board cover ``count`` of ``rows``.
+
+        ``rows`` must be upcoming rows of this snapshot. Returns ``None`` if
+        it holds fewer than ``count`` rows.
+        """
+        if count <= 0:
+            return 0
+        if len(rows) < count:
+            return None
+        times = self._all.times
+        return bisect_right(times, rows[count - 1].when) - bisect_right(times, now)
+
+    def for_products(
+        self, products: Iterable[str], now: datetime
+    ) -> list[Departure]:
+        """Return upcoming departures of the given products.
+
+        Departures without a product are always included.
+        """
+        products = set(products)
+        if products.issuperset(key for key in self._by_product if key):
+            return list(self._all.upcoming(now))
+        return [
+            dep
+            for dep in self._all.upcoming(now)
+            if not dep.product or dep.product in products
+        ]
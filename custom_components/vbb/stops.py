@@ -0,0 +1,325 @@
+"""Station search from a cache of API results or a local GTFS stop index."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+import asyncio
+import csv
+import io
+import math
+from pathlib import Path
+import re
+import sys
+import time
+from typing import Any, Hashable
+import zipfile
+
+from aiohttp import ClientError, ClientSession
+
+from .api import async_request_json
+from .const import (
+    LOCATION_CACHE_SIZE,
+    LOCATION_CACHE_TTL,
+    NEARBY_PATH,
+    PRIORITY_SEARCH,
+    SEARCH_PATH,
+)
+from .discovery import destination_key, normalize_name
+
+# Size of a cell of the spatial grid in degrees, about 1.1 km north-south.
+GRID_DEGREES = 0.01
+NEARBY_RADIUS = 1000  # metres
+EARTH_RADIUS = 6371000  # metres
+# Share of the query trigrams a name must contain to match a misspelling.
+TRIGRAM_THRESHOLD = 0.5
+
+# "de:11000:900003201" (current VBB feeds) or "900003201".
+_STATION_ID = re.compile(r"^(?:[a-z]{2}:\d+:)?(9\d{8})$")
+
+
+class LocationCache:
+    """Results of location searches, evicting the least recently used."""
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, list[dict[str, Any]]]] = (
+            OrderedDict()
+        )
+
+    def get(self, key: Hashable) -> list[dict[str, Any]] | None:
+        """Return the cached result, or ``None`` if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: list[dict[str, Any]]) -> None:
+        """Store a result, evicting the oldest beyond ``size``."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the cache statistics."""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def station_id(stop_id: str) -> str | None:
+    """Return the nine digit station ID of a GTFS stop ID, if it has one."""
+    match = _STATION_ID.match(stop_id)
+    return match[1] if match else None
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+def _distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return the distance in metres, exact enough within a city."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS * math.hypot(x, y)
+
+
+class StopIndex:
+    """Stations of a GTFS ``stops.txt``, searchable by name and position.
+
+    Names are matched by the prefixes of their words through a sorted word
+    list, and optionally by trigrams when no word matches, so small
+    misspellings still find the station. Nearby search scans the cells of a grid around the
+    position. Results have the shape of the transport.rest locations.
+    """
+
+    def __init__(self, stops: list[tuple[str, str, float, float]]) -> None:
+        self.ids = tuple(stop[0] for stop in stops)
+        self.names = tuple(stop[1] for stop in stops)
+        self.latitudes = array("d", (stop[2] for stop in stops))
+        self.longitudes = array("d", (stop[3] for stop in stops))
+        words: list[tuple[str, int]] = []
+        trigrams: dict[str, list[int]] = defaultdict(list)
+        grid: dict[tuple[int, int], list[int]] = defaultdict(list)
+        for index, (_, name, latitude, longitude) in enumerate(stops):
+            key = normalize_name(name)
+            # Words like "Bahnhof" repeat across many names.
+            words.extend((sys.intern(word), index) for word in set(key.split()))
+            for trigram in _trigrams(key):
+                trigrams[trigram].append(index)
+            grid[self._cell(latitude, longitude)].append(index)
+        words.sort()
+        self._words = tuple(word for word, _ in words)
+        # Compact arrays of station numbers keep the index at a few MiB.
+        self._word_stops = array("I", (index for _, index in words))
+        self._trigrams = {
+            trigram: array("I", rows) for trigram, rows in trigrams.items()
+        }
+        self._grid = {cell: array("I", rows) for cell, rows in grid.items()}
+
+    @classmethod
+    def load(cls, path: Path) -> StopIndex:
+        """Read the stations of a ``stops.txt`` or of a GTFS zip file."""
+        if path.suffix == ".zip":
+            with zipfile.ZipFile(path) as feed, feed.open("stops.txt") as raw:
+                return cls.parse(io.TextIOWrapper(raw, encoding="utf-8-sig"))
+        with path.open(encoding="utf-8-sig", newline="") as file:
+            return cls.parse(file)
+
+    @classmethod
+    def parse(cls, lines: Any) -> StopIndex:
+        """Build the index from the lines of a ``stops.txt``.
+
+        Platforms and entrances are skipped. Stop IDs are turned into the
+        nine digit station IDs the API uses.
+        """
+        stops: list[tuple[str, str, float, float]] = []
+        seen: set[str] = set()
+        for row in csv.DictReader(lines):
+            if row.get("location_type", "") not in ("", "0", "1") or row.get(
+                "parent_station"
+            ):
+                continue
+            sid = station_id(row.get("stop_id", "").strip())
+            if sid is None or sid in seen:
+                continue
+            try:
+                latitude = float(row["stop_lat"])
+                longitude = float(row["stop_lon"])
+            except (KeyError, ValueError):
+                continue
+            seen.add(sid)
+            stops.append((sid, row.get("stop_name", "").strip(), latitude, longitude))
+        return cls(stops)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _cell(latitude: float, longitude: float) -> tuple[int, int]:
+        return (
+            math.floor(latitude / GRID_DEGREES),
+            math.floor(longitude / GRID_DEGREES),
+        )
+
+    def _location(self, index: int, **extra: Any) -> dict[str, Any]:
+        return {
+            "type": "stop",
+            "id": self.ids[index],
+            "name": self.names[index],
+            "location": {
+                "type": "location",
+                "latitude": self.latitudes[index],
+                "longitude": self.longitudes[index],
+            },
+            **extra,
+        }
+
+    def _with_prefix(self, prefix: str) -> set[int]:
+        """Return the stations with a word starting with ``prefix``."""
+        found: set[int] = set()
+        position = bisect_left(self._words, prefix)
+        while position < len(self._words) and self._words[position].startswith(prefix):
+            found.add(self._word_stops[position])
+            position += 1
+        return found
+
+    def search(
+        self, query: str, limit: int = 10, *, fuzzy: bool = True
+    ) -> list[dict[str, Any]]:
+        """Return the stations whose name matches ``query``, best first.
+
+        Without ``fuzzy`` only names with words starting like those of the
+        query are returned, not the names sharing most of its trigrams.
+        """
+        key = destination_key(query)
+        words = key.split()
+        if not words:
+            return []
+        matches: set[int] | None = None
+        for word in words:
+            found = self._with_prefix(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        if matches:
+            # Shorter names are the closer matches: "Alexanderplatz" before
+            # "Alexanderplatz/Memhardstr.".
+            ranked = sorted(matches, key=lambda index: (len(self.names[index]), index))
+        elif not fuzzy:
+            return []
+        else:
+            query_trigrams = _trigrams(key)
+            counts: dict[int, int] = defaultdict(int)
+            for trigram in query_trigrams:
+                for index in self._trigrams.get(trigram, ()):
+                    counts[index] += 1
+            needed = len(query_trigrams) * TRIGRAM_THRESHOLD
+            ranked = sorted(
+                (index for index, count in counts.items() if count >= needed),
+                key=lambda index: (-counts[index], len(self.names[index]), index),
+            )
+        return [self._location(index) for index in ranked[:limit]]
+
+    def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        limit: int = 10,
+        radius: float = NEARBY_RADIUS,
+    ) -> list[dict[str, Any]]:
+        """Return the stations within ``radius`` metres, nearest first."""
+        lat_cells = math.ceil(radius / (EARTH_RADIUS * math.radians(GRID_DEGREES)))
+        lon_cells = math.ceil(
+            lat_cells / max(math.cos(math.radians(latitude)), 0.01)
+        )
+        row, column = self._cell(latitude, longitude)
+        found: list[tuple[float, int]] = []
+        for cell_row in range(row - lat_cells, row + lat_cells + 1):
+            for cell_column in range(column - lon_cells, column + lon_cells + 1):
+                for index in self._grid.get((cell_row, cell_column), ()):
+                    distance = _distance(
+                        latitude,
+                        longitude,
+                        self.latitudes[index],
+                        self.longitudes[index],
+                    )
+                    if distance <= radius:
+                        found.append((distance, index))
+        found.sort()
+        return [
+            self._location(index, distance=round(distance))
+            for distance, index in found[:limit]
+        ]
+
+
+_CACHE = LocationCache(LOCATION_CACHE_SIZE, LOCATION_CACHE_TTL)
+_INDEX: StopIndex | None = None
+
+
+def configure_stop_index(index: StopIndex | None) -> None:
+    """Answer station searches from a local stop index instead of the API."""
+    global _INDEX
+    _INDEX = index
+
+
+def get_search_stats() -> dict[str, Any]:
+    """Return how station searches were served."""
+    return {
+        "cache": _CACHE.as_dict(),
+        "stop_index": len(_INDEX) if _INDEX is not None else None,
+    }
+
+
+async def async_search_stations(
+    session: ClientSession, query: str
+) -> list[dict[str, Any]]:
+    """Find stations by name in the stop index, the cache or the API."""
+    # Stations missing from an outdated index are still found online. The
+    # trigrams of a query without a word match nearly always hit some names,
+    # so they would hide those stations and are only used offline.
+    if _INDEX is not None and (found := _INDEX.search(query, fuzzy=False)):
+        return found
+    key = ("name", destination_key(query))
+    if (cached := _CACHE.get(key)) is not None:
+        return cached
+    try:
+        data = await async_request_json(
+            session, SEARCH_PATH, {"query": query}, priority=PRIORITY_SEARCH
+        )
+    except (asyncio.TimeoutError, ClientError, ValueError):
+        if _INDEX is not None and (similar := _INDEX.search(query)):
+            return similar
+        raise
+    if not data and _INDEX is not None:
+        return _INDEX.search(query)
+    _CACHE.put(key, data)
+    return data
+
+
+async def async_nearby_stations(
+    session: ClientSession, latitude: float, longitude: float
+) -> list[dict[str, Any]]:
+    """Find stations near a position in the stop index, the cache or the API."""
+    if _INDEX is not None and (found := _INDEX.nearby(latitude, longitude)):
+        return found
+    # Positions within about 100 m share their result.
+    key = ("nearby", round(latitude, 3), round(longitude, 3))
+    if (cached := _CACHE.get(key)) is not None:
+        return cached
+    data = await async_request_json(
+        session,
+        NEARBY_PATH,
+        {"latitude": latitude, "longitude": longitude},
+        priority=PRIORITY_SEARCH,
+    )
+    _CACHE.put(key, data)
+    return data
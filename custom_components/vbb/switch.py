@@ -9,14 +9,16 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity import EntityCategory
 
-from .const import CONF_PRODUCTS, PRODUCT_OPTIONS
+from .const import CONF_PRODUCTS, DOMAIN, PRODUCT_OPTIONS
+from .coordinator import VbbStationCoordinator
 
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigEntry, async_add_entities
 ) -> None:
     """Set up VBB product switches from a config entry."""
+    coordinator: VbbStationCoordinator = hass.data[DOMAIN][entry.entry_id]
     switches = [
-        VbbProductSwitch(entry, product) for product in PRODUCT_OPTIONS
+        VbbProductSwitch(entry, coordinator, product) for product in PRODUCT_OPTIONS
     ]
     async_add_entities(switches)
 
@@ -26,39 +28,30 @@ class VbbProductSwitch(SwitchEntity):
 
     _attr_entity_category = EntityCategory.CONFIG
 
-    def __init__(self, entry: ConfigEntry, product: str) -> None:
+    def __init__(
+        self, entry: ConfigEntry, coordinator: VbbStationCoordinator, product: str
+    ) -> None:
         self._entry = entry
+        self._coordinator = coordinator
         self._product = product
         self._attr_name = product.title()
         self._attr_unique_id = f"{entry.entry_id}_{product}_enabled"
 
     @property
     def is_on(self) -> bool:
-        products: list[str] = self._entry.options.get(
-            CONF_PRODUCTS, self._entry.data.get(CONF_PRODUCTS, PRODUCT_OPTIONS)
-        )
-        return self._product in products
+        return self._product in self._coordinator.products
 
     async def async_turn_on(self, **kwargs: Any) -> None:
-        products = set(
-            self._entry.options.get(
-                CONF_PRODUCTS, self._entry.data.get(CONF_PRODUCTS, PRODUCT_OPTIONS)
-            )
-        )
-        products.add(self._product)
-        await self._update_products(list(products))
+        self._update_products(self._coordinator.products | {self._product})
 
     async def async_turn_off(self, **kwargs: Any) -> None:
-        products = set(
-            self._entry.options.get(
-                CONF_PRODUCTS, self._entry.data.get(CONF_PRODUCTS, PRODUCT_OPTIONS)
-            )
-        )
-        products.discard(self._product)
-        await self._update_products(list(products))
+        self._update_products(self._coordinator.products - {self._product})
 
-    async def _update_products(self, products: list[str]) -> None:
+    def _update_products(self, products: set[str]) -> None:
+        """Apply the products to the running station and store them."""
+        self._coordinator.async_set_products(products)
         options = dict(self._entry.options)
-        options[CONF_PRODUCTS] = products
+        # Keep the order of PRODUCT_OPTIONS, like the config flow does.
+        options[CONF_PRODUCTS] = [p for p in PRODUCT_OPTIONS if p in products]
         self.hass.config_entries.async_update_entry(self._entry, options=options)
-        await self.hass.config_entries.async_reload(self._entry.entry_id)
+        self.async_write_ha_state()
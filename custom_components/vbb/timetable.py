@@ -0,0 +1,587 @@
+"""Scheduled departures from a preprocessed GTFS timetable."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Container, Iterator
+from contextlib import contextmanager
+import csv
+from datetime import UTC, date, datetime, time, timedelta
+import io
+import json
+import math
+import mmap
+import os
+from pathlib import Path
+import sys
+import tempfile
+from typing import IO, Any
+import zipfile
+from zoneinfo import ZoneInfo
+
+from .snapshot import Departure
+from .stops import station_id
+
+TIMETABLE_VERSION = 1
+# ``prognosis_type`` and ``source_base`` of departures from the timetable.
+SCHEDULED = "scheduled"
+TIMETABLE_SOURCE = "gtfs"
+DEFAULT_TIMEZONE = "Europe/Berlin"
+FEED_FILES = (
+    "agency.txt",
+    "stops.txt",
+    "routes.txt",
+    "trips.txt",
+    "stop_times.txt",
+    "calendar.txt",
+    "calendar_dates.txt",
+)
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+# Active services of this many days are kept, enough for a board that
+# spans midnight.
+ACTIVE_DAYS_CACHED = 4
+NO_NAME = 0xFFFFFFFF
+# Departure events are spilled to this many files by station while
+# ``stop_times.txt`` is read, buffering this many events per file, so a
+# build holds only one file's share of them at a time.
+SPILL_FILES = 64
+SPILL_BUFFER = 1 << 12
+
+# GTFS route types of the products the API knows: the basic types and the
+# first type of each range of the extended types.
+_PRODUCTS = {
+    0: "tram",
+    1: "subway",
+    2: "regional",
+    3: "bus",
+    4: "ferry",
+    5: "tram",
+    11: "bus",
+    101: "express",
+    102: "express",
+    103: "express",
+    109: "suburban",
+}
+_RANGE_STARTS = (100, 200, 300, 400, 700, 900, 1000, 1100, 1200, 1300)
+_RANGE_PRODUCTS = (
+    "regional",
+    "bus",
+    "suburban",
+    "subway",
+    "bus",
+    "tram",
+    "ferry",
+    None,
+    "ferry",
+    None,
+)
+
+
+def route_product(route_type: int) -> str | None:
+    """Return the API product of a GTFS route type."""
+    if route_type in _PRODUCTS:
+        return _PRODUCTS[route_type]
+    position = bisect_right(_RANGE_STARTS, route_type) - 1
+    return _RANGE_PRODUCTS[position] if position >= 0 else None
+
+
+def _seconds(value: str) -> int:
+    """Return the seconds of a GTFS time, which may be past 24:00:00."""
+    hours, minutes, seconds = value.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def _date_number(day: date) -> int:
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+class _Feed:
+    """The files of a GTFS zip file or directory."""
+
+    def __init__(self, path: Path) -> None:
+        # A path to ``stops.txt`` names the directory of the feed.
+        self.path = path if path.suffix == ".zip" or path.is_dir() else path.parent
+        self._names: set[str] | None = None
+
+    def has(self, name: str) -> bool:
+        if self.path.suffix == ".zip":
+            if self._names is None:
+                with zipfile.ZipFile(self.path) as feed:
+                    self._names = set(feed.namelist())
+            return name in self._names
+        return (self.path / name).is_file()
+
+    def signature(self) -> list[list[Any]]:
+        """Return what changes when the feed is replaced."""
+        paths = (
+            [self.path]
+            if self.path.suffix == ".zip"
+            else [self.path / name for name in FEED_FILES if self.has(name)]
+        )
+        return [
+            [path.name, stat.st_size, stat.st_mtime_ns]
+            for path in paths
+            for stat in (path.stat(),)
+        ]
+
+    @contextmanager
+    def open(self, name: str) -> Iterator[IO[str]]:
+        if self.path.suffix == ".zip":
+            with zipfile.ZipFile(self.path) as feed, feed.open(name) as raw:
+                yield io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            return
+        with (self.path / name).open(encoding="utf-8-sig", newline="") as file:
+            yield file
+
+
+class _Strings:
+    """A table of names stored once and referred to by position."""
+
+    def __init__(self) -> None:
+        self.values: list[str] = []
+        self._positions: dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        if not value:
+            return NO_NAME
+        position = self._positions.get(value)
+        if position is None:
+            position = self._positions[value] = len(self.values)
+            self.values.append(value)
+        return position
+
+
+class _Spill:
+    """Departure events of the stations, spilled to temporary files."""
+
+    def __init__(self, directory: Path) -> None:
+        self._paths = [directory / f"events-{number}" for number in range(SPILL_FILES)]
+        # Pairs of station and event.
+        self._buffers = [array("Q") for _ in range(SPILL_FILES)]
+
+    def add(self, station: int, event: int) -> None:
+        number = station % SPILL_FILES
+        buffer = self._buffers[number]
+        buffer.append(station)
+        buffer.append(event)
+        if len(buffer) >= 2 * SPILL_BUFFER:
+            with self._paths[number].open("ab") as file:
+                buffer.tofile(file)
+            del buffer[:]
+
+    def stations(self) -> Iterator[tuple[int, list[int]]]:
+        """Yield the stations with events and their events in time order."""
+        for number, path in enumerate(self._paths):
+            pairs = array("Q")
+            if path.exists():
+                pairs.frombytes(path.read_bytes())
+                path.unlink()
+            pairs.extend(self._buffers[number])
+            self._buffers[number] = array("Q")
+            keys = sorted(
+                pairs[position] << 64 | pairs[position + 1]
+                for position in range(0, len(pairs), 2)
+            )
+            del pairs
+            start = 0
+            while start < len(keys):
+                station = keys[start] >> 64
+                end = bisect_left(keys, (station + 1) << 64, start)
+                yield station, [key & 0xFFFFFFFFFFFFFFFF for key in keys[start:end]]
+                start = end
+
+
+def build_timetable(feed_path: Path, target: Path) -> None:
+    """Preprocess a GTFS feed into the timetable files at ``target``.
+
+    ``stop_times.txt``, by far the largest file, is read row by row and
+    never held in memory; its departures are spilled to temporary files by
+    station and sorted one file at a time. Its rows must be grouped by trip
+    in stop order, as feeds publish them: the last stop of each trip is its
+    destination and has no departure.
+    """
+    feed = _Feed(feed_path)
+    timezone = DEFAULT_TIMEZONE
+    agencies: dict[str, str] = {}
+    if feed.has("agency.txt"):
+        with feed.open("agency.txt") as file:
+            for row in csv.DictReader(file):
+                agencies[row.get("agency_id", "")] = row.get("agency_name", "")
+                timezone = row.get("agency_timezone") or timezone
+
+    # Platforms count for their station, under the station ID of the API.
+    stations: dict[str, int] = {}
+    station_rows: list[list[Any]] = []
+    stop_station: dict[str, int] = {}
+    with feed.open("stops.txt") as file:
+        for row in csv.DictReader(file):
+            stop = row.get("stop_id", "").strip()
+            sid = station_id(row.get("parent_station", "").strip()) or station_id(stop)
+            if sid is None:
+                continue
+            index = stations.get(sid)
+            if index is None:
+                index = stations[sid] = len(station_rows)
+                station_rows.append([sid, "", None, None])
+            own = station_id(stop) == sid
+            if own or not station_rows[index][1]:
+                try:
+                    position = [float(row["stop_lat"]), float(row["stop_lon"])]
+                except (KeyError, ValueError):
+                    position = [None, None]
+                station_rows[index][1:] = [row.get("stop_name", "").strip(), *position]
+            stop_station[stop] = index
+
+    routes: list[list[Any]] = []
+    route_index: dict[str, int] = {}
+    with feed.open("routes.txt") as file:
+        for row in csv.DictReader(file):
+            try:
+                route_type = int(row.get("route_type", ""))
+            except ValueError:
+                continue
+            route_index[row["route_id"]] = len(routes)
+            routes.append(
+                [
+                    row.get("route_short_name") or row.get("route_long_name") or None,
+                    route_product(route_type),
+                    agencies.get(row.get("agency_id", "")) or None,
+                ]
+            )
+
+    strings = _Strings()
+    services: dict[str, int] = {}
+    trips: dict[str, int] = {}
+    trip_route = array("I")
+    trip_service = array("I")
+    trip_headsign = array("I")
+    with feed.open("trips.txt") as file:
+        for row in csv.DictReader(file):
+            route = route_index.get(row.get("route_id", ""))
+            if route is None:
+                continue
+            service = services.setdefault(row.get("service_id", ""), len(services))
+            trips[row["trip_id"]] = len(trip_route)
+            trip_route.append(route)
+            trip_service.append(service)
+            trip_headsign.append(strings.add(row.get("trip_headsign", "").strip()))
+
+    calendar: list[list[Any]] = [[0, 0, 0, [], []] for _ in services]
+    if feed.has("calendar.txt"):
+        with feed.open("calendar.txt") as file:
+            for row in csv.DictReader(file):
+                if (service := services.get(row.get("service_id", ""))) is None:
+                    continue
+                weekdays = (
+                    1 << bit for bit, day in enumerate(WEEKDAYS) if row.get(day) == "1"
+                )
+                calendar[service][:3] = [
+                    sum(weekdays),
+                    int(row["start_date"]),
+                    int(row["end_date"]),
+                ]
+    if feed.has("calendar_dates.txt"):
+        with feed.open("calendar_dates.txt") as file:
+            for row in csv.DictReader(file):
+                if (service := services.get(row.get("service_id", ""))) is None:
+                    continue
+                # Type 1 adds the date, type 2 removes it.
+                kind = 3 if row.get("exception_type") == "1" else 4
+                calendar[service][kind].append(int(row["date"]))
+
+    # Departure time and trip of each event share one integer, so sorting
+    # a station's events sorts them by time.
+    trip_destination = array("I", [NO_NAME]) * len(trip_route)
+    with tempfile.TemporaryDirectory(dir=target.parent) as directory:
+        spill = _Spill(Path(directory))
+        with feed.open("stop_times.txt") as file:
+            reader = csv.reader(file)
+            columns = {name.strip(): index for index, name in enumerate(next(reader))}
+            trip_column = columns["trip_id"]
+            stop_column = columns["stop_id"]
+            departure_column = columns["departure_time"]
+            arrival_column = columns.get("arrival_time", departure_column)
+            pickup_column = columns.get("pickup_type")
+            current_id: str | None = None
+            trip: int | None = None
+            pending: int | None = None
+            last_station = NO_NAME
+            for row in reader:
+                if row[trip_column] != current_id:
+                    if trip is not None:
+                        trip_destination[trip] = last_station
+                    current_id = row[trip_column]
+                    trip = trips.get(current_id)
+                    pending = None
+                    last_station = NO_NAME
+                if trip is None:
+                    continue
+                station = stop_station.get(row[stop_column])
+                if station is None:
+                    continue
+                if pending is not None:
+                    spill.add(last_station, pending)
+                last_station = station
+                value = row[departure_column] or row[arrival_column]
+                boarding = pickup_column is None or row[pickup_column] != "1"
+                pending = (_seconds(value) << 32 | trip) if value and boarding else None
+            if trip is not None:
+                trip_destination[trip] = last_station
+
+        station_index: dict[str, list[Any]] = {}
+        offset = 0
+        part = target.with_name(f"{target.name}.part")
+        with part.open("wb") as file:
+            for index, packed in spill.stations():
+                sid, name, latitude, longitude = station_rows[index]
+                array("I", (value >> 32 for value in packed)).tofile(file)
+                array("I", (value & 0xFFFFFFFF for value in packed)).tofile(file)
+                station_index[sid] = [offset, len(packed), name, latitude, longitude]
+                offset += 2 * len(packed)
+            for column in (trip_route, trip_service, trip_headsign, trip_destination):
+                column.tofile(file)
+
+    header = {
+        "version": TIMETABLE_VERSION,
+        "byteorder": sys.byteorder,
+        "signature": feed.signature(),
+        "timezone": timezone,
+        "stations": station_index,
+        "station_names": [row[1] for row in station_rows],
+        "trips": [offset, len(trip_route)],
+        "routes": routes,
+        "calendar": calendar,
+        "strings": strings.values,
+    }
+    header_path = _header_path(target)
+    header_part = header_path.with_name(f"{header_path.name}.part")
+    header_part.write_text(json.dumps(header, separators=(",", ":")), encoding="utf-8")
+    # The header goes last: until it is replaced, the old header names the
+    # old feed, so an interrupted build is redone instead of read.
+    os.replace(part, target)
+    os.replace(header_part, header_path)
+
+
+def _header_path(target: Path) -> Path:
+    return target.with_name(f"{target.name}.json")
+
+
+class Timetable:
+    """Scheduled departures of every station of a GTFS feed.
+
+    The departures of a station are a sorted array of times next to an
+    array of trips, read from a memory-mapped file, so only the stations
+    that are asked for are ever loaded. A query is a binary search for the
+    current time on each service day the board touches.
+    """
+
+    def __init__(self, header: dict[str, Any], buffer: mmap.mmap) -> None:
+        self._buffer = buffer
+        self._words = memoryview(buffer).cast("I")
+        self._tz = ZoneInfo(header["timezone"])
+        self._stations = {
+            sid: (offset, count, sys.intern(name), latitude, longitude)
+            for sid, (offset, count, name, latitude, longitude) in header[
+                "stations"
+            ].items()
+        }
+        self._station_names = [sys.intern(name) for name in header["station_names"]]
+        self._strings = [sys.intern(value) for value in header["strings"]]
+        self._routes = [
+            tuple(sys.intern(value) if value else None for value in route)
+            for route in header["routes"]
+        ]
+        self._calendar = [
+            (weekdays, start, end, frozenset(added), frozenset(removed))
+            for weekdays, start, end, added, removed in header["calendar"]
+        ]
+        offset, count = header["trips"]
+        (
+            self._trip_route,
+            self._trip_service,
+            self._trip_headsign,
+            self._trip_destination,
+        ) = (
+            self._words[offset + column * count : offset + (column + 1) * count]
+            for column in range(4)
+        )
+        self._active_days: dict[date, bytearray] = {}
+
+    @classmethod
+    def open(cls, target: Path) -> Timetable:
+        """Map a timetable written by ``build_timetable``."""
+        header = json.loads(_header_path(target).read_text(encoding="utf-8"))
+        with target.open("rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(header, buffer)
+
+    @staticmethod
+    def is_current(target: Path, feed_path: Path) -> bool:
+        """Return whether the timetable at ``target`` was built from the feed."""
+        try:
+            header = json.loads(_header_path(target).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        return (
+            target.is_file()
+            and header.get("version") == TIMETABLE_VERSION
+            and header.get("byteorder") == sys.byteorder
+            and header.get("signature") == _Feed(feed_path).signature()
+        )
+
+    def __len__(self) -> int:
+        return len(self._stations)
+
+    def __contains__(self, station: str) -> bool:
+        return station in self._stations
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the size of the timetable for diagnostics."""
+        return {
+            "stations": len(self._stations),
+            "trips": len(self._trip_route),
+            "size": len(self._buffer),
+        }
+
+    def _day_start(self, day: date) -> datetime:
+        """Return when GTFS times of ``day`` count from: noon minus 12 hours."""
+        noon = datetime.combine(day, time(12), tzinfo=self._tz)
+        return noon.astimezone(UTC) - timedelta(hours=12)
+
+    def _active(self, day: date) -> bytearray:
+        """Return which services run on ``day``."""
+        active = self._active_days.get(day)
+        if active is not None:
+            return active
+        number = _date_number(day)
+        weekday = 1 << day.weekday()
+        active = bytearray(
+            number in added
+            or (weekdays & weekday and start <= number <= end and number not in removed)
+            for weekdays, start, end, added, removed in self._calendar
+        )
+        if len(self._active_days) >= ACTIVE_DAYS_CACHED:
+            del self._active_days[next(iter(self._active_days))]
+        self._active_days[day] = active
+        return active
+
+    def departures(
+        self,
+        station: str,
+        now: datetime,
+        duration: int,
+        results: int,
+        products: Container[str | None],
+    ) -> list[Departure]:
+        """Return up to ``results`` departures within ``duration`` minutes."""
+        entry = self._stations.get(station)
+        if entry is None:
+            return []
+        offset, count, name, latitude, longitude = entry
+        times = self._words[offset : offset + count]
+        trips = self._words[offset + count : offset + 2 * count]
+        today = now.astimezone(self._tz).date()
+        found: list[tuple[datetime, Departure]] = []
+        # Trips of yesterday's services may run past midnight, and a board
+        # late in the evening reaches into tomorrow.
+        for day in (today - timedelta(days=1), today, today + timedelta(days=1)):
+            day_start = self._day_start(day)
+            start = (now - day_start).total_seconds()
+            end = start + duration * 60
+            if end < 0:
+                continue
+            active = self._active(day)
+            taken = 0
+            position = bisect_left(times, max(0, math.ceil(start)))
+            while position < count and times[position] <= end and taken < results:
+                trip = trips[position]
+                line, product, operator = self._routes[self._trip_route[trip]]
+                if active[self._trip_service[trip]] and product in products:
+                    when = day_start + timedelta(seconds=times[position])
+                    departure = self._departure(
+                        trip, when, line, product, operator, name, latitude, longitude
+                    )
+                    found.append((when, departure))
+                    taken += 1
+                position += 1
+        found.sort(key=lambda item: item[0])
+        return [departure for _, departure in found[:results]]
+
+    def _departure(
+        self,
+        trip: int,
+        when: datetime,
+        line: str | None,
+        product: str | None,
+        operator: str | None,
+        stop_name: str,
+        latitude: float | None,
+        longitude: float | None,
+    ) -> Departure:
+        headsign = self._trip_headsign[trip]
+        destination = self._trip_destination[trip]
+        return Departure(
+            when=when,
+            time=when.astimezone(self._tz).isoformat(),
+            line=line,
+            product=product,
+            operator=operator,
+            destination=(
+                self._station_names[destination] if destination != NO_NAME else None
+            ),
+            direction=self._strings[headsign] if headsign != NO_NAME else None,
+            prognosis_type=SCHEDULED,
+            stop_name=stop_name,
+            latitude=latitude,
+            longitude=longitude,
+        )
+
+
+def load_timetable(feed_path: Path, target: Path) -> Timetable | None:
+    """Open the timetable of a feed, building it first if the feed changed.
+
+    Returns ``None`` for a feed without stop times, such as a lone
+    ``stops.txt``.
+    """
+    feed = _Feed(feed_path)
+    if not (feed.has("stop_times.txt") and feed.has("trips.txt")):
+        return None
+    if not Timetable.is_current(target, feed_path):
+        build_timetable(feed_path, target)
+    return Timetable.open(target)
+
+
+_TIMETABLE: Timetable | None = None
+
+
+def configure_timetable(timetable: Timetable | None) -> None:
+    """Fall back to a GTFS timetable when the API cannot be reached."""
+    global _TIMETABLE
+    _TIMETABLE = timetable
+
+
+def get_timetable_stats() -> dict[str, Any] | None:
+    """Return the size of the configured timetable."""
+    return _TIMETABLE.as_dict() if _TIMETABLE is not None else None
+
+
+def scheduled_departures(
+    station: str,
+    now: datetime,
+    duration: int,
+    results: int,
+    products: Container[str | None],
+) -> list[Departure] | None:
+    """Return the scheduled departures of a station, if the timetable has it."""
+    if _TIMETABLE is None or station not in _TIMETABLE:
+        return None
+    return _TIMETABLE.departures(station, now, duration, results, products)
@@ -0,0 +1,179 @@
+"""Live vehicle positions of the departures sensors follow."""
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+import itertools
+from typing import Any
+from urllib.parse import quote
+
+from aiohttp import ClientSession
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .api import async_request
+from .const import (
+    PRIORITY_BACKGROUND,
+    TRIP_PATH,
+    TRIP_POLL_INTERVAL,
+    TRIP_QUERY_OPTIONS,
+)
+from .metrics import Metrics
+
+Position = tuple[float, float]
+
+
+def project_trip_position(data: Any) -> Position | None:
+    """Keep only the vehicle position of a decoded trip response."""
+    trip = data.get("trip", data) if isinstance(data, dict) else None
+    location = (trip or {}).get("currentLocation") or {}
+    if "latitude" in location and "longitude" in location:
+        return (location["latitude"], location["longitude"])
+    return None
+
+
+class TripTracker:
+    """Poll the positions of the vehicles followed by sensors.
+
+    A trip followed by several sensors, also of different stations, is
+    polled once. At most ``max_trips`` trips are polled; further trips
+    wait in the order they were followed until a polled trip is released.
+    Only the sensors of a trip whose position changed are updated.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        session: ClientSession,
+        max_trips: int,
+        interval: timedelta = timedelta(seconds=TRIP_POLL_INTERVAL),
+    ) -> None:
+        self.hass = hass
+        self.session = session
+        self.max_trips = max_trips
+        self.interval = interval
+        self.metrics = Metrics()
+        self._listeners: dict[str, list[CALLBACK_TYPE]] = {}
+        self._positions: dict[str, Position] = {}
+        self._unsub_timer: CALLBACK_TYPE | None = None
+
+    def _polled(self) -> list[str]:
+        """Return the trips within the budget, longest followed first."""
+        return list(itertools.islice(self._listeners, self.max_trips))
+
+    def position(self, trip_id: str) -> Position | None:
+        """Return the last polled position of a trip."""
+        return self._positions.get(trip_id)
+
+    @callback
+    def async_follow(self, trip_id: str, update: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """Follow a trip; ``update`` runs when its position changes.
+
+        The returned callback stops following it.
+        """
+        polled = self._polled()
+        listeners = self._listeners.setdefault(trip_id, [])
+        listeners.append(update)
+        if len(listeners) == 1:
+            self._async_poll_new(polled)
+        if self._unsub_timer is None:
+            self._unsub_timer = async_track_time_interval(
+                self.hass, self._async_tick, self.interval
+            )
+
+        @callback
+        def release() -> None:
+            if update not in listeners:
+                return
+            listeners.remove(update)
+            if listeners:
+                return
+            polled = self._polled()
+            del self._listeners[trip_id]
+            self._positions.pop(trip_id, None)
+            self._async_poll_new(polled)
+            if not self._listeners:
+                self.async_stop()
+
+        return release
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop polling."""
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the followed trips for diagnostics."""
+        polled = self._polled()
+        return {
+            "max_trips": self.max_trips,
+            "polled": polled,
+            "waiting": len(self._listeners) - len(polled),
+            **self.metrics.as_dict(),
+        }
+
+    @callback
+    def _async_poll_new(self, before: list[str]) -> None:
+        """Poll the trips that just came within the budget right away."""
+        new = [trip_id for trip_id in self._polled() if trip_id not in before]
+        if new:
+            self.hass.async_create_background_task(
+                self._async_poll(new), "vbb trip positions"
+            )
+
+    async def _async_tick(self, now: datetime) -> None:
+        await self._async_poll(self._polled())
+
+    async def _async_poll(self, trip_ids: list[str]) -> None:
+        results = await asyncio.gather(
+            *(self._async_fetch(trip_id) for trip_id in trip_ids),
+            return_exceptions=True,
+        )
+        for trip_id, result in zip(trip_ids, results):
+            if isinstance(result, Exception):
+                # Trips are dropped by the API once they ended; the sensor
+                # moves on with the next departure.
+                self.metrics.increment("trip_failures")
+                continue
+            if (
+                result is None
+                or trip_id not in self._listeners
+                or self._positions.get(trip_id) == result
+            ):
+                continue
+            self._positions[trip_id] = result
+            self.metrics.increment("position_updates")
+            for update in list(self._listeners[trip_id]):
+                update()
+
+    async def _async_fetch(self, trip_id: str) -> Position | None:
+        self.metrics.increment("trip_polls")
+        with self.metrics.measure("trip_fetch"):
+            response = await async_request(
+                self.session,
+                TRIP_PATH.format(trip=quote(trip_id, safe="")),
+                TRIP_QUERY_OPTIONS,
+                priority=PRIORITY_BACKGROUND,
+                project=project_trip_position,
+            )
+        return response.data
+
+
+@callback
+def async_create_trip_tracker(
+    hass: HomeAssistant, session: ClientSession, max_trips: int
+) -> TripTracker:
+    """Create the tracker, stopping it when Home Assistant stops."""
+    tracker = TripTracker(hass, session, max_trips)
+
+    @callback
+    def async_close(event: Event) -> None:
+        tracker.async_stop()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, async_close)
+    return tracker
@@ -0,0 +1,26 @@
+"""Tests for the names under which discovered lines are merged."""
+
+from __future__ import annotations
+
+import pytest
+
+from custom_components.vbb.discovery import normalize_name
+
+
+@pytest.mark.parametrize(
+    ("name", "expected"),
+    [
+        ("S+U Hauptbahnhof (Berlin)", "s u hauptbahnhof"),
+        ("S Potsdam Hbf (Terminal 5)", "s potsdam hbf terminal 5"),
+        ("U Mehringdamm Bhf", "u mehringdamm bahnhof"),
+        ("Hermannstr.", "hermannstrasse"),
+        ("Hermannstraße", "hermannstrasse"),
+        ("Str. der Pariser Kommune", "strasse der pariser kommune"),
+        ("Karl-Marx-Str", "karl marx strasse"),
+        ("Kastr", "kastr"),
+        ("Strausberg", "strausberg"),
+    ],
+)
+def test_normalize_name(name: str, expected: str) -> None:
+    """Abbreviations and qualifiers are merged, other names are kept."""
+    assert normalize_name(name) == expected
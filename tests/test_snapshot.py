@@ -0,0 +1,126 @@
+"""Property tests comparing the departures snapshot with per-entity filtering."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import random
+from typing import Any
+
+import pytest
+
+from custom_components.vbb.snapshot import (
+    DepartureSnapshot,
+    get_time,
+    parse_departure_time,
+)
+
+NOW = datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc)
+LINES = ["S7", "U2", "M10", "100", "RE1"]
+PRODUCTS = ["suburban", "subway", "tram", "bus", "regional", None]
+# Names whose destination_key differ, so exact matching is the reference.
+NAMES = ["S Ahrensfelde", "S Potsdam Hauptbahnhof", "U Pankow", "Ruhleben", None]
+SEEDS = range(200)
+
+
+def _time(rng: random.Random) -> str | None:
+    choice = rng.random()
+    if choice < 0.05:
+        return None
+    if choice < 0.1:
+        return "not a time"
+    # Whole minutes around now, so equal times and rows at now are common.
+    when = NOW + timedelta(minutes=rng.randint(-10, 30))
+    offset = timezone(timedelta(hours=rng.choice([0, 1, 2])))
+    return when.astimezone(offset).isoformat()
+
+
+def _departure(rng: random.Random, index: int) -> dict[str, Any]:
+    time = _time(rng)
+    departure: dict[str, Any] = {
+        "tripId": f"trip-{index}",
+        "line": {"name": rng.choice(LINES), "product": rng.choice(PRODUCTS)},
+        "direction": rng.choice(NAMES),
+        rng.choice(["plannedWhen", "when", "plannedDeparture"]): time,
+    }
+    if rng.random() < 0.8:
+        departure["destination"] = {"name": rng.choice(NAMES)}
+    return departure
+
+
+def _board(seed: int) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    return [_departure(rng, index) for index in range(rng.randint(0, 60))]
+
+
+def _sorted_upcoming(departures: list[dict[str, Any]]) -> list[str]:
+    """Parse, drop past rows and sort, as each sensor did on its own."""
+    rows = []
+    for dep in departures:
+        dep_time = parse_departure_time(get_time(dep))
+        if dep_time is None or dep_time <= NOW:
+            continue
+        rows.append((dep_time, dep))
+    rows.sort(key=lambda item: item[0])
+    return [dep["tripId"] for _, dep in rows]
+
+
+def _ids(rows: Any) -> list[str]:
+    return [row.trip_id for row in rows]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_for_destination_matches_filter(seed: int) -> None:
+    """A line sensor gets the rows of its line and destination."""
+    board = _board(seed)
+    snapshot = DepartureSnapshot.from_departures(board)
+    for line in LINES:
+        for name in NAMES[:-1]:
+            expected = _sorted_upcoming(
+                [
+                    dep
+                    for dep in board
+                    if dep["line"]["name"] == line
+                    and ((dep.get("destination") or {}).get("name") or dep["direction"])
+                    == name
+                ]
+            )
+            assert _ids(snapshot.for_destination(line, name, NOW)) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_for_direction_matches_filter(seed: int) -> None:
+    """A direction sensor gets the rows of its line and direction."""
+    board = _board(seed)
+    snapshot = DepartureSnapshot.from_departures(board)
+    for line in LINES:
+        for name in NAMES[:-1]:
+            expected = _sorted_upcoming(
+                [
+                    dep
+                    for dep in board
+                    if dep["line"]["name"] == line and dep["direction"] == name
+                ]
+            )
+            assert _ids(snapshot.for_direction(line, name, NOW)) == expected
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_for_products_matches_filter(seed: int) -> None:
+    """The station sensor gets the rows of its products and those without one."""
+    board = _board(seed)
+    snapshot = DepartureSnapshot.from_departures(board)
+    rng = random.Random(-seed)
+    known = [product for product in PRODUCTS if product]
+    for products in (
+        set(),
+        set(known),
+        set(rng.sample(known, rng.randint(1, len(known)))),
+    ):
+        expected = _sorted_upcoming(
+            [
+                dep
+                for dep in board
+                if not dep["line"]["product"] or dep["line"]["product"] in products
+            ]
+        )
+        assert _ids(snapshot.for_products(products, NOW)) == expected